@@ -24,6 +24,8 @@ export async function POST(
         message,
         session_id: sessionId,
         conversation_history: conversationHistory,
+        // The dashboard test chat shows the prompt and context used
+        response_profile: "debug",
       }),
     })
 
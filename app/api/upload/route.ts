@@ -24,9 +24,13 @@ export async function POST(request: NextRequest) {
       fileType = "csv"
     } else if (fileName.endsWith(".xlsx") || fileName.endsWith(".xls")) {
       fileType = "excel"
+    } else if (fileName.endsWith(".parquet")) {
+      fileType = "parquet"
+    } else if (fileName.endsWith(".arrow") || fileName.endsWith(".feather")) {
+      fileType = "arrow"
     } else {
       return NextResponse.json(
-        { error: "Unsupported file type. Only CSV and Excel files are supported." },
+        { error: "Unsupported file type. Only CSV, Excel, Parquet and Arrow files are supported." },
         { status: 400 }
       )
     }
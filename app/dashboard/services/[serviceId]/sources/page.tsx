@@ -37,6 +37,8 @@ import type { Source } from "@/lib/types"
 const fileTypeIcons: Record<string, typeof File> = {
   csv: FileSpreadsheet,
   excel: FileSpreadsheet,
+  parquet: FileSpreadsheet,
+  arrow: FileSpreadsheet,
   pdf: FileText,
   docx: FileText,
   txt: FileText,
@@ -49,6 +51,8 @@ const fileTypeBadgeClasses: Record<string, string> = {
   url: "bg-blue-500/15 text-blue-400 border border-blue-500/20",
   csv: "bg-green-500/15 text-green-400 border border-green-500/20",
   excel: "bg-green-500/15 text-green-400 border border-green-500/20",
+  parquet: "bg-green-500/15 text-green-400 border border-green-500/20",
+  arrow: "bg-green-500/15 text-green-400 border border-green-500/20",
   docx: "bg-indigo-500/15 text-indigo-400 border border-indigo-500/20",
   txt: "bg-yellow-500/15 text-yellow-400 border border-yellow-500/20",
 }
@@ -56,6 +60,8 @@ const fileTypeBadgeClasses: Record<string, string> = {
 const fileTypeLabels: Record<string, string> = {
   csv: "CSV",
   excel: "Excel",
+  parquet: "Parquet",
+  arrow: "Arrow",
   pdf: "PDF",
   docx: "DOCX",
   txt: "TXT",
@@ -196,7 +202,7 @@ export default function SourcesPage({
 
     for (const file of files) {
       const extension = file.name.split(".").pop()?.toLowerCase()
-      if (extension === "csv" || extension === "xlsx" || extension === "xls") {
+      if (extension && ["csv", "xlsx", "xls", "parquet", "arrow", "feather"].includes(extension)) {
         try {
           const formData = new FormData()
           formData.append("file", file)
@@ -293,7 +299,7 @@ export default function SourcesPage({
               <Upload className="mb-4 h-12 w-12 text-muted-foreground" />
               <h3 className="mb-2 text-lg font-medium">Drop files here to upload</h3>
               <p className="text-sm text-muted-foreground">
-                Supported: CSV, Excel
+                Supported: CSV, Excel, Parquet, Arrow
               </p>
             </>
           )}
@@ -27,7 +27,7 @@ export interface Source {
   id: string
   service_id: string
   name: string
-  file_type: "csv" | "excel"
+  file_type: "csv" | "excel" | "parquet" | "arrow"
   file_path: string
   status: "pending" | "processing" | "completed" | "failed"
   error_message: string | null
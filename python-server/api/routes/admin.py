@@ -0,0 +1,123 @@
+import hmac
+from fastapi import APIRouter, HTTPException, Header, Depends, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from config import ADMIN_API_KEY
+from models.schemas import VectorIndexRequest, SearchSettings
+from services.profiling import list_profiles, profile_path, profile_report, run_in_thread
+from services.vector_index import (
+    SupabaseVectorSearch, list_vector_indexes, create_service_vector_index,
+    drop_service_vector_index, update_service_search_settings, tune_service
+)
+
+
+def require_admin(x_admin_key: str = Header(None)):
+    """Admin endpoints are disabled unless ADMIN_API_KEY is set, and require it in X-Admin-Key"""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin API disabled")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key.encode("latin-1"), ADMIN_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def get_profiles():
+    """List stored request profiles, newest first"""
+    return {"profiles": list_profiles()}
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, sort: str = "cumulative", limit: int = 40):
+    """pstats report for a profiled request"""
+    try:
+        report = profile_report(profile_id, sort=sort, limit=limit)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Invalid sort key: {sort}")
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
+
+
+@router.get("/profiles/{profile_id}/raw")
+async def get_profile_raw(profile_id: str):
+    """Raw cProfile data, loadable with pstats or snakeviz"""
+    path = profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+
+# ============================================
+# Vector indexes and ANN tuning
+# ============================================
+
+@router.get("/vector-indexes")
+async def get_vector_indexes():
+    """ANN indexes on chunks, including per-service partial indexes"""
+    try:
+        return {"indexes": await run_in_thread(list_vector_indexes)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/services/{service_id}/vector-index")
+async def build_service_vector_index(service_id: str, request: VectorIndexRequest):
+    """Build (or rebuild) a partial ANN index over one service's chunks"""
+    try:
+        index_name = await run_in_thread(
+            create_service_vector_index,
+            service_id, request.method, request.m, request.ef_construction, request.lists
+        )
+        return {"index_name": index_name, "method": request.method}
+    except RuntimeError as e:  # No direct database connection configured
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/services/{service_id}/vector-index")
+async def remove_service_vector_index(service_id: str):
+    """Drop a service's partial index so it uses the shared index again"""
+    try:
+        dropped = await run_in_thread(drop_service_vector_index, service_id)
+    except RuntimeError as e:  # No direct database connection configured
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not dropped:
+        raise HTTPException(status_code=404, detail="Service has no vector index")
+    return {"dropped": True}
+
+
+@router.put("/services/{service_id}/search-settings")
+async def set_search_settings(service_id: str, settings: SearchSettings):
+    """Set the ivfflat.probes / hnsw.ef_search match_chunks uses for a service"""
+    values = settings.model_dump(exclude_none=True)
+    try:
+        await run_in_thread(update_service_search_settings, service_id, values)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"search_settings": values}
+
+
+@router.post("/services/{service_id}/ann-tuning")
+async def tune_service_search(
+    service_id: str,
+    k: int = Query(5, ge=1, le=50),
+    samples: int = Query(50, ge=1, le=500),
+    target_recall: float = Query(0.95, gt=0, le=1),
+    apply: bool = False
+):
+    """Measure recall@k and latency across ANN settings and recommend one (optionally storing it)"""
+    try:
+        report = await run_in_thread(
+            tune_service, SupabaseVectorSearch(), service_id,
+            k=k, samples=samples, target_recall=target_recall
+        )
+        if apply and report["recommendation"]:
+            await run_in_thread(update_service_search_settings, service_id, report["recommendation"]["setting"])
+            report["applied"] = True
+        return report
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,9 +1,14 @@
 import logging
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException
 from models.schemas import ChatRequest, ChatResponse, ChunkInfo
+from services.admission import get_admission, TenantOverloaded, CHAT
+from services.clients import use_pool, BULK
+from services.profiling import run_in_thread
 from services.database import get_service, get_writing_style, save_chat_message
+from services.embedding import check_embedding_backend, EmbeddingBackendMismatch
 from services.retrieval import retrieve_relevant_chunks, build_context
-from services.llm import generate_response
+from services.llm import generate_response, build_system_prompt
+from services.memory import get_session_store, SessionMemory
 import uuid
 
 logger = logging.getLogger("piona.chat")
@@ -11,12 +16,52 @@ logger = logging.getLogger("piona.chat")
 router = APIRouter()
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+# Bulky per-row metadata only returned with the debug profile
+_DEBUG_ONLY_METADATA = ("row_data",)
+
+
+def _chunk_info(chunk: dict, profile: str) -> ChunkInfo:
+    """Shape a retrieved chunk for the requested response profile"""
+    if profile == "minimal":
+        return ChunkInfo(id=chunk["id"], similarity=chunk["similarity"])
+
+    metadata = chunk.get("metadata") or {}
+    if profile != "debug":
+        metadata = {k: v for k, v in metadata.items() if k not in _DEBUG_ONLY_METADATA}
+    return ChunkInfo(
+        id=chunk["id"],
+        content=chunk["content"],
+        similarity=chunk["similarity"],
+        metadata=metadata
+    )
+
+
+@router.post("/chat", response_model=ChatResponse, response_model_exclude_none=True)
+async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
     """
     Send a message to the chatbot and get a RAG-powered response
     """
-    logger.info(f"💬 Chat: \"{request.message[:50]}...\"")
+    try:
+        # Per-service admission: blocking RAG work runs off the event loop once admitted
+        async with get_admission().slot(request.service_id, CHAT):
+            return await run_in_thread(_handle_chat, request, background_tasks)
+    except TenantOverloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def _compact_memory(memory: SessionMemory):
+    """Fold older turns into the session summary once the response has been sent"""
+    with use_pool(BULK):
+        memory.compact()
+
+
+def _handle_chat(request: ChatRequest, background_tasks: BackgroundTasks) -> ChatResponse:
+    """Run the RAG pipeline for a single chat message"""
+    logger.info("💬 Chat: \"%s...\"", request.message[:50])
 
     try:
         session_id = request.session_id or str(uuid.uuid4())
@@ -24,9 +69,15 @@ async def chat(request: ChatRequest):
         # Step 1: Verify service
         service = get_service(request.service_id)
         if not service:
-            logger.error(f"Service not found: {request.service_id}")
+            logger.error("Service not found: %s", request.service_id)
             raise HTTPException(status_code=404, detail="Service not found")
-        logger.info(f"   Service: {service.get('name')}")
+        logger.info("   Service: %s", service.get("name"))
+
+        # Queries must be embedded by the same backend as the stored chunks
+        try:
+            check_embedding_backend(service.get("embedding_method"))
+        except EmbeddingBackendMismatch as e:
+            raise HTTPException(status_code=409, detail=str(e))
 
         # Step 2: Get writing style
         style_guidelines = request.style_guidelines
@@ -34,7 +85,10 @@ async def chat(request: ChatRequest):
             style = get_writing_style(request.service_id)
             if style:
                 style_guidelines = f"Tone: {style.get('tone', 'professional')}\n{style.get('guidelines', '')}"
-                logger.info(f"   Style: {style.get('name')}")
+                logger.info("   Style: %s", style.get("name"))
+
+        # Server-owned session memory; client-supplied conversation_history is ignored
+        memory = get_session_store().get(request.service_id, session_id, load=request.session_id is not None)
 
         # Step 3: Save user message
         save_chat_message(
@@ -47,7 +101,8 @@ async def chat(request: ChatRequest):
         # Step 4: Retrieve chunks
         chunks = retrieve_relevant_chunks(
             service_id=request.service_id,
-            query=request.message
+            query=request.message,
+            filters=request.filters.model_dump(exclude_none=True) if request.filters else None
         )
 
         # Step 5: Build context
@@ -57,20 +112,13 @@ async def chat(request: ChatRequest):
         response_text, prompt_used = generate_response(
             query=request.message,
             context=context,
-            conversation_history=request.conversation_history,
-            style_guidelines=style_guidelines
+            conversation_history=memory.history(),
+            style_guidelines=style_guidelines,
+            conversation_summary=memory.summary
         )
 
         # Convert chunks to response format
-        chunk_infos = [
-            ChunkInfo(
-                id=chunk["id"],
-                content=chunk["content"],
-                similarity=chunk["similarity"],
-                metadata=chunk.get("metadata", {})
-            )
-            for chunk in chunks
-        ]
+        chunk_infos = [_chunk_info(chunk, request.response_profile) for chunk in chunks]
 
         # Step 7: Save response
         message_id = save_chat_message(
@@ -78,17 +126,21 @@ async def chat(request: ChatRequest):
             session_id=session_id,
             role="assistant",
             content=response_text,
-            prompt_used=prompt_used,
+            system_prompt=build_system_prompt(style_guidelines),
             context_used=context,
             chunks_used=[c.id for c in chunk_infos]
         )
 
-        logger.info(f"   ✅ Response: \"{response_text[:50]}...\"")
+        if memory.add_exchange(request.message, response_text):
+            background_tasks.add_task(_compact_memory, memory)
 
+        logger.info("   ✅ Response: \"%s...\"", response_text[:50])
+
+        debug = request.response_profile == "debug"
         return ChatResponse(
             response=response_text,
-            prompt_used=prompt_used,
-            context_used=context,
+            prompt_used=prompt_used if debug else None,
+            context_used=context if debug else None,
             chunks_used=chunk_infos,
             session_id=session_id,
             message_id=message_id
@@ -97,6 +149,6 @@ async def chat(request: ChatRequest):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ Chat failed: {str(e)}")
-        logger.exception("Traceback:")
+        # Traceback is rendered by the logging thread, not here
+        logger.exception("❌ Chat failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,6 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from datetime import datetime
-from models.schemas import HealthResponse
+from models.schemas import HealthResponse, ReadinessResponse
+from services.warmup import get_readiness, start_warmups
 
 router = APIRouter()
 
@@ -13,3 +14,14 @@ async def health_check():
         version="1.0.0",
         timestamp=datetime.utcnow()
     )
+
+
+@router.get("/ready", response_model=ReadinessResponse)
+async def readiness_check(response: Response):
+    """Readiness endpoint: 503 until startup warmups (database, OpenAI, retrieval) succeed"""
+    readiness = get_readiness()
+    if not readiness["ready"]:
+        # Retry any warmup that failed so a replica can recover without a restart
+        start_warmups()
+        response.status_code = 503
+    return ReadinessResponse(**readiness)
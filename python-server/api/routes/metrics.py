@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from services.admission import get_admission
+from services.clients import get_client_manager
+from services.quota import get_quota_scheduler
+from services.vector_store import get_vector_store
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Runtime metrics: admission queues and wait times, HTTP connection pools, OpenAI quota, vector store"""
+    return {
+        "admission": get_admission().metrics(),
+        "http": get_client_manager().metrics(),
+        "openai_quota": get_quota_scheduler().metrics(),
+        "vector_store": get_vector_store().metrics()
+    }
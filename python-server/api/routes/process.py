@@ -1,14 +1,32 @@
+import hashlib
 import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 from models.schemas import ProcessFileRequest, ProcessingStatus
-from services.database import get_supabase, create_supabase, update_source_status, save_chunks
-from services.file_processor import FileProcessor
-from services.embedding import generate_embeddings_batch
+from services.admission import get_admission, TenantOverloaded, INGEST
+from services.profiling import run_in_thread
+from services.clients import use_pool, BULK
+from services.database import (
+    get_supabase, update_source_status, save_chunks,
+    get_service, count_service_chunks, update_service_embedding_method,
+    get_source, update_source_metadata, delete_source_chunks, count_source_chunks,
+    claim_source_ingestion, touch_source, IngestionSuperseded
+)
+from services.embedding import generate_embeddings_array, get_embedding_backend, check_embedding_backend
+from config import INGEST_BATCH_SIZE, INGEST_STALE_BATCHES, INGEST_STALE_MIN_SECONDS
 
 logger = logging.getLogger("piona.process")
 
 router = APIRouter()
 
+# Sources with an ingestion running or queued in this process. Other replicas can't
+# see this set; across processes a run is only considered dead once its heartbeat
+# (sources.updated_at) is stale, and taking it over is a conditional claim.
+_active_sources = set()
+
 
 async def process_file_task(
     source_id: str,
@@ -16,73 +34,199 @@ async def process_file_task(
     file_path: str,
     file_type: str,
     chunk_size: int,
-    chunk_overlap: int
+    chunk_overlap: int,
+    chunking_strategy: str = "row",
+    pack_key_column: str = None,
+    run_id: str = None
+):
+    """Background task to process a file once the service has an ingestion slot"""
+    _active_sources.add(source_id)
+    try:
+        # Ingestion uses the bulk connection pools so it can't exhaust chat's
+        async with get_admission().slot(service_id, INGEST):
+            with use_pool(BULK):
+                await run_in_thread(
+                    _process_file,
+                    source_id, service_id, file_path, file_type, chunk_size, chunk_overlap,
+                    chunking_strategy, pack_key_column, run_id
+                )
+    finally:
+        _active_sources.discard(source_id)
+
+
+def _process_file(
+    source_id: str,
+    service_id: str,
+    file_path: str,
+    file_type: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    chunking_strategy: str = "row",
+    pack_key_column: str = None,
+    run_id: str = None
 ):
-    """Background task to process a file"""
-    logger.info(f"📦 Processing: {file_path}")
+    """
+    Download, chunk, embed and store a source file.
+
+    Chunks are embedded and saved in batches of INGEST_BATCH_SIZE, and after
+    each batch a checkpoint is written to sources.metadata["ingestion"]. If a
+    previous run of the same file with the same settings stopped part-way, this
+    run keeps its saved chunks and embeddings and continues after the last
+    committed batch.
 
-  
-    bg_client = create_supabase()
+    The run is identified by `run_id`, recorded in the checkpoint when the run
+    was claimed. Every source update is conditional on it, so if another
+    replica has since taken the source over, this run stops at its next write
+    (IngestionSuperseded) instead of racing the new one.
+    """
+    # Ingestion-only dependencies (pandas, openpyxl) are imported on first use
+    from services.file_processor import FileProcessor
+
+    logger.info("📦 Processing: %s", file_path)
+
+    bg_client = get_supabase()
 
     try:
-        update_source_status(source_id, "processing", client=bg_client)
+        # Also the first heartbeat after the admission wait; fails if the claim was lost meanwhile
+        update_source_status(source_id, "processing", client=bg_client, run_id=run_id)
+        source = get_source(source_id, client=bg_client) or {}
+        base_metadata = {k: v for k, v in (source.get("metadata") or {}).items() if k != "ingestion"}
+        previous = (source.get("metadata") or {}).get("ingestion") or {}
+
+        # Embeddings from different backends are not comparable, so a service's index can't mix them
+        backend = get_embedding_backend()
+        if count_service_chunks(service_id, client=bg_client):
+            service = get_service(service_id, client=bg_client) or {}
+            # The service records its backend; the source's own record covers services predating it
+            check_embedding_backend(service.get("embedding_method") or base_metadata.get("embedding_backend"))
+        else:
+            update_service_embedding_method(service_id, backend.id, client=bg_client)
 
-      
         file_response = bg_client.storage.from_("source-files").download(file_path)
         if not file_response:
             raise Exception("Failed to download file")
-        logger.info(f"   Downloaded: {len(file_response)} bytes")
+        logger.info("   Downloaded: %d bytes", len(file_response))
 
         # Process into chunks
-        processor = FileProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        processor = FileProcessor(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            chunking_strategy=chunking_strategy,
+            pack_key_column=pack_key_column
+        )
 
         if file_type == "csv":
             chunks = processor.process_csv(file_response)
         elif file_type in ["excel", "xlsx", "xls"]:
             chunks = processor.process_excel(file_response)
+        elif file_type == "parquet":
+            chunks = processor.process_parquet(file_response)
+        elif file_type in ["arrow", "feather"]:
+            chunks = processor.process_arrow(file_response)
         else:
             raise Exception(f"Unsupported file type: {file_type}")
 
         if not chunks:
             raise Exception("No chunks created from file")
-        logger.info(f"   Chunks: {len(chunks)}")
+        logger.info("   Chunks: %d", len(chunks))
 
-        # Generate embeddings
-        texts = [chunk["content"] for chunk in chunks]
-        embeddings = generate_embeddings_batch(texts)
-        logger.info(f"   Embeddings: {len(embeddings)}")
+        # Chunking is deterministic, so a checkpoint for the same bytes and settings
+        # identifies exactly which chunks are already stored
+        params = {
+            "file_path": file_path,
+            "file_type": file_type,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "chunking_strategy": chunking_strategy,
+            "pack_key_column": pack_key_column,
+            "embedding_backend": backend.id
+        }
+        file_hash = hashlib.sha256(file_response).hexdigest()
+        total = len(chunks)
+
+        if (previous.get("file_hash") == file_hash and previous.get("params") == params
+                and previous.get("state") == "running" and previous.get("total_chunks") == total):
+            committed = previous.get("committed_chunks", 0)
+            logger.info("   Resuming from checkpoint: %d/%d chunks already stored", committed, total)
+        else:
+            committed = 0
+        # Drop anything past the last checkpoint (or everything from an older run)
+        delete_source_chunks(source_id, from_index=committed, client=bg_client)
 
-        # Add embeddings to chunks
-        for chunk, embedding in zip(chunks, embeddings):
-            chunk["embedding"] = embedding
+        checkpoint = {
+            "state": "running",
+            "run_id": run_id,
+            "file_hash": file_hash,
+            "params": params,
+            "total_chunks": total,
+            "committed_chunks": committed,
+            "resumed_from": committed,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "chunks_per_second": None
+        }
+        # Recorded once on the source rather than on every chunk row
+        base_metadata["columns"] = chunks.columns
+        base_metadata["embedding_backend"] = backend.id
+        update_source_metadata(source_id, {**base_metadata, "ingestion": checkpoint}, client=bg_client, run_id=run_id)
 
-        # Save to database
-        chunks_created = save_chunks(chunks, source_id, service_id, client=bg_client)
+        run_started = time.monotonic()
+        for batch_start in range(committed, total, INGEST_BATCH_SIZE):
+            batch_end = min(batch_start + INGEST_BATCH_SIZE, total)
+
+            # Only this batch's embeddings are held, as one float32 array
+            chunks.attach_embeddings(batch_start, generate_embeddings_array(chunks.contents(batch_start, batch_end)))
+            # Don't write chunks if another replica took the source over while this batch embedded
+            touch_source(source_id, run_id, client=bg_client)
+            save_chunks(chunks, source_id, service_id, client=bg_client, start=batch_start, stop=batch_end)
+
+            # Commit the checkpoint only after the batch is stored
+            checkpoint["committed_chunks"] = batch_end
+            elapsed = time.monotonic() - run_started
+            checkpoint["chunks_per_second"] = round((checkpoint["committed_chunks"] - committed) / elapsed, 2) if elapsed > 0 else None
+            checkpoint["updated_at"] = datetime.now(timezone.utc).isoformat()
+            update_source_metadata(source_id, {**base_metadata, "ingestion": checkpoint}, client=bg_client, run_id=run_id)
+            logger.info("   Checkpoint: %d/%d chunks", checkpoint['committed_chunks'], total)
 
         # Update metadata
-        metadata = processor.get_file_metadata(file_response, file_type)
-        metadata["chunks_created"] = chunks_created
+        metadata = {**base_metadata, **processor.get_file_metadata(file_response, file_type)}
+        metadata["chunks_created"] = total
+        metadata["chunking_strategy"] = chunking_strategy
+        metadata["ingestion"] = {**checkpoint, "state": "completed"}
 
-        update_source_status(source_id, "completed", metadata=metadata, client=bg_client)
-        logger.info(f"   ✅ Completed: {chunks_created} chunks")
+        update_source_status(source_id, "completed", metadata=metadata, client=bg_client, run_id=run_id)
+        logger.info("   ✅ Completed: %d chunks", total)
 
+    except IngestionSuperseded as e:
+        # Another run owns the source now; leave its status alone
+        logger.warning("   ⚠️ Stopped: %s", e)
     except Exception as e:
-        logger.error(f"   ❌ Failed: {str(e)}")
-        update_source_status(source_id, "failed", error_message=str(e), client=bg_client)
+        logger.error("   ❌ Failed: %s", e)
+        try:
+            update_source_status(source_id, "failed", error_message=str(e), client=bg_client, run_id=run_id)
+        except IngestionSuperseded:
+            pass
 
 
 @router.post("/process", response_model=ProcessingStatus)
 async def process_file(request: ProcessFileRequest, background_tasks: BackgroundTasks):
     """Start processing a file (runs in background)"""
-    logger.info(f"📤 Process request: {request.file_path}")
+    logger.info("📤 Process request: %s", request.file_path)
 
     try:
+        # Fail fast rather than queueing unbounded ingestion work for one service
+        get_admission().check_capacity(request.service_id, INGEST)
+
         supabase = get_supabase()
         source = supabase.table("sources").select("*").eq("id", request.source_id).single().execute()
 
         if not source.data:
             raise HTTPException(status_code=404, detail="Source not found")
 
+        # Name this run in the checkpoint; any run still going elsewhere stops at its next write
+        run_id = uuid.uuid4().hex
+        metadata = source.data.get("metadata") or {}
+        claim_source_ingestion(request.source_id, {**metadata, "ingestion": {**(metadata.get("ingestion") or {}), "run_id": run_id}}, client=supabase)
+
         background_tasks.add_task(
             process_file_task,
             request.source_id,
@@ -90,7 +234,10 @@ async def process_file(request: ProcessFileRequest, background_tasks: Background
             request.file_path,
             request.file_type,
             request.chunk_size,
-            request.chunk_overlap
+            request.chunk_overlap,
+            request.chunking_strategy,
+            request.pack_key_column,
+            run_id
         )
 
         return ProcessingStatus(
@@ -99,13 +246,116 @@ async def process_file(request: ProcessFileRequest, background_tasks: Background
             chunks_created=0
         )
 
+    except TenantOverloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ Process request failed: {str(e)}")
+        logger.error("❌ Process request failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/process/{source_id}/resume", response_model=ProcessingStatus)
+async def resume_processing(source_id: str, background_tasks: BackgroundTasks):
+    """Resume a failed or interrupted ingestion from its last checkpoint"""
+    logger.info("🔁 Resume request: %s", source_id)
+
+    try:
+        source = get_source(source_id)
+        if not source:
+            raise HTTPException(status_code=404, detail="Source not found")
+
+        metadata = source.get("metadata") or {}
+        checkpoint = metadata.get("ingestion") or {}
+        if not _is_resumable(source, checkpoint):
+            raise HTTPException(status_code=409, detail="Source has no interrupted ingestion to resume")
+
+        get_admission().check_capacity(source["service_id"], INGEST)
+
+        # Only one replica wins the takeover: the claim applies only if the row is unchanged since it was read
+        run_id = uuid.uuid4().hex
+        if not claim_source_ingestion(source_id, {**metadata, "ingestion": {**checkpoint, "run_id": run_id}},
+                                      expected_updated_at=source.get("updated_at")):
+            raise HTTPException(status_code=409, detail="Source was resumed or updated concurrently")
+
+        params = checkpoint["params"]
+        background_tasks.add_task(
+            process_file_task,
+            source_id,
+            source["service_id"],
+            params["file_path"],
+            params["file_type"],
+            params["chunk_size"],
+            params["chunk_overlap"],
+            params["chunking_strategy"],
+            params["pack_key_column"],
+            run_id
+        )
+
+        return ProcessingStatus(
+            source_id=source_id,
+            status="processing",
+            chunks_created=checkpoint.get("committed_chunks", 0),
+            chunks_total=checkpoint.get("total_chunks")
+        )
+
+    except TenantOverloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("❌ Resume request failed: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _heartbeat_age(updated_at: str) -> Optional[float]:
+    """Seconds since a source row was last written; None if unknown"""
+    if not updated_at:
+        return None
+    try:
+        written = datetime.fromisoformat(updated_at.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if written.tzinfo is None:
+        written = written.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - written).total_seconds()
+
+
+def _is_resumable(source: dict, checkpoint: dict) -> bool:
+    """
+    A run that stopped part-way with a usable checkpoint: failed, or still
+    'processing' but with no heartbeat for INGEST_STALE_BATCHES batch times
+    (at the run's own rate), so it was presumably killed.
+    """
+    status = source.get("status")
+    if not (
+        source.get("id") not in _active_sources
+        and status in ("failed", "processing")
+        and checkpoint.get("state") == "running"
+        and bool(checkpoint.get("params"))
+        and checkpoint.get("committed_chunks", 0) < checkpoint.get("total_chunks", 0)
+    ):
+        return False
+    if status == "failed":
+        return True
+    age = _heartbeat_age(source.get("updated_at"))
+    if age is None:
+        return False
+    stale_after = INGEST_STALE_MIN_SECONDS
+    rate = checkpoint.get("chunks_per_second")
+    if rate:
+        stale_after = max(stale_after, INGEST_STALE_BATCHES * INGEST_BATCH_SIZE / rate)
+    return age > stale_after
+
+
 @router.get("/process/{source_id}/status", response_model=ProcessingStatus)
 async def get_processing_status(source_id: str):
     """Get the processing status of a source"""
@@ -116,15 +366,26 @@ async def get_processing_status(source_id: str):
         if not source.data:
             raise HTTPException(status_code=404, detail="Source not found")
 
-        chunks_result = supabase.table("chunks").select("id", count="exact").eq("source_id", source_id).execute()
-
-        return ProcessingStatus(
+        status = ProcessingStatus(
             source_id=source_id,
             status=source.data["status"],
-            chunks_created=chunks_result.count or 0,
+            chunks_created=count_source_chunks(source_id),
             error_message=source.data.get("error_message")
         )
 
+        checkpoint = (source.data.get("metadata") or {}).get("ingestion")
+        if checkpoint and checkpoint.get("total_chunks"):
+            committed = checkpoint.get("committed_chunks", 0)
+            total = checkpoint["total_chunks"]
+            status.chunks_total = total
+            status.progress_percent = round(100 * committed / total, 1)
+            rate = checkpoint.get("chunks_per_second")
+            if status.status == "processing" and rate:
+                status.eta_seconds = round((total - committed) / rate, 1)
+            status.resumable = _is_resumable(source.data, checkpoint)
+
+        return status
+
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,72 @@
+"""
+Memory held by ingestion chunks: per-chunk dicts with list embeddings vs ChunkSet.
+
+"dicts" rebuilds the previous in-pipeline shape, where every chunk carried its
+own columns list, row_data dict and a list of Python floats as its embedding,
+all kept until the file finished. "chunkset" is what ingestion holds now: one
+ChunkSet plus the float32 embeddings of the batch in flight. Sizes are
+tracemalloc peaks, so they include everything allocated to build each shape.
+
+Run from the python-server directory:
+    python -m benchmarks.chunk_memory --rows 5000
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.chunking_benchmark import make_customer_csv
+from config import EMBEDDING_DIMENSIONS, INGEST_BATCH_SIZE
+from services.file_processor import FileProcessor
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    held = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per ingested chunk")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dimensions", type=int, default=EMBEDDING_DIMENSIONS)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    chunk_set = FileProcessor().process_csv(make_customer_csv(args.rows))
+    count = len(chunk_set)
+    vectors = np.random.default_rng(0).standard_normal((count, args.dimensions)).astype(np.float32)
+
+    def dicts():
+        chunks = list(chunk_set)
+        for chunk, vector in zip(chunks, vectors):
+            chunk["metadata"]["columns"] = list(chunk_set.columns)  # Each chunk had its own copy
+            chunk["embedding"] = vector.tolist()
+        return chunks
+
+    def chunkset():
+        held = FileProcessor().process_csv(make_customer_csv(args.rows))
+        held.attach_embeddings(0, vectors[:args.batch_size].copy())
+        return held
+
+    results = []
+    for name, build in [("dicts", dicts), ("chunkset", chunkset)]:
+        current, peak = _measure(build)
+        results.append({
+            "representation": name,
+            "held_mb": round(current / 2**20, 1),
+            "peak_mb": round(peak / 2**20, 1),
+            "bytes_per_chunk": round(current / count),
+        })
+
+    print(json.dumps({"rows": args.rows, "chunks": count, "dimensions": args.dimensions, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
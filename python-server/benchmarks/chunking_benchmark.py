@@ -0,0 +1,103 @@
+"""
+Chunking benchmark: per-row vs packed chunking on a synthetic customer table.
+
+Reports chunk (= embedding) count, chunking time, embedding API batches and the
+median LocalVectorStore.search latency once the chunks are stored with random
+embeddings, since retrieval cost grows with the number of chunks per service.
+
+Run from the python-server directory:
+    python -m benchmarks.chunking_benchmark --rows 100000
+"""
+import argparse
+import io
+import json
+import random
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from config import EMBEDDING_DIMENSIONS
+from services.chunks import ChunkSet
+from services.file_processor import FileProcessor
+from services.local_store import LocalVectorStore
+
+EMBEDDING_BATCH_SIZE = 100  # Matches generate_embeddings_batch
+
+
+def make_customer_csv(rows: int, seed: int = 7) -> bytes:
+    """Short-row customer table similar to data/restaurant_customers.csv"""
+    rng = random.Random(seed)
+    cities = ["Delhi", "Mumbai", "Pune", "Jaipur", "Lucknow", "Bengaluru"]
+    items = ["Paneer Butter Masala", "Caesar Salad", "Masala Dosa", "Veg Biryani", "Cold Coffee"]
+    df = pd.DataFrame({
+        "customer_id": range(1, rows + 1),
+        "customer_name": [f"Customer {i}" for i in range(1, rows + 1)],
+        "city": [rng.choice(cities) for _ in range(rows)],
+        "total_visits": [rng.randint(1, 40) for _ in range(rows)],
+        "total_spend": [rng.randint(100, 20000) for _ in range(rows)],
+        "favorite_item": [rng.choice(items) for _ in range(rows)],
+    })
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+def search_latency_ms(chunks: ChunkSet, queries: int = 20) -> float:
+    """Median LocalVectorStore.search time (top 5) after saving the chunks with random unit embeddings"""
+    rng = np.random.default_rng(0)
+    service_id, source_id = str(uuid.uuid4()), str(uuid.uuid4())
+    with tempfile.TemporaryDirectory() as directory:
+        store = LocalVectorStore(directory)
+        try:
+            for start in range(0, len(chunks), 1000):
+                stop = min(start + 1000, len(chunks))
+                vectors = rng.standard_normal((stop - start, EMBEDDING_DIMENSIONS), dtype=np.float32)
+                chunks.attach_embeddings(start, vectors / np.linalg.norm(vectors, axis=1, keepdims=True))
+                store.save_chunks(chunks, source_id, service_id, start, stop)
+            store.search(service_id, rng.standard_normal(EMBEDDING_DIMENSIONS).tolist(), k=5)  # Builds the ANN index if used
+            timings = []
+            for _ in range(queries):
+                query = rng.standard_normal(EMBEDDING_DIMENSIONS).tolist()
+                begin = time.perf_counter()
+                store.search(service_id, query, k=5)
+                timings.append((time.perf_counter() - begin) * 1000)
+        finally:
+            store.close()
+    return round(float(np.median(timings)), 2)
+
+
+def run(strategy: str, content: bytes, chunk_size: int, pack_key_column: str = None) -> dict:
+    processor = FileProcessor(chunk_size=chunk_size, chunking_strategy=strategy, pack_key_column=pack_key_column)
+    start = time.perf_counter()
+    chunks = processor.process_csv(content)
+    chunking_ms = (time.perf_counter() - start) * 1000
+    return {
+        "strategy": strategy if not pack_key_column else f"{strategy}:{pack_key_column}",
+        "chunks": len(chunks),
+        "embedding_batches": -(-len(chunks) // EMBEDDING_BATCH_SIZE),
+        "embedded_chars": sum(len(c["content"]) for c in chunks),
+        "chunking_ms": round(chunking_ms, 1),
+        "search_ms_median": search_latency_ms(chunks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-row and packed chunking")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    content = make_customer_csv(args.rows)
+    results = [
+        run("row", content, args.chunk_size),
+        run("packed", content, args.chunk_size),
+        run("packed", content, args.chunk_size, pack_key_column="city"),
+    ]
+    print(json.dumps({"rows": args.rows, "chunk_size": args.chunk_size, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
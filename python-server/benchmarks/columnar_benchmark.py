@@ -0,0 +1,78 @@
+"""
+Columnar ingestion benchmark: CSV vs Parquet vs Arrow IPC on the same table.
+
+The synthetic customer table from chunking_benchmark is written once as CSV,
+Parquet and Arrow IPC, then chunked through FileProcessor's CSV path
+(pandas, row by row) and the columnar paths (record batches, Arrow compute).
+Reports chunk count, chunking time, rows/s and whether the chunk text is
+identical to the CSV path's.
+
+Run from the python-server directory:
+    python -m benchmarks.columnar_benchmark --rows 100000
+"""
+import argparse
+import io
+import json
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from benchmarks.chunking_benchmark import make_customer_csv
+from services.file_processor import FileProcessor
+
+
+def encode(csv_content: bytes) -> dict:
+    """The same table as CSV, Parquet and Arrow IPC bytes"""
+    table = pa.Table.from_pandas(pd.read_csv(io.BytesIO(csv_content)), preserve_index=False)
+
+    parquet = io.BytesIO()
+    pq.write_table(table, parquet, row_group_size=50_000)
+
+    arrow = pa.BufferOutputStream()
+    with pa.ipc.new_file(arrow, table.schema) as writer:
+        writer.write_table(table, max_chunksize=50_000)
+
+    return {"csv": csv_content, "parquet": parquet.getvalue(), "arrow": arrow.getvalue().to_pybytes()}
+
+
+def run(file_type: str, content: bytes, rows: int, strategy: str, chunk_size: int, pack_key_column: str = None):
+    processor = FileProcessor(chunk_size=chunk_size, chunking_strategy=strategy, pack_key_column=pack_key_column)
+    process = {"csv": processor.process_csv, "parquet": processor.process_parquet, "arrow": processor.process_arrow}[file_type]
+    start = time.perf_counter()
+    chunks = process(content)
+    elapsed = time.perf_counter() - start
+    return chunks, {
+        "format": file_type,
+        "strategy": strategy if not pack_key_column else f"{strategy}:{pack_key_column}",
+        "file_bytes": len(content),
+        "chunks": len(chunks),
+        "chunking_ms": round(elapsed * 1000, 1),
+        "rows_per_second": round(rows / elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CSV and columnar ingestion")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    files = encode(make_customer_csv(args.rows))
+    results = []
+    for strategy, key in [("row", None), ("packed", None), ("packed", "city")]:
+        baseline = None
+        for file_type, content in files.items():
+            chunks, result = run(file_type, content, args.rows, strategy, args.chunk_size, key)
+            texts = [c["content"] for c in chunks]
+            if baseline is None:
+                baseline = texts
+            result["matches_csv"] = texts == baseline
+            results.append(result)
+
+    print(json.dumps({"rows": args.rows, "chunk_size": args.chunk_size, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
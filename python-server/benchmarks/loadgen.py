@@ -0,0 +1,253 @@
+"""
+Open-loop load generator for /api/chat.
+
+Requests are issued on a fixed arrival schedule regardless of how fast the
+server answers, so queueing shows up as latency instead of being hidden by a
+closed loop. Traffic is replayed from chat_history (user messages, grouped by
+service) or generated synthetically, and tenants are picked with a Zipf skew.
+
+Targets:
+  --target http://host:port   a running server
+  --target local              the app in-process, with stand-ins for Supabase and OpenAI
+
+Run from the python-server directory:
+    python -m benchmarks.loadgen --target local --rates 5,10,20,40 --duration 20
+    python -m benchmarks.loadgen --target http://localhost:8000 --source chat_history --rates 2,4,8
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+SYNTHETIC_QUESTIONS = [
+    "What vegetarian options do you have?",
+    "Which items cost less than $10?",
+    "What are your opening hours?",
+    "Do you have anything gluten free?",
+    "What is the most popular dish?",
+    "Can you recommend a dessert?",
+    "How spicy is the paneer butter masala?",
+    "List all drinks on the menu",
+]
+
+
+# ============================================
+# Traffic
+# ============================================
+
+def load_chat_history(limit: int) -> Dict[str, List[dict]]:
+    """Recorded user messages grouped by service, oldest first"""
+    from services.database import get_supabase
+
+    result = get_supabase().table("chat_history").select("service_id, session_id, content, created_at").eq("role", "user").order("created_at", desc=True).limit(limit).execute()
+    traffic = defaultdict(list)
+    for row in reversed(result.data or []):
+        traffic[row["service_id"]].append({"session_id": row["session_id"], "message": row["content"]})
+    return dict(traffic)
+
+
+def synthetic_traffic(tenants: int, seed: int) -> Dict[str, List[dict]]:
+    rng = random.Random(seed)
+    traffic = {}
+    for _ in range(tenants):
+        service_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        traffic[service_id] = [{"session_id": None, "message": q} for q in rng.sample(SYNTHETIC_QUESTIONS, len(SYNTHETIC_QUESTIONS))]
+    return traffic
+
+
+class TrafficMix:
+    """Picks (service, message) pairs: tenants by Zipf(skew) over volume rank, messages in recorded order"""
+
+    def __init__(self, traffic: Dict[str, List[dict]], skew: float, seed: int):
+        self._services = sorted(traffic, key=lambda s: len(traffic[s]), reverse=True)
+        self._traffic = traffic
+        self._weights = [1.0 / (rank ** skew) for rank in range(1, len(self._services) + 1)]
+        self._positions = Counter()
+        self._sessions: Dict[str, str] = {}
+        self._rng = random.Random(seed)
+
+    def next(self) -> dict:
+        service_id = self._rng.choices(self._services, weights=self._weights)[0]
+        messages = self._traffic[service_id]
+        item = messages[self._positions[service_id] % len(messages)]
+        self._positions[service_id] += 1
+
+        # Replayed conversations get fresh session ids so recorded sessions are never appended to
+        session_id = None
+        if item["session_id"]:
+            session_id = self._sessions.setdefault(item["session_id"], str(uuid.uuid4()))
+        return {"service_id": service_id, "message": item["message"], "session_id": session_id}
+
+
+# ============================================
+# Load
+# ============================================
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 1)
+
+
+async def run_step(client: httpx.AsyncClient, mix: TrafficMix, rate: float, duration: float,
+                   concurrency: int, timeout: float, poisson: bool, rng: random.Random) -> dict:
+    """Offer `rate` requests/second for `duration` seconds and collect outcomes"""
+    latencies: List[float] = []
+    statuses = Counter()
+    in_flight = 0
+    dropped = 0
+    tasks = []
+
+    async def send(payload: dict):
+        nonlocal in_flight
+        start = time.perf_counter()
+        try:
+            response = await client.post("/api/chat", json=payload, timeout=timeout)
+            statuses[str(response.status_code)] += 1
+            if response.status_code < 400:
+                latencies.append((time.perf_counter() - start) * 1000)
+        except httpx.TimeoutException:
+            statuses["timeout"] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+        finally:
+            in_flight -= 1
+
+    started = time.perf_counter()
+    next_at = started
+    while next_at - started < duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if in_flight >= concurrency:
+            # Client-side saturation: the schedule is open-loop, so this request is lost, not delayed
+            dropped += 1
+        else:
+            in_flight += 1
+            tasks.append(asyncio.create_task(send(mix.next())))
+        next_at += rng.expovariate(rate) if poisson else 1.0 / rate
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    offered = len(tasks) + dropped
+    ok = len(latencies)
+    errors = offered - ok
+    return {
+        "offered_rps": rate,
+        "achieved_rps": round(ok / elapsed, 2),
+        "requests": offered,
+        "ok": ok,
+        "dropped_client_side": dropped,
+        "error_rate": round(errors / offered, 4) if offered else 0.0,
+        "rejected_429": statuses.get("429", 0),
+        "statuses": dict(statuses),
+        "latency_ms": {
+            "p50": _percentile(latencies, 50),
+            "p90": _percentile(latencies, 90),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "max": round(max(latencies), 1) if latencies else None,
+        },
+    }
+
+
+def find_saturation(steps: List[dict], p99_slo_ms: float, max_error_rate: float) -> Optional[float]:
+    """First offered rate where throughput falls behind, p99 breaks the SLO, or errors exceed the budget"""
+    for step in steps:
+        p99 = step["latency_ms"]["p99"]
+        if (step["achieved_rps"] < 0.9 * step["offered_rps"]
+                or step["error_rate"] > max_error_rate
+                or (p99 is not None and p99 > p99_slo_ms)):
+            return step["offered_rps"]
+    return None
+
+
+def _local_client(args) -> httpx.AsyncClient:
+    from benchmarks.standins import StandInSupabase, StandInOpenAI, install_standins
+    from services.embedding import get_embedding_backend
+    from main import app
+
+    install_standins(
+        StandInSupabase(latency_ms=args.db_latency_ms, embedding_method=get_embedding_backend().id),
+        StandInOpenAI(embedding_latency_ms=args.embedding_latency_ms, chat_latency_ms=args.llm_latency_ms),
+    )
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://local")
+
+
+async def main_async(args) -> dict:
+    if args.source == "chat_history":
+        traffic = load_chat_history(args.history_limit)
+        if not traffic:
+            raise SystemExit("chat_history has no user messages to replay")
+    else:
+        traffic = synthetic_traffic(args.tenants, args.seed)
+
+    mix = TrafficMix(traffic, args.skew, args.seed)
+    rng = random.Random(args.seed)
+    rates = [float(r) for r in args.rates.split(",")]
+
+    if args.target == "local":
+        client = _local_client(args)
+    else:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        client = httpx.AsyncClient(base_url=args.target, limits=limits)
+
+    steps = []
+    async with client:
+        for rate in rates:
+            step = await run_step(client, mix, rate, args.duration, args.concurrency, args.timeout, args.poisson, rng)
+            steps.append(step)
+            print(f"rate={rate:g}/s ok={step['ok']} p99={step['latency_ms']['p99']}ms errors={step['error_rate']:.2%}", file=sys.stderr)
+
+    return {
+        "target": args.target,
+        "source": args.source,
+        "tenants": len(traffic),
+        "skew": args.skew,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "saturation_rps": find_saturation(steps, args.p99_slo_ms, args.max_error_rate),
+        "steps": steps,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for /api/chat")
+    parser.add_argument("--target", default="local", help="'local' or a server base URL")
+    parser.add_argument("--source", choices=["synthetic", "chat_history"], default="synthetic")
+    parser.add_argument("--history-limit", type=int, default=5000)
+    parser.add_argument("--tenants", type=int, default=20, help="Synthetic tenants")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent across tenants (0 = uniform)")
+    parser.add_argument("--rates", default="2,5,10,20", help="Comma-separated arrival rates (requests/second)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per rate step")
+    parser.add_argument("--concurrency", type=int, default=256, help="Max in-flight requests")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times")
+    parser.add_argument("--p99-slo-ms", type=float, default=5000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0, help="Local stand-in latency")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0, help="Local stand-in latency")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="Local stand-in latency")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Logging overhead benchmark: time added to a chat request by logging.
+
+Runs the chat pipeline in-process against zero-latency stand-ins for
+Supabase and OpenAI, under three logging setups, and reports the mean
+per-request wall time and CPU time of the request thread, plus overhead
+relative to logging disabled. Request-thread CPU is what logging steals from
+request handling; with the queue handler, formatting and I/O move to the
+listener thread (which still shares the GIL, so wall time in this tight,
+CPU-bound loop is not representative of an I/O-bound server):
+
+  off         root level WARNING (baseline)
+  sync-text   the previous setup: text StreamHandler writing on the request thread
+  queue-json  configure_logging(): JSON lines written by a background thread
+
+Run from the python-server directory:
+    python -m benchmarks.logging_benchmark --requests 2000
+"""
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+
+from benchmarks.standins import StandInSupabase, StandInOpenAI, install_standins
+from services.structured_logging import configure_logging, shutdown_logging, TEXT_DATEFMT
+
+OLD_FORMAT = "%(asctime)s | %(levelname)-8s | %(name)-20s | %(message)s"
+
+
+def _reset_root():
+    shutdown_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+
+def setup(mode: str, sink):
+    _reset_root()
+    root = logging.getLogger()
+    if mode == "off":
+        root.setLevel(logging.WARNING)
+    elif mode == "sync-text":
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter(OLD_FORMAT, datefmt=TEXT_DATEFMT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    elif mode == "queue-json":
+        stdout = sys.stdout
+        sys.stdout = sink
+        try:
+            configure_logging(level="INFO", fmt="json")
+        finally:
+            sys.stdout = stdout
+    else:
+        raise ValueError(mode)
+
+
+def run(mode: str, requests: int) -> dict:
+    from api.routes.chat import _handle_chat
+    from models.schemas import ChatRequest
+
+    with tempfile.TemporaryFile("w") as sink:
+        setup(mode, sink)
+        request = ChatRequest(service_id="bench-service", message="Which items are vegetarian and under $10?")
+        for _ in range(20):
+            _handle_chat(request)
+
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        for _ in range(requests):
+            _handle_chat(request)
+        cpu = time.thread_time() - cpu_start
+        elapsed = time.perf_counter() - start
+        _reset_root()
+    return {"wall_ms": elapsed / requests * 1000, "request_thread_cpu_ms": cpu / requests * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure logging overhead per chat request")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    install_standins(
+        StandInSupabase(latency_ms=0, embedding_method="openai-text-embedding-3-small"),
+        StandInOpenAI(embedding_latency_ms=0, chat_latency_ms=0),
+    )
+
+    results = {mode: run(mode, args.requests) for mode in ("off", "sync-text", "queue-json")}
+    baseline = results["off"]
+    print(json.dumps({
+        "requests": args.requests,
+        "per_request_ms": {
+            mode: {metric: round(value, 3) for metric, value in values.items()}
+            for mode, values in results.items()
+        },
+        "logging_overhead_us": {
+            mode: {metric: round((value - baseline[metric]) * 1000, 1) for metric, value in values.items()}
+            for mode, values in results.items() if mode != "off"
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Chat latency and 429s while bulk ingestion saturates the embeddings rate limit.
+
+A simulated OpenAI upstream (httpx.MockTransport) enforces per-model request
+and token limits the way the API does: continuously refilling budgets,
+x-ratelimit-* headers on every response, 429 with retry-after-ms when a
+request doesn't fit. Bulk threads embed chunk batches as fast as they can
+while chat traffic embeds one query and requests a completion at a fixed
+rate. Both use real OpenAI SDK clients, run once over plain transports and
+once through services.quota.QuotaTransport sharing one QuotaScheduler.
+
+Run from the python-server directory:
+    python -m benchmarks.quota_benchmark --duration 20
+"""
+import argparse
+import base64
+import json
+import statistics
+import threading
+import time
+from typing import Dict, Any
+
+import httpx
+import numpy as np
+
+from config import CHAT_MODEL, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+from services.clients import INTERACTIVE, BULK
+from services.quota import QuotaScheduler, QuotaTransport, estimate_tokens
+
+
+class SimulatedUpstream:
+    """Per-model RPM/TPM budgets with continuous refill, like the OpenAI API"""
+
+    def __init__(self, limits: Dict[str, Dict[str, float]], latency_ms: Dict[str, float]):
+        self.limits = limits
+        self.latency_ms = latency_ms
+        self.levels = {model: dict(limit) for model, limit in limits.items()}
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._vector = base64.b64encode(np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32).tobytes()).decode()
+
+    def _headers(self, model: str) -> Dict[str, str]:
+        headers = {}
+        for resource, limit in self.limits[model].items():
+            level = self.levels[model][resource]
+            headers[f"x-ratelimit-limit-{resource}"] = str(int(limit))
+            headers[f"x-ratelimit-remaining-{resource}"] = str(max(0, int(level)))
+            headers[f"x-ratelimit-reset-{resource}"] = f"{max(0.0, (limit - level) / (limit / 60.0)):.3f}s"
+        return headers
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        model, tokens = estimate_tokens(request.content)
+        cost = {"requests": 1, "tokens": tokens}
+        with self._lock:
+            now = time.monotonic()
+            for m, limit in self.limits.items():
+                for resource, value in limit.items():
+                    self.levels[m][resource] = min(value, self.levels[m][resource] + (now - self.updated_at) * value / 60.0)
+            self.updated_at = now
+            levels = self.levels[model]
+            short = max((cost[r] - levels[r]) / (self.limits[model][r] / 60.0) for r in levels)
+            if short > 0:
+                headers = self._headers(model)
+                headers["retry-after-ms"] = str(int(short * 1000) + 1)
+                return httpx.Response(429, headers=headers, json={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}})
+            for resource in levels:
+                levels[resource] -= cost[resource]
+            headers = self._headers(model)
+
+        time.sleep(self.latency_ms[model] / 1000)
+        payload = json.loads(request.content)
+        if request.url.path.endswith("/embeddings"):
+            inputs = payload["input"] if isinstance(payload["input"], list) else [payload["input"]]
+            body = {
+                "object": "list", "model": model,
+                "data": [{"object": "embedding", "index": i, "embedding": self._vector} for i in range(len(inputs))],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        else:
+            body = {
+                "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "Simulated answer."}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": tokens, "completion_tokens": 3, "total_tokens": tokens + 3},
+            }
+        return httpx.Response(200, headers=headers, json=body)
+
+
+def _client(upstream: SimulatedUpstream, scheduler: QuotaScheduler, pool: str, rejected: Dict[str, int]):
+    from openai import OpenAI
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        response = upstream.handle(request)
+        if response.status_code == 429:
+            rejected[pool] += 1
+        return response
+
+    transport = httpx.MockTransport(handle)
+    if scheduler is not None:
+        transport = QuotaTransport(transport, scheduler, pool)
+    return OpenAI(api_key="sk-bench", base_url="http://openai.bench/v1", http_client=httpx.Client(transport=transport), max_retries=2)
+
+
+def run(args, scheduled: bool) -> Dict[str, Any]:
+    upstream = SimulatedUpstream(
+        limits={
+            EMBEDDING_MODEL: {"requests": args.embedding_rpm, "tokens": args.embedding_tpm},
+            CHAT_MODEL: {"requests": args.chat_rpm, "tokens": args.chat_tpm},
+        },
+        latency_ms={EMBEDDING_MODEL: args.embedding_latency_ms, CHAT_MODEL: args.chat_latency_ms},
+    )
+    scheduler = QuotaScheduler(interactive_reserve=args.reserve, interactive_max_wait=5.0) if scheduled else None
+    rejected = {INTERACTIVE: 0, BULK: 0}
+    bulk = _client(upstream, scheduler, BULK, rejected)
+    interactive = _client(upstream, scheduler, INTERACTIVE, rejected)
+
+    stop = threading.Event()
+    batch = [f"Row {i} | Customer: Example Customer {i} | Plan: Business | Region: EMEA | Notes: " + "renewal pending " * 8 for i in range(args.batch_size)]
+    embedded = [0]
+    bulk_errors = [0]
+
+    def ingest():
+        while not stop.is_set():
+            try:
+                bulk.embeddings.create(input=batch, model=EMBEDDING_MODEL, encoding_format="base64")
+                embedded[0] += len(batch)
+            except Exception:
+                bulk_errors[0] += 1
+
+    chat_latencies, chat_failures = [], [0]
+
+    def chat_once(n: int):
+        start = time.perf_counter()
+        try:
+            interactive.embeddings.create(input=[f"What is the renewal status of customer {n}?"], model=EMBEDDING_MODEL, encoding_format="base64")
+            interactive.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=[{"role": "system", "content": "Answer from context."}, {"role": "user", "content": "context " * 300}],
+                max_tokens=256,
+            )
+            chat_latencies.append((time.perf_counter() - start) * 1000)
+        except Exception:
+            chat_failures[0] += 1
+
+    workers = [threading.Thread(target=ingest, daemon=True) for _ in range(args.bulk_threads)]
+    for worker in workers:
+        worker.start()
+    time.sleep(args.warmup)  # Let ingestion drain the initial budget first
+
+    chats = []
+    start = time.monotonic()
+    n = 0
+    while time.monotonic() - start < args.duration:
+        thread = threading.Thread(target=chat_once, args=(n,), daemon=True)
+        thread.start()
+        chats.append(thread)
+        n += 1
+        time.sleep(1 / args.chat_rps)
+    for thread in chats:
+        thread.join()
+    elapsed = time.monotonic() - start + args.warmup
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    ordered = sorted(chat_latencies)
+    report = {
+        "scheduler": scheduled,
+        "chat_requests": n,
+        "chat_failed": chat_failures[0],
+        "chat_ms_p50": round(statistics.median(ordered), 1) if ordered else None,
+        "chat_ms_p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1) if ordered else None,
+        "chat_429": rejected[INTERACTIVE],
+        "bulk_429": rejected[BULK],
+        "chunks_embedded_per_s": round(embedded[0] / elapsed, 1),
+        "bulk_errors": bulk_errors[0],
+    }
+    if scheduler is not None:
+        report["quota"] = scheduler.metrics()["classes"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat vs bulk ingestion under shared OpenAI rate limits")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--chat-rps", type=float, default=2.0)
+    parser.add_argument("--bulk-threads", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--embedding-tpm", type=float, default=1_000_000)
+    parser.add_argument("--embedding-rpm", type=float, default=120)
+    parser.add_argument("--chat-tpm", type=float, default=300_000)
+    parser.add_argument("--chat-rpm", type=float, default=500)
+    parser.add_argument("--embedding-latency-ms", type=float, default=80.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0)
+    parser.add_argument("--reserve", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = [run(args, scheduled=False), run(args, scheduled=True)]
+    print(json.dumps({"duration_s": args.duration, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+In-process stand-ins for Supabase and OpenAI used by benchmarks and load tests.
+
+They implement only the calls the server makes, with configurable latency, so
+the real request path (admission, retrieval, memory, serialization) can be
+exercised without network access or credentials.
+"""
+import base64
+import hashlib
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import numpy as np
+
+from config import EMBEDDING_DIMENSIONS
+
+
+def _sleep_ms(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> List[float]:
+    """Deterministic unit vector derived from the text"""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+# ============================================
+# Supabase
+# ============================================
+
+def _contains(document, subset) -> bool:
+    """JSONB @> for nested dicts"""
+    if isinstance(subset, dict):
+        return isinstance(document, dict) and all(k in document and _contains(document[k], v) for k, v in subset.items())
+    return document == subset
+
+
+def _column(row: dict, column: str):
+    """Column value, following PostgREST JSON paths like metadata->ingestion->>run_id"""
+    value = row
+    for key in column.replace("->>", "->").split("->"):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+class _Query:
+    """Chainable query builder mimicking the postgrest-py surface the server uses"""
+
+    def __init__(self, store: "StandInSupabase", table: str):
+        self._store = store
+        self._table = table
+        self._op = "select"
+        self._payload = None
+        self._filters: List[tuple] = []
+        self._predicates: List = []
+        self._order = None
+        self._limit = None
+        self._offset = 0
+        self._single = False
+        self._count = None
+        self._on_conflict = None
+
+    def select(self, columns: str = "*", count: str = None):
+        self._count = count
+        return self
+
+    def insert(self, rows, **kwargs):
+        self._op, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = None, **kwargs):
+        self._op, self._payload = "insert", rows
+        self._on_conflict = on_conflict
+        return self
+
+    def update(self, data: dict):
+        self._op, self._payload = "update", data
+        return self
+
+    def delete(self, **kwargs):
+        self._op = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self._filters.append((column, value))
+        return self
+
+    def gte(self, column: str, value):
+        self._predicates.append(lambda r: _column(r, column) is not None and _column(r, column) >= value)
+        return self
+
+    def gt(self, column: str, value):
+        self._predicates.append(lambda r: _column(r, column) is not None and _column(r, column) > value)
+        return self
+
+    def in_(self, column: str, values):
+        values = set(values)
+        self._predicates.append(lambda r: _column(r, column) in values)
+        return self
+
+    def contains(self, column: str, value: dict):
+        self._predicates.append(lambda r: _contains(r.get(column) or {}, value))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def range(self, start: int, end: int):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def execute(self):
+        _sleep_ms(self._store.latency_ms)
+        return self._store._execute(self)
+
+
+class StandInSupabase:
+    """Minimal in-memory Supabase client"""
+
+    def __init__(self, latency_ms: float = 5.0, chunks_per_service: int = 500, embedding_method: str = None):
+        self.latency_ms = latency_ms
+        self.chunks_per_service = chunks_per_service
+        self.embedding_method = embedding_method
+        self.tables: Dict[str, List[Dict[str, Any]]] = {"chat_history": [], "sources": [], "chunks": []}
+        self.storage = SimpleNamespace(from_=lambda bucket: SimpleNamespace(download=lambda path: b""))
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: dict) -> SimpleNamespace:
+        store = self
+
+        def execute():
+            _sleep_ms(store.latency_ms)
+            if name != "match_chunks":
+                raise Exception(f"function {name} does not exist")
+            count = min(params.get("match_count", 5), store.chunks_per_service)
+            return SimpleNamespace(data=[
+                {
+                    "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{params['match_service_id']}/{i}")),
+                    "content": f"Item: Stand-in item {i} | Price: {5 + i} | Category: Demo",
+                    "metadata": {"original_row_index": i},
+                    "similarity": 0.9 - i * 0.05,
+                }
+                for i in range(count)
+            ], count=None)
+
+        return SimpleNamespace(execute=execute)
+
+    def _rows(self, query: _Query) -> List[Dict[str, Any]]:
+        rows = [
+            r for r in self.tables.setdefault(query._table, [])
+            if all(_column(r, c) == v for c, v in query._filters) and all(p(r) for p in query._predicates)
+        ]
+        if query._order:
+            column, desc = query._order
+            rows.sort(key=lambda r: r.get(column) or "", reverse=desc)
+        return rows
+
+    def _execute(self, query: _Query) -> SimpleNamespace:
+        filters = dict(query._filters)
+
+        if query._op == "insert":
+            payload = query._payload if isinstance(query._payload, list) else [query._payload]
+            inserted = []
+            for row in payload:
+                row = dict(row, id=str(uuid.uuid4()), created_at=datetime.now(timezone.utc).isoformat())
+                if query._on_conflict:
+                    keys = query._on_conflict.split(",")
+                    table = self.tables.setdefault(query._table, [])
+                    table[:] = [r for r in table if any(r.get(k) != row.get(k) for k in keys)]
+                # Chunk payloads are large and never read back by the chat path
+                if query._table != "chunks":
+                    self.tables.setdefault(query._table, []).append(row)
+                inserted.append({"id": row["id"]})
+            return SimpleNamespace(data=inserted, count=None)
+
+        if query._op == "update":
+            rows = self._rows(query)
+            for row in rows:
+                row.update(query._payload)
+            return SimpleNamespace(data=rows, count=None)
+
+        if query._op == "delete":
+            return SimpleNamespace(data=[], count=None)
+
+        if query._table == "services":
+            service = {
+                "id": filters.get("id"),
+                "name": f"Stand-in service {str(filters.get('id'))[:8]}",
+                "embedding_method": self.embedding_method,
+            }
+            return SimpleNamespace(data=service if query._single else [service], count=None)
+
+        if query._table == "chunks" and query._count:
+            return SimpleNamespace(data=[], count=self.chunks_per_service)
+
+        rows = self._rows(query)
+        count = len(rows) if query._count else None
+        if query._limit is not None:
+            rows = rows[query._offset:query._offset + query._limit]
+        if query._single:
+            return SimpleNamespace(data=rows[0] if rows else None, count=None)
+        return SimpleNamespace(data=rows, count=count)
+
+
+# ============================================
+# OpenAI
+# ============================================
+
+class StandInOpenAI:
+    """Minimal OpenAI client: embeddings and chat completions with fixed latency"""
+
+    def __init__(self, embedding_latency_ms: float = 50.0, chat_latency_ms: float = 800.0):
+        self.embedding_latency_ms = embedding_latency_ms
+        self.chat_latency_ms = chat_latency_ms
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+
+    def _create_embeddings(self, input, model: str, **kwargs):
+        _sleep_ms(self.embedding_latency_ms)
+        texts = [input] if isinstance(input, str) else input
+        if kwargs.get("encoding_format") == "base64":
+            encode = lambda t: base64.b64encode(np.asarray(fake_embedding(t), dtype=np.float32).tobytes()).decode()
+            return SimpleNamespace(data=[SimpleNamespace(embedding=encode(t)) for t in texts])
+        return SimpleNamespace(data=[SimpleNamespace(embedding=fake_embedding(t)) for t in texts])
+
+    def _create_completion(self, model: str, messages: list, **kwargs):
+        _sleep_ms(self.chat_latency_ms)
+        prompt_chars = sum(len(m["content"]) for m in messages)
+        content = f"Stand-in answer based on {prompt_chars} prompt characters."
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_chars // 4, completion_tokens=12, total_tokens=prompt_chars // 4 + 12),
+        )
+
+
+def install_standins(supabase: StandInSupabase, openai: StandInOpenAI):
+    """Point the server's shared clients at the stand-ins"""
+    from services.clients import get_client_manager
+
+    get_client_manager().install(supabase=supabase, openai=openai)
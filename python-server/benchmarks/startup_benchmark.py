@@ -0,0 +1,107 @@
+"""
+Startup benchmark: measures how long `import main` takes and how long a
+fresh uvicorn process needs before /api/health and /api/ready answer 200.
+
+Run from the python-server directory:
+    python -m benchmarks.startup_benchmark --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time, sys
+start = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [m for m in ("pandas", "numpy", "openpyxl", "supabase", "openai") if m in sys.modules]
+print(f"{elapsed:.1f} {','.join(heavy)}")
+"""
+
+
+def measure_import() -> dict:
+    """Import the app in a clean interpreter and report time and heavy modules loaded"""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=SERVER_DIR, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    elapsed, _, heavy = output.partition(" ")
+    return {"import_ms": float(elapsed), "heavy_modules_loaded": [m for m in heavy.split(",") if m]}
+
+
+def _wait_for(url: str, deadline: float) -> float:
+    """Poll a URL until it returns 200; returns the time it first did"""
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} not ready before deadline")
+
+
+def measure_boot(port: int, timeout: float) -> dict:
+    """Start uvicorn and time until the server is live and then ready"""
+    env = dict(os.environ, DEBUG="false")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + timeout
+        live_at = _wait_for(f"http://127.0.0.1:{port}/api/health", deadline)
+        result = {"live_ms": round((live_at - start) * 1000, 1)}
+        try:
+            ready_at = _wait_for(f"http://127.0.0.1:{port}/api/ready", deadline)
+            result["ready_ms"] = round((ready_at - start) * 1000, 1)
+        except TimeoutError:
+            result["ready_ms"] = None
+        return result
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def _summary(values: list) -> dict:
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"median": None, "min": None, "max": None}
+    return {"median": round(statistics.median(values), 1), "min": min(values), "max": max(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Piona server import and boot time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--skip-boot", action="store_true", help="Only measure import time")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "import_ms": _summary([r["import_ms"] for r in imports]),
+        "heavy_modules_loaded": imports[-1]["heavy_modules_loaded"],
+    }
+
+    if not args.skip_boot:
+        boots = [measure_boot(args.port, args.timeout) for _ in range(args.runs)]
+        report["live_ms"] = _summary([b["live_ms"] for b in boots])
+        report["ready_ms"] = _summary([b["ready_ms"] for b in boots])
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Retrieval latency of the local (embedded) vector store, and against Supabase.
+
+Synthetic mode (default) fills a temporary LocalVectorStore with clustered
+unit vectors and reports p50/p95 latency of exact search and of IVF search
+for each probes value, with recall@k against the exact result.
+
+With --supabase-service-id it copies that service's chunks (content,
+metadata and stored embeddings, nothing is re-embedded) from the configured
+Supabase project into a temporary local store, then runs the same sampled
+queries through both backends' search() and reports latency and overlap.
+
+Run from the python-server directory:
+    python -m benchmarks.vector_store_benchmark --chunks 100000
+    python -m benchmarks.vector_store_benchmark --supabase-service-id <uuid>
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, Any, List
+
+import numpy as np
+
+from services.chunks import ChunkSet
+from services.local_store import LocalVectorStore
+
+
+def _timed(search, queries: List[np.ndarray]):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query.tolist()))
+        latencies.append((time.perf_counter() - start) * 1000)
+    ordered = sorted(latencies)
+    return results, {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+    }
+
+
+def _recall(results, truth) -> float:
+    hits = [len({r["id"] for r in found} & {r["id"] for r in expected}) / max(1, len(expected)) for found, expected in zip(results, truth)]
+    return round(sum(hits) / len(hits), 4)
+
+
+def _fill(store: LocalVectorStore, service_id: str, vectors: np.ndarray, contents: List[str], metadata: List[Dict[str, Any]] = None, batch: int = 5000):
+    chunks = ChunkSet([])
+    for i, content in enumerate(contents):
+        chunks.add(content, f"row_{i}", metadata[i] if metadata else {"original_row_index": i})
+    source_id = str(uuid.uuid4())
+    for start in range(0, len(chunks), batch):
+        stop = min(start + batch, len(chunks))
+        chunks.attach_embeddings(start, vectors[start:stop])
+        store.save_chunks(chunks, source_id, service_id, start, stop)
+
+
+def run_synthetic(args) -> Dict[str, Any]:
+    rng = np.random.default_rng(args.seed)
+    # Clustered vectors: real embeddings of one table are far from uniform
+    centers = rng.standard_normal((max(1, args.chunks // 500), args.dimensions)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=args.chunks)] + 0.6 * rng.standard_normal((args.chunks, args.dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(args.chunks, args.queries, replace=False)] + 0.1 * rng.standard_normal((args.queries, args.dimensions)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = LocalVectorStore(directory, ann_min_chunks=0)
+        service_id = str(uuid.uuid4())
+        start = time.perf_counter()
+        _fill(store, service_id, vectors, [f"Item {i}" for i in range(args.chunks)])
+        load_s = time.perf_counter() - start
+
+        truth, exact = _timed(lambda q: store.search_exact(service_id, q, args.k, -1.0), queries)
+        results = [{"search": "exact", "recall_at_k": 1.0, **exact}]
+        print(f"exact        p50={exact['p50_ms']}ms", file=sys.stderr)
+
+        start = time.perf_counter()
+        store.search(service_id, queries[0].tolist(), args.k, -1.0)  # Builds the IVF index
+        build_s = time.perf_counter() - start
+        for probes in args.probes:
+            found, timing = _timed(lambda q: store.search(service_id, q, args.k, -1.0, probes=probes), queries)
+            results.append({"search": f"ivf probes={probes}", "recall_at_k": _recall(found, truth), **timing})
+            print(f"probes={probes:<5} p50={timing['p50_ms']}ms recall={results[-1]['recall_at_k']}", file=sys.stderr)
+        store.close()
+
+    return {
+        "mode": "synthetic",
+        "chunks": args.chunks,
+        "dimensions": args.dimensions,
+        "k": args.k,
+        "load_seconds": round(load_s, 2),
+        "ivf_build_seconds": round(build_s, 2),
+        "results": results,
+    }
+
+
+def run_against_supabase(args) -> Dict[str, Any]:
+    from services.vector_index import _parse_vector
+    from services.vector_store import SupabaseVectorStore
+
+    remote = SupabaseVectorStore()
+    client = remote._client()
+    rows, page = [], 1000
+    while True:
+        batch = (
+            client.table("chunks").select("content, metadata, embedding")
+            .eq("service_id", args.supabase_service_id).order("chunk_index").range(len(rows), len(rows) + page - 1)
+            .execute().data or []
+        )
+        rows.extend(batch)
+        if len(batch) < page:
+            break
+    if not rows:
+        raise SystemExit("Service has no chunks")
+    print(f"Copied {len(rows)} chunks", file=sys.stderr)
+
+    vectors = np.array([_parse_vector(r["embedding"]) for r in rows], dtype=np.float32)
+    rng = np.random.default_rng(args.seed)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        local = LocalVectorStore(directory)
+        _fill(local, args.supabase_service_id, vectors, [r["content"] for r in rows], [r.get("metadata") or {} for r in rows])
+
+        # Ids differ between the copies, so compare by content
+        remote_found, remote_timing = _timed(lambda q: remote.search(args.supabase_service_id, q, args.k, -1.0), queries)
+        local_found, local_timing = _timed(lambda q: local.search(args.supabase_service_id, q, args.k, -1.0), queries)
+        overlap = [
+            len({r["content"] for r in a} & {r["content"] for r in b}) / max(1, len(a))
+            for a, b in zip(local_found, remote_found)
+        ]
+        local.close()
+
+    return {
+        "mode": "supabase",
+        "service_id": args.supabase_service_id,
+        "chunks": len(rows),
+        "k": args.k,
+        "results": [{"store": "supabase", **remote_timing}, {"store": "local", **local_timing}],
+        "result_overlap": round(sum(overlap) / len(overlap), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local vector store latency and recall")
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--probes", type=lambda v: [int(p) for p in v.split(",")], default=[1, 4, 16, 64])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--supabase-service-id", help="Compare against this service in the configured Supabase project")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run_against_supabase(args) if args.supabase_service_id else run_synthetic(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
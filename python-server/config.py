@@ -7,6 +7,7 @@ load_dotenv(dotenv_path="../.env.local")
 # Supabase
 SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")  # Direct Postgres connection, only for admin index builds (needs psycopg)
 
 # OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -16,11 +17,70 @@ HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", 8000))
 DEBUG = os.getenv("DEBUG", "true").lower() == "true"
 
+# Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if DEBUG else "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # 'json' or 'text'
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 0.1))  # Fraction of DEBUG lines kept
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))  # Records beyond this are dropped, never blocking requests
+
 # Embedding settings
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIMENSIONS = 1536
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")  # 'openai' or 'hashing' (local, offline CPU)
 
 # Chat settings
 CHAT_MODEL = "gpt-4o"
 MAX_CONTEXT_CHUNKS = 5
 SIMILARITY_THRESHOLD = 0.3  # Lower threshold for better recall
+
+# Session memory settings
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", 1000))  # Sessions kept in the in-memory LRU
+MEMORY_RECENT_MESSAGES = 6  # Verbatim messages kept in the prompt
+MEMORY_MAX_CHARS = 6000  # Budget for verbatim history; older turns are summarized
+MEMORY_MESSAGE_MAX_CHARS = 2000  # Per-message cap inside the prompt
+MEMORY_LOAD_LIMIT = 50  # Messages per chat_history read when loading a session, and per summarization call
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_MAX_CHARS = 1500
+
+# Admission control (per-tenant fairness on a single worker)
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", 8))
+ADMISSION_CHAT_RESERVED = int(os.getenv("ADMISSION_CHAT_RESERVED", 2))  # Slots bulk ingestion may never take
+CHAT_CONCURRENCY_PER_SERVICE = int(os.getenv("CHAT_CONCURRENCY_PER_SERVICE", 4))
+INGEST_CONCURRENCY_PER_SERVICE = int(os.getenv("INGEST_CONCURRENCY_PER_SERVICE", 1))
+ADMISSION_QUEUE_LIMIT_PER_SERVICE = int(os.getenv("ADMISSION_QUEUE_LIMIT_PER_SERVICE", 16))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", 10.0))  # seconds
+
+# Admin
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")  # Required for /api/admin endpoints and on-demand profiling
+
+# Request profiling (opt-in)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))  # Fraction of requests profiled automatically
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
+
+# Ingestion
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 500))  # Chunks embedded and saved per checkpoint
+# A 'processing' source whose heartbeat (sources.updated_at) is older than this many
+# expected batch times, and at least INGEST_STALE_MIN_SECONDS, is treated as interrupted
+INGEST_STALE_BATCHES = int(os.getenv("INGEST_STALE_BATCHES", 5))
+INGEST_STALE_MIN_SECONDS = float(os.getenv("INGEST_STALE_MIN_SECONDS", 300))
+
+# Vector store: 'supabase' (pgvector via match_chunks) or 'local' (embedded SQLite + memory-mapped
+# vectors on this node, for single-node installs whose corpus fits in RAM)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "supabase")
+LOCAL_STORE_DIR = os.getenv("LOCAL_STORE_DIR", "vector_store")
+LOCAL_ANN_MIN_CHUNKS = int(os.getenv("LOCAL_ANN_MIN_CHUNKS", 50000))  # Smaller services are always searched exactly
+LOCAL_ANN_PROBES = int(os.getenv("LOCAL_ANN_PROBES", 16))  # Inverted lists scanned per query (overridden by `probes`)
+
+# Outbound HTTP connection pools, per process. 'interactive' serves chat, 'bulk' serves ingestion.
+SUPABASE_POOL_INTERACTIVE = int(os.getenv("SUPABASE_POOL_INTERACTIVE", 16))
+SUPABASE_POOL_BULK = int(os.getenv("SUPABASE_POOL_BULK", 6))
+OPENAI_POOL_INTERACTIVE = int(os.getenv("OPENAI_POOL_INTERACTIVE", 16))
+OPENAI_POOL_BULK = int(os.getenv("OPENAI_POOL_BULK", 6))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60.0))  # Idle seconds before a pooled connection is closed
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", 10.0))  # Max wait for a free connection
+HTTP_RETIRED_POOL_GRACE = float(os.getenv("HTTP_RETIRED_POOL_GRACE", 60.0))  # Max seconds a replaced pool stays open for requests still on it
+
+# OpenAI rate limits are shared by chat and ingestion; budgets are learned per model from response headers
+OPENAI_QUOTA_INTERACTIVE_RESERVE = float(os.getenv("OPENAI_QUOTA_INTERACTIVE_RESERVE", 0.25))  # Share of each limit bulk ingestion leaves for chat
+OPENAI_QUOTA_INTERACTIVE_MAX_WAIT = float(os.getenv("OPENAI_QUOTA_INTERACTIVE_MAX_WAIT", 5.0))  # Seconds chat waits for budget before sending anyway
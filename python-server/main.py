@@ -1,18 +1,18 @@
 import logging
-import sys
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api.routes import health, process, chat
-from config import DEBUG
-
-
-logging.basicConfig(
-    level=logging.DEBUG if DEBUG else logging.INFO,
-    format='%(asctime)s | %(levelname)-8s | %(name)-20s | %(message)s',
-    datefmt='%H:%M:%S',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
+from fastapi.middleware.gzip import GZipMiddleware
+from services.profiling import ProfilingMiddleware
+from services.structured_logging import configure_logging, shutdown_logging, RequestContextMiddleware
+from api.routes import health, process, chat, metrics, admin
+from config import DEBUG, LOG_LEVEL, LOG_FORMAT, LOG_DEBUG_SAMPLE_RATE, LOG_QUEUE_SIZE
+
+
+configure_logging(
+    level=LOG_LEVEL,
+    fmt=LOG_FORMAT,
+    debug_sample_rate=LOG_DEBUG_SAMPLE_RATE,
+    queue_size=LOG_QUEUE_SIZE
 )
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("httpcore").setLevel(logging.WARNING)
@@ -48,39 +48,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses for clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Opt-in request profiling (X-Profile header from admins, or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware)
+
+# Outermost: assigns the correlation id used by logs and profiles
+app.add_middleware(RequestContextMiddleware)
+
 app.include_router(health.router, prefix="/api", tags=["Health"])
 app.include_router(process.router, prefix="/api", tags=["Processing"])
 app.include_router(chat.router, prefix="/api", tags=["Chat"])
+app.include_router(metrics.router, prefix="/api", tags=["Metrics"])
+app.include_router(admin.router, prefix="/api", tags=["Admin"])
 
 
 @app.on_event("startup")
 async def startup_event():
-    from config import HOST, PORT, EMBEDDING_MODEL, CHAT_MODEL, MAX_CONTEXT_CHUNKS, SIMILARITY_THRESHOLD, SUPABASE_URL, OPENAI_API_KEY
+    from config import HOST, PORT, EMBEDDING_MODEL, CHAT_MODEL, MAX_CONTEXT_CHUNKS, SIMILARITY_THRESHOLD, SUPABASE_URL, OPENAI_API_KEY, VECTOR_STORE
     from services.database import init_database
+    from services.embedding import init_openai
+    from services.retrieval import warm_retrieval
+    from services.warmup import register_warmup, start_warmups
 
     logger.info("=" * 60)
     logger.info("🚀 PIONA RAG SERVER STARTING")
     logger.info("=" * 60)
 
-    # Initialize database connection
-    db_connected = init_database()
-    if not db_connected:
-        logger.warning("Database connection failed - will retry on first request")
+    # Warm up Supabase, OpenAI and retrieval in parallel without blocking startup.
+    # /api/ready reports 503 until all of them have succeeded.
+    register_warmup("database", init_database)
+    register_warmup("openai", init_openai)
+    register_warmup("retrieval", warm_retrieval)
+    start_warmups()
 
-    logger.info(f"Debug mode: {DEBUG}")
-    logger.info(f"Server: {HOST}:{PORT}")
-    logger.info(f"Docs: /docs" if DEBUG else "Docs: disabled")
+    logger.info("Debug mode: %s", DEBUG)
+    logger.info("Server: %s:%s", HOST, PORT)
+    logger.info("Docs: /docs" if DEBUG else "Docs: disabled")
     logger.info("-" * 60)
     logger.info("Configuration:")
-    logger.info(f"  Supabase URL: {SUPABASE_URL[:30]}..." if SUPABASE_URL else "  Supabase URL: NOT SET ⚠️")
-    logger.info(f"  OpenAI API Key: {'***' + OPENAI_API_KEY[-4:] if OPENAI_API_KEY else 'NOT SET ⚠️'}")
-    logger.info(f"  Embedding model: {EMBEDDING_MODEL}")
-    logger.info(f"  Chat model: {CHAT_MODEL}")
-    logger.info(f"  Max context chunks: {MAX_CONTEXT_CHUNKS}")
-    logger.info(f"  Similarity threshold: {SIMILARITY_THRESHOLD}")
+    logger.info("  Supabase URL: %s", SUPABASE_URL[:30] + "..." if SUPABASE_URL else "NOT SET ⚠️")
+    logger.info("  OpenAI API Key: %s", '***' + OPENAI_API_KEY[-4:] if OPENAI_API_KEY else 'NOT SET ⚠️')
+    logger.info("  Embedding model: %s", EMBEDDING_MODEL)
+    logger.info("  Chat model: %s", CHAT_MODEL)
+    logger.info("  Max context chunks: %s", MAX_CONTEXT_CHUNKS)
+    logger.info("  Similarity threshold: %s", SIMILARITY_THRESHOLD)
+    logger.info("  Vector store: %s", VECTOR_STORE)
     logger.info("=" * 60)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    from services.clients import get_client_manager
+
+    from services.vector_store import get_vector_store
+
+    logger.info("Piona RAG server shutting down")
+    get_client_manager().close()
+    get_vector_store().close()
+    shutdown_logging()
+
+
 @app.get("/")
 async def root():
     return {
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
+from uuid import UUID
 
 
 # ============================================
@@ -11,17 +12,30 @@ class ProcessFileRequest(BaseModel):
     source_id: str
     service_id: str
     file_path: str
-    file_type: str  # 'csv' or 'excel'
+    file_type: str  # 'csv', 'excel', 'parquet' or 'arrow'
     chunk_size: int = 500
     chunk_overlap: int = 50
+    chunking_strategy: Literal["row", "packed"] = "row"  # 'row' (one chunk per row) or 'packed' (rows packed up to chunk_size)
+    pack_key_column: Optional[str] = None  # With 'packed', only rows sharing this column's value share a chunk
+
+
+class RetrievalFilters(BaseModel):
+    """Narrow retrieval within a service; all set filters must match"""
+    source_ids: Optional[List[UUID]] = Field(None, min_length=1, max_length=100)  # Malformed ids are a 422, not a database error
+    sheet: Optional[str] = None  # Excel sheet the rows came from
+    columns: Optional[Dict[str, str]] = None  # Column values a row must have (row-chunked sources)
+    created_after: Optional[datetime] = None  # Only chunks processed after this time
 
 
 class ChatRequest(BaseModel):
     service_id: str
     message: str
     session_id: Optional[str] = None
-    conversation_history: Optional[List[Dict[str, str]]] = None
+    conversation_history: Optional[List[Dict[str, str]]] = None  # Deprecated: history is kept server-side per session_id
     style_guidelines: Optional[str] = None
+    # 'minimal': answer + chunk ids/scores, 'standard': + chunk content, 'debug': + prompt, context and full metadata
+    response_profile: Literal["minimal", "standard", "debug"] = "standard"
+    filters: Optional[RetrievalFilters] = None
 
 
 class ReprocessRequest(BaseModel):
@@ -30,6 +44,18 @@ class ReprocessRequest(BaseModel):
     chunk_overlap: int = 50
 
 
+class VectorIndexRequest(BaseModel):
+    method: Literal["hnsw", "ivfflat"] = "hnsw"
+    m: int = Field(16, ge=2, le=100)  # HNSW graph degree
+    ef_construction: int = Field(64, ge=4, le=1000)
+    lists: Optional[int] = Field(None, ge=1, le=32768)  # ivfflat; defaults to rows / 1000
+
+
+class SearchSettings(BaseModel):
+    probes: Optional[int] = Field(None, ge=1, le=32768)  # ivfflat.probes
+    ef_search: Optional[int] = Field(None, ge=1, le=1000)  # hnsw.ef_search
+
+
 # ============================================
 # Response Models
 # ============================================
@@ -39,19 +65,24 @@ class ProcessingStatus(BaseModel):
     status: str  # 'processing', 'completed', 'failed'
     chunks_created: int = 0
     error_message: Optional[str] = None
+    # Populated from the ingestion checkpoint while a file is being processed
+    chunks_total: Optional[int] = None
+    progress_percent: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    resumable: bool = False
 
 
 class ChunkInfo(BaseModel):
     id: str
-    content: str
+    content: Optional[str] = None
     similarity: float
-    metadata: Dict[str, Any] = {}
+    metadata: Optional[Dict[str, Any]] = None
 
 
 class ChatResponse(BaseModel):
     response: str
-    prompt_used: str
-    context_used: str
+    prompt_used: Optional[str] = None  # Only with response_profile='debug'
+    context_used: Optional[str] = None  # Only with response_profile='debug'
     chunks_used: List[ChunkInfo]
     session_id: str
     message_id: Optional[str] = None  # ID of the assistant message for feedback
@@ -61,3 +92,9 @@ class HealthResponse(BaseModel):
     status: str
     version: str
     timestamp: datetime
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    uptime_ms: Optional[float] = None
+    checks: Dict[str, Dict[str, Any]] = {}
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+from config import (
+    ADMISSION_MAX_CONCURRENT,
+    ADMISSION_CHAT_RESERVED,
+    CHAT_CONCURRENCY_PER_SERVICE,
+    INGEST_CONCURRENCY_PER_SERVICE,
+    ADMISSION_QUEUE_LIMIT_PER_SERVICE,
+    CHAT_QUEUE_TIMEOUT,
+)
+
+logger = logging.getLogger("piona.admission")
+
+CHAT = "chat"
+INGEST = "ingest"
+PRIORITY = (CHAT, INGEST)  # Interactive chat is always dispatched before bulk ingestion
+
+
+class TenantOverloaded(Exception):
+    """Raised when a service has too much queued work to accept another request"""
+
+    def __init__(self, service_id: str, kind: str, retry_after: int):
+        super().__init__(f"Too many pending {kind} requests for service {service_id}")
+        self.service_id = service_id
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("service_id", "kind", "future", "enqueued_at")
+
+    def __init__(self, service_id: str, kind: str):
+        self.service_id = service_id
+        self.kind = kind
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Per-service concurrency limits with fair, priority-aware queueing.
+
+    Each request class (chat, ingest) has a per-service concurrency limit and a
+    bounded per-service queue. Free slots are handed out round-robin across
+    services, chat before ingestion, and ingestion can never use the slots
+    reserved for chat. Runs on the event loop, so no locking is needed.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        per_service_limits: Dict[str, int],
+        queue_limit: int,
+        queue_timeouts: Dict[str, Optional[float]],
+        chat_reserved: int = 0
+    ):
+        self.max_concurrent = max_concurrent
+        self.per_service_limits = per_service_limits
+        self.queue_limit = queue_limit
+        self.queue_timeouts = queue_timeouts
+        self.chat_reserved = min(chat_reserved, max_concurrent - 1)
+
+        self._active_total = 0
+        self._active: Dict[str, Dict[str, int]] = {kind: {} for kind in PRIORITY}
+        self._queues: Dict[str, "OrderedDict[str, deque]"] = {kind: OrderedDict() for kind in PRIORITY}
+        self._service_time = {kind: 1.0 for kind in PRIORITY}  # EWMA of slot hold time (seconds)
+        self._waits = {kind: deque(maxlen=1000) for kind in PRIORITY}
+        self._admitted = {kind: 0 for kind in PRIORITY}
+        self._rejected = {kind: 0 for kind in PRIORITY}
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def _queue_depth(self, kind: str, service_id: str) -> int:
+        waiters = self._queues[kind].get(service_id)
+        return len(waiters) if waiters else 0
+
+    def _can_start(self, kind: str, service_id: str) -> bool:
+        if self._active_total >= self.max_concurrent:
+            return False
+        if kind != CHAT and self._active_total >= self.max_concurrent - self.chat_reserved:
+            return False
+        return self._active[kind].get(service_id, 0) < self.per_service_limits[kind]
+
+    def _start(self, kind: str, service_id: str, enqueued_at: float):
+        self._active_total += 1
+        self._active[kind][service_id] = self._active[kind].get(service_id, 0) + 1
+        self._admitted[kind] += 1
+        self._waits[kind].append(time.monotonic() - enqueued_at)
+
+    def _dispatch(self):
+        """Hand free slots to queued waiters, round-robin across services"""
+        for kind in PRIORITY:
+            queues = self._queues[kind]
+            progressed = True
+            while progressed and queues:
+                progressed = False
+                for service_id in list(queues):
+                    if self._active_total >= self.max_concurrent:
+                        return
+                    if not self._can_start(kind, service_id):
+                        continue
+                    waiters = queues[service_id]
+                    waiter = waiters.popleft()
+                    if waiters:
+                        queues.move_to_end(service_id)
+                    else:
+                        del queues[service_id]
+                    if waiter.future.done():
+                        # Timed out or cancelled but not yet removed by its own task
+                        progressed = True
+                        continue
+                    self._start(kind, service_id, waiter.enqueued_at)
+                    waiter.future.set_result(None)
+                    progressed = True
+
+    def _retry_after(self, kind: str, service_id: str) -> int:
+        """Estimate seconds until this service's backlog drains"""
+        backlog = self._queue_depth(kind, service_id) + self._active[kind].get(service_id, 0)
+        per_slot = self._service_time[kind] / max(1, self.per_service_limits[kind])
+        return max(1, math.ceil(per_slot * (backlog + 1)))
+
+    def _reject(self, kind: str, service_id: str):
+        self._rejected[kind] += 1
+        retry_after = self._retry_after(kind, service_id)
+        logger.warning("   Admission rejected %s for %s (retry after %ss)", kind, service_id, retry_after)
+        raise TenantOverloaded(service_id, kind, retry_after)
+
+    def _remove_waiter(self, waiter: _Waiter):
+        waiters = self._queues[waiter.kind].get(waiter.service_id)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[waiter.kind][waiter.service_id]
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def check_capacity(self, service_id: str, kind: str):
+        """Fail fast if the service's queue for this class is already full"""
+        if self._queue_depth(kind, service_id) >= self.queue_limit:
+            self._reject(kind, service_id)
+
+    async def acquire(self, service_id: str, kind: str):
+        """Wait for a slot; raises TenantOverloaded if the queue is full or the wait times out"""
+        if not self._queue_depth(kind, service_id) and self._can_start(kind, service_id):
+            self._start(kind, service_id, time.monotonic())
+            return
+
+        self.check_capacity(service_id, kind)
+
+        waiter = _Waiter(service_id, kind)
+        self._queues[kind].setdefault(service_id, deque()).append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter.future, timeout=self.queue_timeouts.get(kind))
+        except asyncio.TimeoutError:
+            # The slot may have been granted just as the timeout fired (3.12+ still raises then)
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(service_id, kind)
+            else:
+                self._remove_waiter(waiter)
+            self._reject(kind, service_id)
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(service_id, kind)
+            else:
+                self._remove_waiter(waiter)
+            raise
+
+    def release(self, service_id: str, kind: str, held_for: float = None):
+        """Return a slot and wake the next waiter"""
+        self._active_total -= 1
+        remaining = self._active[kind].get(service_id, 1) - 1
+        if remaining:
+            self._active[kind][service_id] = remaining
+        else:
+            self._active[kind].pop(service_id, None)
+        if held_for is not None:
+            self._service_time[kind] = 0.8 * self._service_time[kind] + 0.2 * held_for
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, service_id: str, kind: str):
+        """Hold an admission slot for the duration of the block"""
+        await self.acquire(service_id, kind)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(service_id, kind, time.monotonic() - start)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, concurrency and wait-time statistics"""
+        classes = {}
+        for kind in PRIORITY:
+            waits = sorted(self._waits[kind])
+            classes[kind] = {
+                "active": sum(self._active[kind].values()),
+                "queued": sum(len(q) for q in self._queues[kind].values()),
+                "admitted_total": self._admitted[kind],
+                "rejected_total": self._rejected[kind],
+                "avg_service_time_s": round(self._service_time[kind], 3),
+                "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "wait_ms_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+                "per_service": {
+                    service_id: {
+                        "active": self._active[kind].get(service_id, 0),
+                        "queued": self._queue_depth(kind, service_id),
+                    }
+                    for service_id in set(self._active[kind]) | set(self._queues[kind])
+                },
+            }
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active_total": self._active_total,
+            "classes": classes,
+        }
+
+
+_admission: AdmissionController = None
+
+
+def get_admission() -> AdmissionController:
+    """Get or create the process-wide admission controller"""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController(
+            max_concurrent=ADMISSION_MAX_CONCURRENT,
+            per_service_limits={CHAT: CHAT_CONCURRENCY_PER_SERVICE, INGEST: INGEST_CONCURRENCY_PER_SERVICE},
+            queue_limit=ADMISSION_QUEUE_LIMIT_PER_SERVICE,
+            queue_timeouts={CHAT: CHAT_QUEUE_TIMEOUT, INGEST: None},
+            chat_reserved=ADMISSION_CHAT_RESERVED,
+        )
+    return _admission
@@ -0,0 +1,122 @@
+import io
+import logging
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Sequence
+
+import numpy as np
+
+logger = logging.getLogger("piona.chunks")
+
+
+class Chunk:
+    """One chunk of a source; columns, shared metadata and embeddings live on the ChunkSet"""
+
+    __slots__ = ("content", "row_reference", "metadata", "row_values")
+
+    def __init__(self, content: str, row_reference: str, metadata: Dict[str, Any], row_values: Optional[tuple] = None):
+        self.content = content
+        self.row_reference = row_reference
+        self.metadata = metadata
+        self.row_values = row_values  # Cell values aligned with ChunkSet.columns (per-row chunks only)
+
+
+class ChunkSet:
+    """
+    The chunks of one source file, stored compactly while they move through ingestion.
+
+    The column list and shared metadata (sheet) are held once rather than copied
+    into every chunk, a row's cell values are a tuple
+    aligned with `columns` instead of a dict, and embeddings are rows of a
+    float32 matrix (6 KB per 1536-dim vector rather than ~50 KB of Python
+    floats). Only the batch being embedded and saved has embeddings attached.
+    Full chunk records are built per database batch by `records()`.
+    """
+
+    def __init__(self, columns: Sequence[str], metadata: Dict[str, Any] = None):
+        self.columns = [str(c) for c in columns]
+        self.metadata = dict(metadata or {})
+        self.chunks: List[Chunk] = []
+        self._embeddings: Optional[np.ndarray] = None
+        self._embeddings_start = 0
+
+    def add(self, content: str, row_reference: str, metadata: Dict[str, Any], row_values: Optional[tuple] = None):
+        self.chunks.append(Chunk(content, row_reference, metadata, row_values))
+
+    def extend(self, chunks: Iterable[Chunk]):
+        self.chunks.extend(chunks)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        chunk = self.chunks[index]
+        return {"content": chunk.content, "row_reference": chunk.row_reference, "metadata": self.chunk_metadata(index)}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Chunks as plain dicts (built on the fly; for inspection and benchmarks)"""
+        return (self[i] for i in range(len(self.chunks)))
+
+    def contents(self, start: int = 0, stop: int = None) -> List[str]:
+        return [chunk.content for chunk in self.chunks[start:stop]]
+
+    def chunk_metadata(self, index: int) -> Dict[str, Any]:
+        """
+        The metadata stored with a chunk: its own fields plus the shared ones.
+
+        The column list and embedding backend are recorded once on the source
+        (sources.metadata), not on every chunk row.
+        """
+        chunk = self.chunks[index]
+        metadata = {**chunk.metadata, **self.metadata}
+        if chunk.row_values is not None:
+            metadata["row_data"] = dict(zip(self.columns, chunk.row_values))
+        indices = chunk.metadata.get("row_indices")
+        if indices is not None:
+            # Derived for packed chunks rather than stored per chunk
+            metadata["row_count"] = len(indices)
+            metadata["row_references"] = [f"row_{i}" for i in indices]
+        return metadata
+
+    def attach_embeddings(self, start: int, embeddings) -> None:
+        """Attach embeddings for chunks start..start+len(embeddings), replacing the previous batch's"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or start + len(embeddings) > len(self.chunks):
+            raise ValueError(f"Embeddings of shape {embeddings.shape} don't fit chunks {start}..{len(self.chunks)}")
+        self._embeddings = embeddings
+        self._embeddings_start = start
+
+    def embeddings(self, start: int, stop: int) -> np.ndarray:
+        """Attached embeddings for chunks start..stop (a view, not a copy)"""
+        offset = start - self._embeddings_start
+        if self._embeddings is None or offset < 0 or stop - self._embeddings_start > len(self._embeddings):
+            raise ValueError(f"No embeddings attached for chunks {start}..{stop}")
+        return self._embeddings[offset:stop - self._embeddings_start]
+
+    def records(self, source_id: str, service_id: str, start: int, stop: int) -> List[Dict[str, Any]]:
+        """Rows for the chunks table; chunk_index is the chunk's position in the source"""
+        vectors = vector_literals(self.embeddings(start, stop))
+        return [
+            {
+                "source_id": source_id,
+                "service_id": service_id,
+                "content": self.chunks[i].content,
+                "embedding": vector,
+                "chunk_index": i,
+                "row_reference": self.chunks[i].row_reference,
+                "metadata": self.chunk_metadata(i)
+            }
+            for i, vector in zip(range(start, stop), vectors)
+        ]
+
+
+def vector_literals(matrix: np.ndarray) -> List[str]:
+    """
+    pgvector text literals ("[0.1,0.2,...]") for the rows of a float32 matrix.
+
+    Formatted straight from the array; nine significant digits round-trip float32,
+    which is what pgvector stores.
+    """
+    if not len(matrix):
+        return []
+    buffer = io.StringIO()
+    np.savetxt(buffer, matrix, fmt="%.9g", delimiter=",")
+    return [f"[{line}]" for line in buffer.getvalue().splitlines()]
@@ -0,0 +1,408 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Any, Optional, TYPE_CHECKING
+from config import (
+    SUPABASE_URL,
+    SUPABASE_SERVICE_KEY,
+    OPENAI_API_KEY,
+    SUPABASE_POOL_INTERACTIVE,
+    SUPABASE_POOL_BULK,
+    OPENAI_POOL_INTERACTIVE,
+    OPENAI_POOL_BULK,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_POOL_TIMEOUT,
+    HTTP_RETIRED_POOL_GRACE,
+)
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from supabase import Client
+
+logger = logging.getLogger("piona.clients")
+
+INTERACTIVE = "interactive"  # Chat path: latency-sensitive
+BULK = "bulk"  # Ingestion: throughput, must not starve chat of connections
+POOLS = (INTERACTIVE, BULK)
+
+# Which pool the current request/task draws from (propagates into worker threads)
+_current_pool: ContextVar[str] = ContextVar("http_pool", default=INTERACTIVE)
+
+
+@contextmanager
+def use_pool(pool: str):
+    """Route Supabase/OpenAI calls made inside the block through `pool`"""
+    token = _current_pool.set(pool)
+    try:
+        yield
+    finally:
+        _current_pool.reset(token)
+
+
+# ============================================
+# Instrumentation
+# ============================================
+
+class PoolStats:
+    """Connection pool counters for one upstream/pool pair; updated from any thread"""
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.saturated = 0  # Requests that arrived with every connection busy
+        self.pool_timeouts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._waits = deque(maxlen=2048)
+        self._lock = threading.Lock()
+
+    def started(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            saturated = self.in_flight >= self.max_connections
+            if saturated:
+                self.saturated += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return saturated
+
+    def connection_acquired(self, wait_ms: float, new: bool):
+        with self._lock:
+            self._waits.append(wait_ms)
+            if new:
+                self.new_connections += 1
+            else:
+                self.reused_connections += 1
+
+    def finished(self, pool_timeout: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if pool_timeout:
+                self.pool_timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            acquired = self.new_connections + self.reused_connections
+
+            def pct(p: float) -> Optional[float]:
+                return round(waits[min(len(waits) - 1, int(len(waits) * p))], 2) if waits else None
+
+            return {
+                "max_connections": self.max_connections,
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "saturated_requests": self.saturated,
+                "pool_timeouts": self.pool_timeouts,
+                "new_connections": self.new_connections,
+                "reused_connections": self.reused_connections,
+                "reuse_ratio": round(self.reused_connections / acquired, 3) if acquired else None,
+                "pool_wait_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": round(waits[-1], 2) if waits else None},
+            }
+
+
+class InstrumentedTransport:
+    """
+    httpx transport wrapper recording pool wait time and connection reuse.
+
+    Uses httpcore's trace hook: the wait ends when the request either starts
+    opening a new connection or starts writing on a pooled one.
+
+    Also counts its own in-flight requests (stats are shared across resets),
+    so a retired transport can be closed once the requests still on it finish.
+    """
+
+    def __init__(self, transport, stats: PoolStats):
+        self._transport = transport
+        self.stats = stats
+        self.in_flight = 0
+        self._retired = False
+        self._closed = False
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def handle_request(self, request):
+        start = time.perf_counter()
+        acquired = False
+        outer_trace = request.extensions.get("trace")
+
+        def trace(event_name: str, info: dict):
+            nonlocal acquired
+            if not acquired:
+                if event_name.endswith("connect_tcp.started"):
+                    acquired = True
+                    self.stats.connection_acquired((time.perf_counter() - start) * 1000, new=True)
+                elif event_name.endswith("send_request_headers.started"):
+                    acquired = True
+                    self.stats.connection_acquired((time.perf_counter() - start) * 1000, new=False)
+            if outer_trace is not None:
+                outer_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        with self._lock:
+            self.in_flight += 1
+        saturated = self.stats.started()
+        if saturated:
+            logger.debug("   Connection pool saturated (%d in flight)", self.stats.in_flight)
+        pool_timeout = False
+        try:
+            return self._transport.handle_request(request)
+        except Exception as e:
+            pool_timeout = type(e).__name__ == "PoolTimeout"
+            raise
+        finally:
+            self.stats.finished(pool_timeout)
+            with self._lock:
+                self.in_flight -= 1
+                drained = self._retired and self.in_flight == 0
+            if drained:
+                self.close()
+
+    def retire(self, grace: float):
+        """Close once no requests are in flight, or after `grace` seconds at the latest"""
+        with self._lock:
+            self._retired = True
+            drained = self.in_flight == 0
+        if drained:
+            self.close()
+            return
+        self._timer = threading.Timer(grace, self.close)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+        self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# ============================================
+# Client construction
+# ============================================
+
+@lru_cache(maxsize=None)
+def _pooled_supabase_class():
+    """
+    Supabase client whose PostgREST and Storage sub-clients use a given
+    transport. Built lazily because the supabase SDK is slow to import.
+    """
+    import httpx
+    from postgrest import SyncPostgrestClient
+    from storage3 import SyncStorageClient
+    from supabase import Client
+
+    class PooledPostgrestClient(SyncPostgrestClient):
+        def __init__(self, base_url: str, transport, **kwargs):
+            self.transport = transport
+            super().__init__(base_url, **kwargs)
+
+        def create_session(self, base_url, headers, timeout, verify=True):
+            return httpx.Client(base_url=base_url, headers=headers, timeout=timeout, follow_redirects=True, transport=self.transport)
+
+    class PooledStorageClient(SyncStorageClient):
+        def __init__(self, url: str, headers: dict, timeout, transport):
+            self.transport = transport
+            super().__init__(url, headers, timeout)
+
+        def _create_session(self, base_url, headers, timeout, verify=True):
+            return httpx.Client(base_url=base_url, headers=headers, timeout=timeout, follow_redirects=True, transport=self.transport)
+
+    class PooledSupabaseClient(Client):
+        def __init__(self, url: str, key: str, options, transport):
+            self.transport = transport
+            super().__init__(url, key, options)
+
+        @property
+        def postgrest(self):
+            if self._postgrest is None:
+                self._postgrest = PooledPostgrestClient(
+                    self.rest_url,
+                    self.transport,
+                    headers=self.options.headers,
+                    schema=self.options.schema,
+                    timeout=self.options.postgrest_client_timeout,
+                )
+            return self._postgrest
+
+        @property
+        def storage(self):
+            if self._storage is None:
+                self._storage = PooledStorageClient(
+                    self.storage_url,
+                    self.options.headers,
+                    self.options.storage_client_timeout,
+                    self.transport,
+                )
+            return self._storage
+
+    return PooledSupabaseClient
+
+
+class ClientManager:
+    """
+    Process-wide Supabase and OpenAI clients, one set per traffic pool.
+
+    Each (upstream, pool) pair has its own bounded keep-alive connection pool,
+    so bulk ingestion can't hold the connections chat needs. Clients are
+    created on first use and closed on shutdown.
+    """
+
+    def __init__(self, pool_sizes: Dict[str, Dict[str, int]], keepalive_expiry: float, pool_timeout: float, retired_grace: float):
+        self.pool_sizes = pool_sizes
+        self.keepalive_expiry = keepalive_expiry
+        self.pool_timeout = pool_timeout
+        self.retired_grace = retired_grace
+        self.stats: Dict[str, PoolStats] = {}
+        self.resets = 0
+        self._transports: Dict[str, InstrumentedTransport] = {}
+        self._supabase: Dict[str, "Client"] = {}
+        self._openai: Dict[str, "OpenAI"] = {}
+        self._lock = threading.Lock()
+
+    def _transport(self, upstream: str, pool: str) -> InstrumentedTransport:
+        import httpx
+
+        size = self.pool_sizes[upstream][pool]
+        limits = httpx.Limits(
+            max_connections=size,
+            max_keepalive_connections=size,
+            keepalive_expiry=self.keepalive_expiry
+        )
+        # HTTP/1.1: HTTP/2 streams through proxies caused StreamReset errors
+        transport = InstrumentedTransport(httpx.HTTPTransport(limits=limits, http2=False), self._pool_stats(upstream, pool, size))
+        self._transports[f"{upstream}.{pool}"] = transport
+        return transport
+
+    def _pool_stats(self, upstream: str, pool: str, size: int) -> PoolStats:
+        # Kept across resets so counters describe the process, not one pool instance
+        return self.stats.setdefault(f"{upstream}.{pool}", PoolStats(size))
+
+    def supabase(self, pool: str = None) -> "Client":
+        pool = pool or _current_pool.get()
+        client = self._supabase.get(pool)
+        if client is None:
+            with self._lock:
+                client = self._supabase.get(pool)
+                if client is None:
+                    client = self._supabase[pool] = self._create_supabase(pool)
+        return client
+
+    def _create_supabase(self, pool: str) -> "Client":
+        if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+            raise ValueError("Supabase credentials not configured")
+
+        import httpx
+        from supabase.lib.client_options import ClientOptions
+
+        options = ClientOptions(
+            postgrest_client_timeout=httpx.Timeout(connect=10.0, read=30.0, write=10.0, pool=self.pool_timeout),
+            storage_client_timeout=httpx.Timeout(connect=10.0, read=60.0, write=60.0, pool=self.pool_timeout),
+        )
+        client = _pooled_supabase_class()(SUPABASE_URL, SUPABASE_SERVICE_KEY, options, self._transport("supabase", pool))
+        logger.info("Supabase client initialized (%s pool, %s connections)", pool, self.pool_sizes['supabase'][pool])
+        return client
+
+    def openai(self, pool: str = None) -> "OpenAI":
+        pool = pool or _current_pool.get()
+        client = self._openai.get(pool)
+        if client is None:
+            with self._lock:
+                client = self._openai.get(pool)
+                if client is None:
+                    client = self._openai[pool] = self._create_openai(pool)
+        return client
+
+    def _create_openai(self, pool: str) -> "OpenAI":
+        if not OPENAI_API_KEY:
+            raise ValueError("OpenAI API key not configured")
+
+        # Imported lazily so the app module loads without the OpenAI SDK
+        import httpx
+        from openai import OpenAI
+
+        from services.quota import QuotaTransport, get_quota_scheduler
+
+        # Every OpenAI request reserves rate-limit budget first (see services.quota)
+        http_client = httpx.Client(
+            timeout=httpx.Timeout(60.0, connect=10.0, pool=self.pool_timeout),
+            transport=QuotaTransport(self._transport("openai", pool), get_quota_scheduler(), pool)
+        )
+        client = OpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+        logger.info("OpenAI client initialized (%s pool, %s connections)", pool, self.pool_sizes['openai'][pool])
+        return client
+
+    def reset_supabase(self, pool: str = None) -> "Client":
+        """
+        Replace a pool's Supabase client after connection errors. The old pool is
+        retired: requests still using it can finish, then its connections are
+        closed (after retired_grace seconds at the latest).
+        """
+        pool = pool or _current_pool.get()
+        with self._lock:
+            self._supabase.pop(pool, None)
+            retired = self._transports.pop(f"supabase.{pool}", None)
+            self.resets += 1
+        if retired is not None:
+            retired.retire(self.retired_grace)
+        logger.warning("Reset Supabase %s pool", pool)
+        return self.supabase(pool)
+
+    def install(self, supabase=None, openai=None):
+        """Use the given clients for every pool (benchmarks and load tests)"""
+        for pool in POOLS:
+            if supabase is not None:
+                self._supabase[pool] = supabase
+            if openai is not None:
+                self._openai[pool] = openai
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "pools": {name: stats.snapshot() for name, stats in sorted(self.stats.items())},
+            "supabase_resets": self.resets,
+        }
+
+    def close(self):
+        """Close pooled connections (graceful shutdown)"""
+        with self._lock:
+            transports = list(self._transports.values())
+            self._transports.clear()
+            self._supabase.clear()
+            self._openai.clear()
+        for transport in transports:
+            try:
+                transport.close()
+            except Exception as e:
+                logger.warning("Failed to close HTTP pool: %s", e)
+        logger.info("Closed %d HTTP pools", len(transports))
+
+
+_client_manager = ClientManager(
+    pool_sizes={
+        "supabase": {INTERACTIVE: SUPABASE_POOL_INTERACTIVE, BULK: SUPABASE_POOL_BULK},
+        "openai": {INTERACTIVE: OPENAI_POOL_INTERACTIVE, BULK: OPENAI_POOL_BULK},
+    },
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    pool_timeout=HTTP_POOL_TIMEOUT,
+    retired_grace=HTTP_RETIRED_POOL_GRACE,
+)
+
+
+def get_client_manager() -> ClientManager:
+    return _client_manager
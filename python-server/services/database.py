@@ -1,145 +1,166 @@
+import hashlib
 import json
 import logging
-import httpx
-from supabase import create_client, Client
-from supabase.lib.client_options import ClientOptions
-from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+from services.clients import get_client_manager
+from services.vector_store import get_vector_store
+
+if TYPE_CHECKING:
+    from supabase import Client
+    from services.chunks import ChunkSet
 
 logger = logging.getLogger("piona.database")
 
-_supabase_client: Client = None
-
-
-def get_supabase() -> Client:
-    """Get or create Supabase client singleton with proper timeout config"""
-    global _supabase_client
-    if _supabase_client is None:
-        _supabase_client = _create_configured_client()
-    return _supabase_client
-
-
-def _create_configured_client() -> Client:
-    """Create Supabase client with optimized httpx settings"""
-    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-        raise ValueError("Supabase credentials not configured")
-
-    # Configure httpx with longer timeouts and keep-alive
-    timeout = httpx.Timeout(
-        connect=10.0,    # Connection timeout
-        read=30.0,       # Read timeout (important for RPC calls)
-        write=10.0,      # Write timeout
-        pool=10.0        # Pool timeout
-    )
-
-    # Configure connection limits for pooling
-    limits = httpx.Limits(
-        max_keepalive_connections=5,
-        max_connections=10,
-        keepalive_expiry=30.0  # Keep connections alive for 30 seconds
-    )
-
-    # Create client with custom options
-    options = ClientOptions(
-        headers={
-            "Connection": "keep-alive"
-        }
-    )
-    client = create_client(
-        SUPABASE_URL,
-        SUPABASE_SERVICE_KEY,
-        options=options
-    )
-
-    # Override the internal httpx client settings
-    # Access the postgrest client and update its httpx client
-    if hasattr(client, 'postgrest') and hasattr(client.postgrest, '_session'):
-        client.postgrest._session = httpx.Client(
-            timeout=timeout,
-            limits=limits,
-            http2=False  # Disable HTTP/2 to avoid StreamReset errors
-        )
-
-    logger.info("Supabase client initialized with optimized connection settings")
-    return client
-
-
-def create_supabase() -> Client:
-    """Create a fresh Supabase client (use in background tasks / threads)"""
-    return _create_configured_client()
+# Hashes of chat blobs already stored by this process, so repeated prompts aren't re-sent
+_BLOB_HASH_CACHE_SIZE = 10000
+_stored_blob_hashes: "OrderedDict[str, None]" = OrderedDict()
+_blob_lock = threading.Lock()
+
+
+def get_supabase() -> "Client":
+    """Shared Supabase client for the current traffic pool (see services.clients)"""
+    return get_client_manager().supabase()
 
 
 def init_database():
     """Initialize database connection at startup - call this from main.py"""
-    global _supabase_client
     logger.info("Initializing database connection...")
-    _supabase_client = _create_configured_client()
+    supabase = get_supabase()
 
     # Warm up connection with a simple query
     try:
-        result = _supabase_client.table("services").select("id").limit(1).execute()
+        result = supabase.table("services").select("id").limit(1).execute()
         logger.info("Database connection verified")
         return True
     except Exception as e:
-        logger.error(f"Database connection failed: {e}")
+        logger.error("Database connection failed: %s", e)
         return False
 
 
 def reset_connection():
     """Reset the database connection if it becomes stale"""
-    global _supabase_client
     logger.warning("Resetting database connection...")
-    _supabase_client = None
-    return get_supabase()
+    return get_client_manager().reset_supabase()
+
+
+class IngestionSuperseded(Exception):
+    """Raised when another ingestion run has claimed the source"""
 
 
-def update_source_status(source_id: str, status: str, error_message: str = None, metadata: dict = None, client: Client = None):
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _source_update(supabase: "Client", source_id: str, update_data: dict, run_id: str = None):
+    """
+    Update a source row, stamping updated_at (the ingestion heartbeat). With
+    run_id the update only applies while that run still owns the source.
+    """
+    query = supabase.table("sources").update({**update_data, "updated_at": _now()}).eq("id", source_id)
+    if run_id is None:
+        return query.execute()
+    result = query.eq("metadata->ingestion->>run_id", run_id).execute()
+    if not result.data:
+        raise IngestionSuperseded(f"Ingestion run {run_id} no longer owns source {source_id}")
+    return result
+
+
+def update_source_status(source_id: str, status: str, error_message: str = None, metadata: dict = None, client: "Client" = None, run_id: str = None):
     """Update source processing status"""
     supabase = client or get_supabase()
     update_data = {"status": status}
     if error_message:
         update_data["error_message"] = error_message
-        logger.error(f"   Source error: {error_message}")
+        logger.error("   Source error: %s", error_message)
+    elif status == "processing":
+        update_data["error_message"] = None  # Clear the error from a previous (resumed) run
     if metadata:
         update_data["metadata"] = json.loads(json.dumps(metadata, default=str))
 
-    supabase.table("sources").update(update_data).eq("id", source_id).execute()
-    logger.info(f"   Source status: {status}")
+    _source_update(supabase, source_id, update_data, run_id)
+    logger.info("   Source status: %s", status)
+
+
+def touch_source(source_id: str, run_id: str, client: "Client" = None):
+    """Heartbeat for an ingestion run; raises IngestionSuperseded if run_id lost the source"""
+    _source_update(client or get_supabase(), source_id, {}, run_id)
+
+
+def claim_source_ingestion(source_id: str, metadata: dict, expected_updated_at: str = None, client: "Client" = None) -> bool:
+    """
+    Mark a source as processing with the given metadata (which names the new
+    run in metadata.ingestion.run_id).
+
+    With expected_updated_at this is a compare-and-swap for resuming: it only
+    applies if the source is still failed/processing and nothing has written
+    it since it was read, so two replicas can't both take over a run.
+    Returns whether the claim was applied.
+    """
+    supabase = client or get_supabase()
+    query = supabase.table("sources").update({
+        "status": "processing",
+        "error_message": None,
+        "metadata": json.loads(json.dumps(metadata, default=str)),
+        "updated_at": _now()
+    }).eq("id", source_id)
+    if expected_updated_at is not None:
+        query = query.in_("status", ["failed", "processing"]).eq("updated_at", expected_updated_at)
+    return bool(query.execute().data)
+
+
+def save_chunks(chunks: "ChunkSet", source_id: str, service_id: str, client: "Client" = None, start: int = 0, stop: int = None):
+    """Save chunks start..stop, whose embeddings are attached, to the vector store"""
+    stop = len(chunks) if stop is None else stop
+    logger.info("Saving %d chunks...", stop - start)
+    saved = get_vector_store().save_chunks(chunks, source_id, service_id, start, stop, client=client)
+    logger.info("   Saved %d chunks", saved)
+    return saved
+
+
+def delete_source_chunks(source_id: str, from_index: int = 0, client: "Client" = None):
+    """Delete a source's chunks with chunk_index >= from_index"""
+    get_vector_store().delete_source_chunks(source_id, from_index, client=client)
+
+
+def get_source(source_id: str, client: "Client" = None) -> dict:
+    """Get source by ID"""
+    supabase = client or get_supabase()
+    result = supabase.table("sources").select("*").eq("id", source_id).single().execute()
+    return result.data
 
 
-def save_chunks(chunks: list, source_id: str, service_id: str, client: Client = None):
-    """Save chunks with embeddings to database"""
-    logger.info(f"Saving {len(chunks)} chunks...")
+def update_source_metadata(source_id: str, metadata: dict, client: "Client" = None, run_id: str = None):
+    """Replace a source's metadata (used for ingestion checkpoints); raises IngestionSuperseded if run_id lost the source"""
     supabase = client or get_supabase()
+    _source_update(supabase, source_id, {"metadata": json.loads(json.dumps(metadata, default=str))}, run_id)
 
-    chunk_records = []
-    for i, chunk in enumerate(chunks):
-        chunk_records.append({
-            "source_id": source_id,
-            "service_id": service_id,
-            "content": chunk["content"],
-            "embedding": chunk["embedding"],
-            "chunk_index": i,
-            "row_reference": chunk.get("row_reference"),
-            "metadata": chunk.get("metadata", {})
-        })
-
-    # Insert in batches of 100
-    batch_size = 100
-    for i in range(0, len(chunk_records), batch_size):
-        batch = chunk_records[i:i + batch_size]
-        supabase.table("chunks").insert(batch).execute()
-
-    logger.info(f"   Saved {len(chunk_records)} chunks")
-    return len(chunk_records)
-
-
-def get_service(service_id: str) -> dict:
+
+def get_service(service_id: str, client: "Client" = None) -> dict:
     """Get service by ID"""
-    supabase = get_supabase()
+    supabase = client or get_supabase()
     result = supabase.table("services").select("*").eq("id", service_id).single().execute()
     return result.data
 
 
+def count_service_chunks(service_id: str, client: "Client" = None) -> int:
+    """Count stored chunks for a service"""
+    return get_vector_store().count_service_chunks(service_id, client=client)
+
+
+def count_source_chunks(source_id: str, client: "Client" = None) -> int:
+    """Count stored chunks for a source"""
+    return get_vector_store().count_source_chunks(source_id, client=client)
+
+
+def update_service_embedding_method(service_id: str, embedding_method: str, client: "Client" = None):
+    """Record which embedding backend produced a service's embeddings"""
+    supabase = client or get_supabase()
+    supabase.table("services").update({"embedding_method": embedding_method}).eq("id", service_id).execute()
+
+
 def get_writing_style(service_id: str) -> dict:
     """Get default writing style for service"""
     supabase = get_supabase()
@@ -149,17 +170,74 @@ def get_writing_style(service_id: str) -> dict:
     return None
 
 
+def _store_chat_blobs(supabase: "Client", contents: list) -> list:
+    """Store prompt/context blobs content-addressed by sha256 and return their hashes"""
+    hashes = []
+    new_rows = {}
+    for content in contents:
+        if content is None:
+            hashes.append(None)
+            continue
+        blob_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        hashes.append(blob_hash)
+        with _blob_lock:
+            known = blob_hash in _stored_blob_hashes
+        if not known:
+            new_rows[blob_hash] = {"hash": blob_hash, "content": content}
+
+    if new_rows:
+        supabase.table("chat_blobs").upsert(list(new_rows.values()), on_conflict="hash", ignore_duplicates=True).execute()
+        with _blob_lock:
+            for blob_hash in new_rows:
+                _stored_blob_hashes[blob_hash] = None
+            while len(_stored_blob_hashes) > _BLOB_HASH_CACHE_SIZE:
+                _stored_blob_hashes.popitem(last=False)
+    return hashes
+
+
 def save_chat_message(service_id: str, session_id: str, role: str, content: str,
-                      prompt_used: str = None, context_used: str = None, chunks_used: list = None) -> str:
-    """Save chat message to history and return the message ID"""
+                      system_prompt: str = None, context_used: str = None, chunks_used: list = None) -> str:
+    """
+    Save chat message to history and return the message ID.
+
+    The system prompt and context are stored once in chat_blobs and referenced
+    by hash, instead of being copied into every assistant row.
+    """
     supabase = get_supabase()
-    result = supabase.table("chat_history").insert({
+    record = {
         "service_id": service_id,
         "session_id": session_id,
         "role": role,
         "content": content,
-        "prompt_used": prompt_used,
-        "context_used": context_used,
         "chunks_used": chunks_used or []
-    }).execute()
+    }
+    if system_prompt is not None or context_used is not None:
+        record["system_prompt_hash"], record["context_hash"] = _store_chat_blobs(supabase, [system_prompt, context_used])
+
+    result = supabase.table("chat_history").insert(record).execute()
     return result.data[0]["id"] if result.data else None
+
+
+def get_chat_messages(service_id: str, session_id: str, offset: int = 0, limit: int = 50) -> list:
+    """Get up to `limit` messages of a session, oldest first, starting at message number `offset`"""
+    supabase = get_supabase()
+    result = supabase.table("chat_history").select("role, content").eq("service_id", service_id).eq("session_id", session_id).order("created_at").range(offset, offset + limit - 1).execute()
+    return result.data or []
+
+
+def get_session_summary(service_id: str, session_id: str) -> dict:
+    """Persisted rolling summary of a session and how many of its messages it covers"""
+    supabase = get_supabase()
+    result = supabase.table("chat_sessions").select("summary, summarized_count").eq("service_id", service_id).eq("session_id", session_id).limit(1).execute()
+    return result.data[0] if result.data else None
+
+
+def save_session_summary(service_id: str, session_id: str, summary: str, summarized_count: int):
+    """Persist a session's rolling summary so it survives eviction and restarts"""
+    get_supabase().table("chat_sessions").upsert({
+        "session_id": session_id,
+        "service_id": service_id,
+        "summary": summary,
+        "summarized_count": summarized_count,
+        "updated_at": _now()
+    }, on_conflict="service_id,session_id", returning="minimal").execute()
@@ -1,48 +1,185 @@
+import base64
 import logging
-from openai import OpenAI
-from typing import List
-from config import OPENAI_API_KEY, EMBEDDING_MODEL
+import re
+import zlib
+from functools import lru_cache
+from typing import List, Tuple, TYPE_CHECKING
+from services.clients import get_client_manager
+from config import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, EMBEDDING_BACKEND
+
+if TYPE_CHECKING:
+    import numpy as np
+    from openai import OpenAI
 
 logger = logging.getLogger("piona.embedding")
 
-_openai_client: OpenAI = None
+
+def get_openai() -> "OpenAI":
+    """Shared OpenAI client for the current traffic pool (see services.clients)"""
+    return get_client_manager().openai()
+
+
+def init_openai() -> bool:
+    """Create the OpenAI client at startup so the first request doesn't pay for it"""
+    get_openai()
+    return True
+
+
+class EmbeddingBackendMismatch(ValueError):
+    """Raised when a service's stored embeddings came from a different backend"""
+
+    def __init__(self, stored: str, active: str):
+        super().__init__(f"Service embeddings were produced by '{stored}' but the active backend is '{active}'. Reprocess the sources or switch EMBEDDING_BACKEND.")
+        self.stored = stored
+        self.active = active
+
+
+# ============================================
+# Backends
+# ============================================
+
+class EmbeddingBackend:
+    """Interface for embedding backends. `id` is stored with every embedding it produces."""
+
+    id: str
+    dimensions: int = EMBEDDING_DIMENSIONS
+    batch_size: int = 100
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch of texts"""
+        return self.embed_array(texts).tolist()
+
+    def embed_array(self, texts: List[str]) -> "np.ndarray":
+        """Embed one batch of texts as a (len(texts), dimensions) float32 array"""
+        raise NotImplementedError
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """OpenAI embeddings API"""
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.model = model
+        self.id = f"openai-{model}"  # Matches services.embedding_method
+
+    def embed_array(self, texts: List[str]) -> "np.ndarray":
+        import numpy as np
+
+        # base64 decodes straight into float32, skipping a Python float per dimension
+        response = get_openai().embeddings.create(
+            input=texts,
+            model=self.model,
+            encoding_format="base64"
+        )
+        return np.stack([np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32) for item in response.data])
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
 
 
-def get_openai() -> OpenAI:
-    """Get or create OpenAI client singleton"""
-    global _openai_client
-    if _openai_client is None:
-        if not OPENAI_API_KEY:
-            raise ValueError("OpenAI API key not configured")
-        _openai_client = OpenAI(api_key=OPENAI_API_KEY)
-        logger.info("OpenAI client initialized")
-    return _openai_client
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Local CPU embeddings: signed feature hashing of word unigrams, word bigrams
+    and character trigrams, L2-normalised. Deterministic across processes and
+    needs no network or model download, so it works in air-gapped environments.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.batch_size = 1000
+        self.id = f"local-hashing-{dimensions}"
+
+    @staticmethod
+    def _features(text: str) -> List[str]:
+        words = _TOKEN_RE.findall(text.lower())
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    @lru_cache(maxsize=200_000)
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        digest = zlib.crc32(feature.encode("utf-8"))
+        return digest % self.dimensions, 1.0 if (digest >> 31) & 1 else -1.0
+
+    def embed_array(self, texts: List[str]) -> "np.ndarray":
+        import numpy as np
+
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                col, sign = self._bucket(feature)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)), np.asarray(signs, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1.0)
+        return matrix
+
+
+EMBEDDING_BACKENDS = {
+    "openai": OpenAIEmbeddingBackend,
+    "hashing": HashingEmbeddingBackend,
+}
+
+_embedding_backend: EmbeddingBackend = None
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """Get or create the configured embedding backend"""
+    global _embedding_backend
+    if _embedding_backend is None:
+        if EMBEDDING_BACKEND not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {EMBEDDING_BACKEND}")
+        _embedding_backend = EMBEDDING_BACKENDS[EMBEDDING_BACKEND]()
+        logger.info("Embedding backend: %s", _embedding_backend.id)
+    return _embedding_backend
+
+
+def check_embedding_backend(stored_backend_id: str):
+    """Reject mixing embeddings from different backends in one service"""
+    active = get_embedding_backend().id
+    stored = stored_backend_id or OpenAIEmbeddingBackend().id  # Legacy rows predate the column default
+    if stored != active:
+        raise EmbeddingBackendMismatch(stored, active)
 
 
 def generate_embedding(text: str) -> List[float]:
     """Generate embedding for a single text"""
-    client = get_openai()
-    response = client.embeddings.create(
-        input=text,
-        model=EMBEDDING_MODEL
-    )
-    return response.data[0].embedding
+    return get_embedding_backend().embed_batch([text])[0]
 
 
-def generate_embeddings_batch(texts: List[str], batch_size: int = 100) -> List[List[float]]:
+def generate_embeddings_batch(texts: List[str], batch_size: int = None) -> List[List[float]]:
     """Generate embeddings for multiple texts in batches"""
-    logger.info(f"🧮 Generating {len(texts)} embeddings...")
-    client = get_openai()
+    logger.info("🧮 Generating %d embeddings...", len(texts))
+    backend = get_embedding_backend()
+    batch_size = batch_size or backend.batch_size
     all_embeddings = []
 
     for i in range(0, len(texts), batch_size):
         batch = texts[i:i + batch_size]
-        response = client.embeddings.create(
-            input=batch,
-            model=EMBEDDING_MODEL
-        )
-        batch_embeddings = [item.embedding for item in response.data]
-        all_embeddings.extend(batch_embeddings)
+        all_embeddings.extend(backend.embed_batch(batch))
 
-    logger.info(f"   ✅ Generated {len(all_embeddings)} embeddings")
+    logger.info("   ✅ Generated %d embeddings (%s)", len(all_embeddings), backend.id)
     return all_embeddings
+
+
+def generate_embeddings_array(texts: List[str], batch_size: int = None) -> "np.ndarray":
+    """Generate embeddings for multiple texts as one float32 array (ingestion path)"""
+    import numpy as np
+
+    logger.info("🧮 Generating %d embeddings...", len(texts))
+    backend = get_embedding_backend()
+    batch_size = batch_size or backend.batch_size
+    embeddings = np.empty((len(texts), backend.dimensions), dtype=np.float32)
+
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        embeddings[i:i + len(batch)] = backend.embed_array(batch)
+
+    logger.info("   ✅ Generated %d embeddings (%s)", len(texts), backend.id)
+    return embeddings
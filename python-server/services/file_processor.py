@@ -1,8 +1,9 @@
 import pandas as pd
 import json
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
 import io
+from services.chunks import Chunk, ChunkSet
 
 logger = logging.getLogger("piona.file_processor")
 
@@ -21,68 +22,252 @@ def _make_serializable(obj):
         return obj
 
 
+CHUNKING_STRATEGIES = ("row", "packed")
+
+# Rows per record batch when streaming Parquet; bounds memory independently of file size
+COLUMNAR_BATCH_ROWS = 10_000
+
+
+def _open_arrow_ipc(file_content: bytes):
+    """Open Arrow IPC bytes in either the file (random access) or the stream format"""
+    import pyarrow as pa
+
+    try:
+        return pa.ipc.open_file(pa.BufferReader(file_content))
+    except pa.ArrowInvalid:
+        return pa.ipc.open_stream(pa.BufferReader(file_content))
+
+
+def _arrow_batches(reader) -> Iterator:
+    """Record batches from an IPC file reader (indexed) or stream reader (iterable)"""
+    if hasattr(reader, "get_batch"):
+        return (reader.get_batch(i) for i in range(reader.num_record_batches))
+    return iter(reader)
+
+
+def _string_column(array):
+    """Render an Arrow column as strings, with nulls and empty strings as null"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    try:
+        strings = pc.cast(array, pa.string())
+    except (pa.ArrowNotImplementedError, pa.ArrowInvalid):
+        # Nested types (lists, structs) have no string cast
+        strings = pa.array([None if v is None else str(v) for v in array.to_pylist()], type=pa.string())
+    return pc.if_else(pc.equal(strings, ""), pa.scalar(None, pa.string()), strings)
+
+
 class FileProcessor:
-    """Process CSV and Excel files into text chunks"""
+    """
+    Process CSV, Excel, Parquet and Arrow IPC files into text chunks (a ChunkSet).
+
+    Strategies:
+      - "row": one chunk per row (long rows are split)
+      - "packed": consecutive rows are packed into one chunk up to chunk_size;
+        with pack_key_column, only rows sharing that column's value are packed together
+    """
 
-    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
+    def __init__(
+        self,
+        chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        chunking_strategy: str = "row",
+        pack_key_column: Optional[str] = None
+    ):
+        if chunking_strategy not in CHUNKING_STRATEGIES:
+            raise ValueError(f"Unsupported chunking strategy: {chunking_strategy}")
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.chunking_strategy = chunking_strategy
+        self.pack_key_column = pack_key_column
 
-    def process_csv(self, file_content: bytes) -> List[Dict[str, Any]]:
+    def process_csv(self, file_content: bytes) -> ChunkSet:
         """Process CSV file content into chunks"""
-        logger.info(f"📄 Processing CSV ({len(file_content)} bytes)")
+        logger.info("📄 Processing CSV (%d bytes)", len(file_content))
         df = pd.read_csv(io.BytesIO(file_content))
-        logger.info(f"   Rows: {len(df)}, Columns: {len(df.columns)}")
+        logger.info("   Rows: %d, Columns: %d", len(df), len(df.columns))
         return self._dataframe_to_chunks(df)
 
-    def process_excel(self, file_content: bytes) -> List[Dict[str, Any]]:
+    def process_excel(self, file_content: bytes) -> ChunkSet:
         """Process Excel file content into chunks"""
-        logger.info(f"📄 Processing Excel ({len(file_content)} bytes)")
-        df = pd.read_excel(io.BytesIO(file_content))
-        logger.info(f"   Rows: {len(df)}, Columns: {len(df.columns)}")
-        return self._dataframe_to_chunks(df)
+        logger.info("📄 Processing Excel (%d bytes)", len(file_content))
+        with pd.ExcelFile(io.BytesIO(file_content)) as workbook:
+            sheet = workbook.sheet_names[0]
+            df = workbook.parse(sheet)
+        logger.info("   Sheet: %s, Rows: %d, Columns: %d", sheet, len(df), len(df.columns))
+        chunks = self._dataframe_to_chunks(df)
+        # Recorded so retrieval can be filtered by sheet
+        chunks.metadata["sheet"] = str(sheet)
+        return chunks
+
+    def process_parquet(self, file_content: bytes) -> ChunkSet:
+        """Process a Parquet file batch by batch, without building a DataFrame"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        logger.info("📄 Processing Parquet (%d bytes)", len(file_content))
+        parquet = pq.ParquetFile(pa.BufferReader(file_content))
+        logger.info("   Rows: %d, Columns: %d, Row groups: %d", parquet.metadata.num_rows, parquet.metadata.num_columns, parquet.num_row_groups)
+        return self._record_batches_to_chunks(parquet.iter_batches(batch_size=COLUMNAR_BATCH_ROWS), parquet.schema_arrow.names)
+
+    def process_arrow(self, file_content: bytes) -> ChunkSet:
+        """Process an Arrow IPC (Feather v2) file or stream batch by batch"""
+        logger.info("📄 Processing Arrow IPC (%d bytes)", len(file_content))
+        reader = _open_arrow_ipc(file_content)
+        return self._record_batches_to_chunks(_arrow_batches(reader), reader.schema.names)
+
+    def _record_batches_to_chunks(self, batches: Iterable, columns: List[str]) -> ChunkSet:
+        """
+        Columnar equivalent of _dataframe_to_chunks.
+
+        Row text is assembled per batch with Arrow compute kernels, and only the
+        finished strings (plus cell values for per-row chunks) become Python objects.
+        Values are rendered with Arrow's formatting, so e.g. a float 2.0 reads
+        "2" where the CSV path would show "2.0".
+        """
+        chunks = ChunkSet(columns)
+        rows = self._columnar_rows(batches, chunks.columns, with_values=self.chunking_strategy == "row")
+
+        if self.chunking_strategy == "packed":
+            chunks.extend(self._packed_columnar_chunks(rows))
+        else:
+            for index, chunk_text, values, _ in rows:
+                if len(chunk_text) > self.chunk_size:
+                    chunks.extend(self._split_row_chunks(chunk_text, index))
+                else:
+                    chunks.add(chunk_text, f"row_{index}", {"original_row_index": index}, values)
+
+        logger.info("   ✅ Created %d chunks (%s, columnar)", len(chunks), self.chunking_strategy)
+        return chunks
+
+    def _columnar_rows(self, batches: Iterable, columns: List[str], with_values: bool) -> Iterator[Tuple[int, str, Optional[tuple], Any]]:
+        """Yield (row index, row text, cell values, pack key value) for each row, one record batch at a time"""
+        import pyarrow.compute as pc
+
+        if self.pack_key_column and self.pack_key_column not in columns:
+            raise ValueError(f"Pack key column not found: {self.pack_key_column}")
+        key_position = columns.index(self.pack_key_column) if self.pack_key_column else None
+
+        offset = 0
+        for batch in batches:
+            values = [_string_column(batch.column(i)) for i in range(batch.num_columns)]
 
-    def _dataframe_to_chunks(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+            # " | col: value" per non-empty cell, concatenated, minus the leading separator.
+            # (null_handling="skip" would be simpler but drops rows whose cells are all null)
+            parts = [pc.binary_join_element_wise(f" | {col}: ", value, "").fill_null("") for col, value in zip(columns, values)]
+            texts = pc.utf8_slice_codeunits(pc.binary_join_element_wise(*parts, ""), 3).to_pylist()
+
+            row_values = list(zip(*(value.to_pylist() for value in values))) if with_values else None
+            keys = batch.column(key_position).to_pylist() if key_position is not None else None
+
+            for i, text in enumerate(texts):
+                yield offset + i, text, row_values[i] if with_values else None, keys[i] if keys is not None else None
+            offset += batch.num_rows
+
+    def _packed_columnar_chunks(self, rows: Iterator) -> Iterator[Chunk]:
+        """Pack streamed rows; with pack_key_column, groups keep first-appearance order like DataFrame.groupby(sort=False)"""
+        if not self.pack_key_column:
+            yield from self._pack_rows((index, text) for index, text, _, _ in rows)
+            return
+
+        groups: Dict[Any, List[Tuple[int, str]]] = {}
+        for index, text, _, key in rows:
+            groups.setdefault(key, []).append((index, text))
+
+        for key, group in groups.items():
+            yield from self._pack_rows(group, key)
+
+    def _dataframe_to_chunks(self, df: pd.DataFrame) -> ChunkSet:
         """Convert DataFrame to text chunks"""
-        chunks = []
-        columns = [str(c) for c in df.columns.tolist()]
-
-        for index, row in df.iterrows():
-            text_parts = []
-            for col in columns:
-                value = row[col]
-                if pd.notna(value):
-                    text_parts.append(f"{col}: {value}")
-
-            chunk_text = " | ".join(text_parts)
-
-            if len(chunk_text) > self.chunk_size:
-                sub_chunks = self._split_text(chunk_text)
-                for i, sub_chunk in enumerate(sub_chunks):
-                    chunks.append({
-                        "content": sub_chunk,
-                        "row_reference": f"row_{index}_part_{i}",
-                        "metadata": _make_serializable({
-                            "columns": columns,
-                            "original_row_index": int(index),
-                            "is_split": True,
-                            "part": i
-                        })
-                    })
-            else:
-                chunks.append({
-                    "content": chunk_text,
-                    "row_reference": f"row_{index}",
-                    "metadata": _make_serializable({
-                        "columns": columns,
-                        "original_row_index": int(index),
-                        "row_data": {str(k): str(v) if pd.notna(v) else None for k, v in row.to_dict().items()}
-                    })
-                })
-
-        logger.info(f"   ✅ Created {len(chunks)} chunks")
+        df.columns = [str(c) for c in df.columns]
+        chunks = ChunkSet(df.columns)
+        columns = chunks.columns
+
+        if self.chunking_strategy == "packed":
+            chunks.extend(self._packed_chunks(df, columns))
+        else:
+            for index, row in df.iterrows():
+                chunk_text = self._row_text(row, columns)
+
+                if len(chunk_text) > self.chunk_size:
+                    chunks.extend(self._split_row_chunks(chunk_text, index))
+                else:
+                    values = tuple(str(v) if pd.notna(v) else None for v in row)
+                    chunks.add(chunk_text, f"row_{index}", {"original_row_index": int(index)}, values)
+
+        logger.info("   ✅ Created %d chunks (%s)", len(chunks), self.chunking_strategy)
         return chunks
 
+    def _row_text(self, row: pd.Series, columns: List[str]) -> str:
+        """Render a row as "col: value | col: value", skipping empty cells"""
+        text_parts = []
+        for col in columns:
+            value = row[col]
+            if pd.notna(value):
+                text_parts.append(f"{col}: {value}")
+        return " | ".join(text_parts)
+
+    def _split_row_chunks(self, chunk_text: str, index) -> List[Chunk]:
+        """Split a row that is longer than chunk_size into several chunks"""
+        return [
+            Chunk(sub_chunk, f"row_{index}_part_{i}", {"original_row_index": int(index), "is_split": True, "part": i})
+            for i, sub_chunk in enumerate(self._split_text(chunk_text))
+        ]
+
+    def _packed_chunks(self, df: pd.DataFrame, columns: List[str]) -> Iterator[Chunk]:
+        """Pack consecutive rows (or rows sharing pack_key_column) into chunks up to chunk_size"""
+        if self.pack_key_column:
+            if self.pack_key_column not in columns:
+                raise ValueError(f"Pack key column not found: {self.pack_key_column}")
+            groups = [group for _, group in df.groupby(self.pack_key_column, sort=False, dropna=False)]
+        else:
+            groups = [df]
+
+        for group in groups:
+            key_value = group[self.pack_key_column].iloc[0] if self.pack_key_column else None
+            rows = ((index, self._row_text(row, columns)) for index, row in group.iterrows())
+            yield from self._pack_rows(rows, key_value)
+
+    def _pack_rows(self, rows: Iterable[Tuple[int, str]], key_value=None) -> Iterator[Chunk]:
+        """Pack (row index, row text) pairs into chunks up to chunk_size"""
+        texts, indices, size = [], [], 0
+
+        for index, row_text in rows:
+            # Oversized rows are split on their own, exactly as in per-row chunking
+            if len(row_text) > self.chunk_size:
+                if texts:
+                    yield self._packed_chunk(texts, indices, key_value)
+                    texts, indices, size = [], [], 0
+                yield from self._split_row_chunks(row_text, index)
+                continue
+
+            added = len(row_text) + (1 if texts else 0)
+            if texts and size + added > self.chunk_size:
+                yield self._packed_chunk(texts, indices, key_value)
+                texts, indices, size = [], [], 0
+                added = len(row_text)
+
+            texts.append(row_text)
+            indices.append(int(index))
+            size += added
+
+        if texts:
+            yield self._packed_chunk(texts, indices, key_value)
+
+    def _packed_chunk(self, texts: List[str], indices: List[int], key_value=None) -> Chunk:
+        """Build a packed chunk that keeps a reference to every row it contains (row_count and row_references are derived by ChunkSet)"""
+        metadata = {"packed": True, "row_indices": indices}
+        if self.pack_key_column:
+            metadata["pack_key"] = self.pack_key_column
+            metadata["pack_key_value"] = _make_serializable(key_value)
+
+        return Chunk(
+            "\n".join(texts),
+            f"rows_{indices[0]}_{indices[-1]}" if len(indices) > 1 else f"row_{indices[0]}",
+            metadata
+        )
+
     def _split_text(self, text: str) -> List[str]:
         """Split long text into overlapping chunks"""
         if len(text) <= self.chunk_size:
@@ -103,13 +288,18 @@ class FileProcessor:
                         break
 
             chunks.append(text[start:end].strip())
-            start = end - self.chunk_overlap
+            if end >= len(text):
+                break
+            # Overlap only when it still moves forward
+            start = end - self.chunk_overlap if end - self.chunk_overlap > start else end
 
         return chunks
 
     def get_file_metadata(self, file_content: bytes, file_type: str) -> Dict[str, Any]:
         """Extract metadata from file"""
         try:
+            if file_type in ("parquet", "arrow", "feather"):
+                return self._columnar_metadata(file_content, file_type)
             if file_type == "csv":
                 df = pd.read_csv(io.BytesIO(file_content))
             else:
@@ -135,5 +325,30 @@ class FileProcessor:
                 "sample_data": sample_records
             }
         except Exception as e:
-            logger.error(f"Metadata extraction failed: {e}")
+            logger.error("Metadata extraction failed: %s", e)
             return {"error": str(e)}
+
+    def _columnar_metadata(self, file_content: bytes, file_type: str) -> Dict[str, Any]:
+        """Row count and schema from the file footer; only the first batch is decoded for the sample"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if file_type == "parquet":
+            parquet = pq.ParquetFile(pa.BufferReader(file_content))
+            row_count = parquet.metadata.num_rows
+            columns = parquet.schema_arrow.names
+            first = next(parquet.iter_batches(batch_size=3), None)
+        else:
+            reader = _open_arrow_ipc(file_content)
+            columns = reader.schema.names
+            batches = list(_arrow_batches(reader))
+            row_count = sum(b.num_rows for b in batches)
+            first = batches[0] if batches else None
+
+        sample = first.slice(0, 3).to_pylist() if first is not None else []
+        return {
+            "row_count": int(row_count),
+            "column_count": len(columns),
+            "columns": [str(c) for c in columns],
+            "sample_data": [{str(k): v if v is None or isinstance(v, (int, float, bool)) else str(v) for k, v in row.items()} for row in sample]
+        }
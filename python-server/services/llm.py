@@ -1,27 +1,12 @@
 import logging
 from typing import List, Dict, Optional
 from services.embedding import get_openai
-from config import CHAT_MODEL
+from config import CHAT_MODEL, SUMMARY_MODEL, SUMMARY_MAX_CHARS
 
 logger = logging.getLogger("piona.llm")
 
 
-def generate_response(
-    query: str,
-    context: str,
-    conversation_history: Optional[List[Dict[str, str]]] = None,
-    style_guidelines: Optional[str] = None
-) -> tuple[str, str]:
-    """
-    Generate a response using GPT-4o with RAG context
-    """
-    logger.info(f"🤖 Generating response (context: {len(context)} chars)")
-
-    try:
-        client = get_openai()
-
-        # Build the system prompt
-        system_prompt = """You are a helpful AI assistant that answers questions based on the provided context.
+SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions based on the provided context.
 
 INSTRUCTIONS:
 - Answer the user's question using ONLY the information from the provided context
@@ -31,11 +16,17 @@ INSTRUCTIONS:
 - Cite which source(s) you used when relevant
 - Do not make up information not present in the context"""
 
-        if style_guidelines:
-            system_prompt += f"\n\nWRITING STYLE GUIDELINES:\n{style_guidelines}"
 
-        # Build the user message with context
-        user_message = f"""CONTEXT:
+def build_system_prompt(style_guidelines: Optional[str] = None) -> str:
+    """System prompt, with the service's writing style appended if any"""
+    if style_guidelines:
+        return SYSTEM_PROMPT + f"\n\nWRITING STYLE GUIDELINES:\n{style_guidelines}"
+    return SYSTEM_PROMPT
+
+
+def build_user_message(query: str, context: str) -> str:
+    """User turn carrying the retrieved context and the question"""
+    return f"""CONTEXT:
 {context}
 
 USER QUESTION:
@@ -43,12 +34,45 @@ USER QUESTION:
 
 Please answer based on the context provided above."""
 
+
+def format_prompt_used(system_prompt: str, user_message: str) -> str:
+    """Debug rendering of the prompt; chat_history stores its parts by hash and can rebuild it"""
+    return f"System: {system_prompt}\n\nUser: {user_message}"
+
+
+def generate_response(
+    query: str,
+    context: str,
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    style_guidelines: Optional[str] = None,
+    conversation_summary: Optional[str] = None
+) -> tuple[str, str]:
+    """
+    Generate a response using GPT-4o with RAG context.
+
+    conversation_history is expected to be already bounded (see services.memory);
+    conversation_summary covers the turns that were compacted out of it.
+    """
+    logger.info("🤖 Generating response (context: %d chars)", len(context))
+
+    try:
+        client = get_openai()
+
+        system_prompt = build_system_prompt(style_guidelines)
+        user_message = build_user_message(query, context)
+
         # Build messages array
         messages = [{"role": "system", "content": system_prompt}]
 
+        if conversation_summary:
+            messages.append({
+                "role": "system",
+                "content": f"SUMMARY OF EARLIER CONVERSATION:\n{conversation_summary}"
+            })
+
         # Add conversation history if provided
         if conversation_history:
-            for msg in conversation_history[-6:]:
+            for msg in conversation_history:
                 messages.append({
                     "role": msg["role"],
                     "content": msg["content"]
@@ -67,15 +91,46 @@ Please answer based on the context provided above."""
         answer = response.choices[0].message.content
 
         if hasattr(response, 'usage') and response.usage:
-            logger.info(f"   Tokens: {response.usage.total_tokens}")
+            logger.info("   Tokens: %s", response.usage.total_tokens)
 
-        logger.info(f"   ✅ Generated {len(answer)} chars")
+        logger.info("   ✅ Generated %d chars", len(answer))
 
         # Build full prompt for debugging
-        full_prompt = f"System: {system_prompt}\n\nUser: {user_message}"
+        full_prompt = format_prompt_used(system_prompt, user_message)
 
         return answer, full_prompt
 
     except Exception as e:
-        logger.error(f"   ❌ LLM failed: {e}")
+        logger.error("   ❌ LLM failed: %s", e)
         raise
+
+
+def summarize_conversation(previous_summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+    """Fold older conversation turns into a rolling summary"""
+    logger.info("📝 Summarizing %d messages", len(messages))
+    client = get_openai()
+
+    transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+    user_message = f"""CURRENT SUMMARY:
+{previous_summary or "(none)"}
+
+NEW MESSAGES:
+{transcript}
+
+Update the summary to include the new messages."""
+
+    response = client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": f"You maintain a running summary of a customer support conversation. Keep facts, names, numbers and open questions the user asked about. Reply with the summary only, at most {SUMMARY_MAX_CHARS} characters."
+            },
+            {"role": "user", "content": user_message}
+        ],
+        temperature=0,
+        max_tokens=400
+    )
+
+    summary = (response.choices[0].message.content or "").strip()
+    return summary[:SUMMARY_MAX_CHARS]
@@ -0,0 +1,578 @@
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from services.vector_store import VectorStore, _filter_params
+from config import LOCAL_STORE_DIR, LOCAL_ANN_MIN_CHUNKS, LOCAL_ANN_PROBES
+
+if TYPE_CHECKING:
+    from services.chunks import ChunkSet
+
+logger = logging.getLogger("piona.local_store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    service_id TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    row_reference TEXT,
+    metadata TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    slot INTEGER NOT NULL  -- Row of the service's vector file
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_service_slot ON chunks(service_id, slot);
+CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks(source_id, chunk_index);
+
+-- One float32 vector file per service; renamed on compaction
+CREATE TABLE IF NOT EXISTS vector_files (
+    service_id TEXT PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    dimensions INTEGER NOT NULL
+);
+"""
+
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_BLOCK_ROWS = 16384
+SEARCH_ATTEMPTS = 3  # Lock-free tries before a search waits out a compaction
+
+
+def _timestamp(value=None) -> str:
+    """UTC ISO timestamps with fixed precision, so they compare correctly as text"""
+    if value is None:
+        value = datetime.now(timezone.utc)
+    elif isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _json_path(keys: List[str]) -> str:
+    for key in keys:
+        if '"' in key:
+            raise ValueError(f"Unsupported metadata filter key: {key}")
+    return "$" + "".join(f'."{key}"' for key in keys)
+
+
+def _containment_sql(value, keys: List[str], clauses: List[str], args: List[Any]):
+    """SQL equivalent of metadata @> value (JSONB containment) over the stored JSON text"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _containment_sql(item, keys + [str(key)], clauses, args)
+    elif isinstance(value, list):
+        for item in value:
+            clauses.append("EXISTS (SELECT 1 FROM json_each(chunks.metadata, ?) WHERE json_each.value = ?)")
+            args.extend([_json_path(keys), item])
+    elif value is None:
+        clauses.append("json_type(chunks.metadata, ?) = 'null'")
+        args.append(_json_path(keys))
+    else:
+        # Booleans come back from json_extract as 1/0 and compare equal to Python's True/False
+        clauses.append("json_extract(chunks.metadata, ?) = ?")
+        args.extend([_json_path(keys), value])
+
+
+def _filter_sql(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """WHERE fragment and arguments for the match_chunks filters"""
+    params = _filter_params(filters)
+    clauses, args = [], []
+    if "filter_source_ids" in params:
+        ids = params["filter_source_ids"]
+        clauses.append(f"chunks.source_id IN ({', '.join('?' * len(ids))})")
+        args.extend(ids)
+    if "filter_metadata" in params:
+        _containment_sql(params["filter_metadata"], [], clauses, args)
+    if "filter_created_after" in params:
+        clauses.append("chunks.created_at > ?")
+        args.append(_timestamp(params["filter_created_after"]))
+    return "".join(f" AND {c}" for c in clauses), args
+
+
+class _IVFIndex:
+    """
+    Inverted-file index over a service's vectors: spherical k-means centroids,
+    with every vector assigned to its nearest one. A query scans the vectors of
+    the `probes` lists whose centroids are closest (the same trade-off as
+    pgvector's ivfflat).
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, trained_on: int):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.trained_on = trained_on
+        self._build_lists()
+
+    def _build_lists(self):
+        order = np.argsort(self.assignments, kind="stable").astype(np.int64)
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        # Swapped in as one tuple so concurrent searches never see a mismatched pair
+        self._lists = (order, np.concatenate([[0], np.cumsum(counts)]))
+
+    @staticmethod
+    def _assign(centroids: np.ndarray, matrix: np.ndarray, start: int = 0) -> np.ndarray:
+        assignments = np.empty(len(matrix) - start, dtype=np.int32)
+        for i in range(start, len(matrix), ASSIGN_BLOCK_ROWS):
+            block = np.asarray(matrix[i:i + ASSIGN_BLOCK_ROWS])
+            assignments[i - start:i - start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, live: np.ndarray, seed: int = 0) -> "_IVFIndex":
+        live_slots = np.flatnonzero(live)
+        lists = int(min(4096, len(live_slots), max(16, np.sqrt(len(live_slots)))))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(live_slots, min(len(live_slots), lists * KMEANS_SAMPLE_PER_LIST), replace=False))
+        train = np.asarray(matrix[sample])
+        centroids = train[rng.choice(len(train), lists, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(train @ centroids.T, axis=1)
+            order = np.argsort(assignment, kind="stable")
+            members = np.bincount(assignment, minlength=lists)
+            filled = np.flatnonzero(members)
+            sums = np.add.reduceat(train[order], np.concatenate([[0], np.cumsum(members)[:-1]])[filled], axis=0)
+            centroids[filled] = sums
+            # Empty lists restart from random training vectors
+            empty = np.flatnonzero(members == 0)
+            centroids[empty] = train[rng.choice(len(train), len(empty), replace=False)]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        return cls(centroids.astype(np.float32), cls._assign(centroids.astype(np.float32), matrix), int(len(live_slots)))
+
+    def extend(self, matrix: np.ndarray):
+        """Assign vectors appended since the index was built"""
+        if len(matrix) > len(self.assignments):
+            self.assignments = np.concatenate([self.assignments, self._assign(self.centroids, matrix, len(self.assignments))])
+            self._build_lists()
+
+    def candidates(self, query: np.ndarray, probes: int) -> np.ndarray:
+        order, offsets = self._lists
+        nearest = np.argsort(self.centroids @ query)[::-1][:max(1, probes)]
+        return np.concatenate([order[offsets[c]:offsets[c + 1]] for c in nearest])
+
+    def save(self, path: str):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, centroids=self.centroids, assignments=self.assignments, trained_on=self.trained_on)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["_IVFIndex"]:
+        try:
+            with np.load(path) as data:
+                return cls(data["centroids"], data["assignments"], int(data["trained_on"]))
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+class _ServiceVectors:
+    """In-memory view of one service's vector file: a read-only memmap plus which rows are live"""
+
+    def __init__(self, path: str, dimensions: int, live_slots: np.ndarray):
+        self.path = path
+        self.dimensions = dimensions
+        self.ivf: Optional[_IVFIndex] = None
+        self.remap()
+        self.live = np.zeros(len(self.matrix), dtype=bool)
+        self.live[live_slots[live_slots < len(self.live)]] = True
+
+    def remap(self):
+        rows = os.path.getsize(self.path) // (self.dimensions * 4) if os.path.exists(self.path) else 0
+        self.matrix = (
+            np.memmap(self.path, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+            if rows else np.empty((0, self.dimensions), dtype=np.float32)
+        )
+
+    @property
+    def live_count(self) -> int:
+        return int(self.live.sum())
+
+    def appended(self, slots: np.ndarray):
+        self.remap()
+        if len(self.live) < len(self.matrix):
+            self.live = np.concatenate([self.live, np.zeros(len(self.matrix) - len(self.live), dtype=bool)])
+        self.live[slots] = True
+        if self.ivf is not None:
+            self.ivf.extend(self.matrix)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Embedded vector store for single-node installs: chunk rows in SQLite and each
+    service's embeddings in an append-only float32 file, memory-mapped for search.
+
+    Vectors are L2-normalised on write, so cosine similarity is a dot product.
+    Services below LOCAL_ANN_MIN_CHUNKS are always scanned exactly; larger ones
+    use an IVF index (built on first search, persisted next to the vector file,
+    and extended as chunks are added). Filtered searches score only the chunks
+    the filter selects, exactly. Everything survives restarts; nothing is
+    re-embedded. One server process owns the directory, enforced by an
+    exclusive lock on its LOCK file.
+    """
+
+    id = "local"
+
+    def __init__(self, directory: str = LOCAL_STORE_DIR, ann_min_chunks: int = LOCAL_ANN_MIN_CHUNKS, default_probes: int = LOCAL_ANN_PROBES):
+        self.directory = directory
+        self.ann_min_chunks = ann_min_chunks
+        self.default_probes = default_probes
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._services: Dict[str, _ServiceVectors] = {}
+        self._services_lock = threading.Lock()
+        # Per service; odd while compaction renumbers slots, so searches can tell their slots went stale
+        self._generations: Dict[str, int] = {}
+        self.searches = {"exact": 0, "ann": 0, "filtered": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, "LOCK"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"Local vector store at {os.path.abspath(directory)} is in use by another process")
+        with self._db() as conn:
+            conn.executescript(SCHEMA)
+        self._remove_orphans()
+        logger.info("Local vector store at %s", os.path.abspath(directory))
+
+    # ============================================
+    # Storage
+    # ============================================
+
+    def _db(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets searches read while ingestion writes"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, "chunks.db"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.directory, file_name)
+
+    def _remove_orphans(self):
+        """Delete vector files left by an interrupted compaction"""
+        referenced = {row[0] for row in self._db().execute("SELECT file_name FROM vector_files")}
+        for name in os.listdir(self.directory):
+            base = name[:-len(".ivf.npz")] if name.endswith(".ivf.npz") else name
+            if base.endswith(".f32") and base not in referenced:
+                os.remove(self._path(name))
+                logger.info("   Removed orphaned vector file %s", name)
+
+    def _vector_file(self, service_id: str, dimensions: int = None) -> Optional[Tuple[str, int]]:
+        row = self._db().execute("SELECT file_name, dimensions FROM vector_files WHERE service_id = ?", (service_id,)).fetchone()
+        if row is None and dimensions is not None:
+            row = (f"{service_id}.{uuid.uuid4().hex[:8]}.f32", dimensions)
+            with self._db() as conn:
+                conn.execute("INSERT INTO vector_files (service_id, file_name, dimensions) VALUES (?, ?, ?)", (service_id, *row))
+        return row
+
+    def _service(self, service_id: str) -> Optional[_ServiceVectors]:
+        state = self._services.get(service_id)
+        if state is None:
+            with self._services_lock:
+                state = self._services.get(service_id)
+                if state is None:
+                    vector_file = self._vector_file(service_id)
+                    if vector_file is None:
+                        return None
+                    slots = np.fromiter(
+                        (row[0] for row in self._db().execute("SELECT slot FROM chunks WHERE service_id = ?", (service_id,))),
+                        dtype=np.int64
+                    )
+                    state = self._services[service_id] = _ServiceVectors(self._path(vector_file[0]), vector_file[1], slots)
+        return state
+
+    def save_chunks(self, chunks: "ChunkSet", source_id: str, service_id: str, start: int, stop: int, client=None) -> int:
+        vectors = np.array(chunks.embeddings(start, stop), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        with self._write_lock:
+            file_name, dimensions = self._vector_file(service_id, vectors.shape[1])
+            if dimensions != vectors.shape[1]:
+                raise ValueError(f"Service vectors have {dimensions} dimensions, got {vectors.shape[1]}")
+            path = self._path(file_name)
+            row_bytes = dimensions * 4
+
+            # Append first: rows without a chunk (after a crash) are simply never live
+            with open(path, "ab") as f:
+                size = f.tell()
+                if size % row_bytes:
+                    f.truncate(size - size % row_bytes)  # Partial row from an interrupted write
+                    f.seek(0, os.SEEK_END)
+                first_slot = f.tell() // row_bytes
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            created_at = _timestamp()
+            rows = [
+                (
+                    str(uuid.uuid4()), service_id, source_id, i, chunks.chunks[i].content,
+                    chunks.chunks[i].row_reference, json.dumps(chunks.chunk_metadata(i), default=str),
+                    created_at, first_slot + (i - start)
+                )
+                for i in range(start, stop)
+            ]
+            with self._db() as conn:
+                conn.executemany(
+                    "INSERT INTO chunks (id, service_id, source_id, chunk_index, content, row_reference, metadata, created_at, slot) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+
+            state = self._services.get(service_id)
+            if state is not None:
+                state.appended(np.arange(first_slot, first_slot + len(rows)))
+
+        return len(rows)
+
+    def delete_source_chunks(self, source_id: str, from_index: int = 0, client=None):
+        with self._write_lock:
+            conn = self._db()
+            deleted = conn.execute(
+                "SELECT service_id, slot FROM chunks WHERE source_id = ? AND chunk_index >= ?", (source_id, from_index)
+            ).fetchall()
+            if not deleted:
+                return
+            with conn:
+                conn.execute("DELETE FROM chunks WHERE source_id = ? AND chunk_index >= ?", (source_id, from_index))
+
+            for service_id in {row[0] for row in deleted}:
+                state = self._services.get(service_id)
+                if state is not None:
+                    slots = np.array([slot for sid, slot in deleted if sid == service_id], dtype=np.int64)
+                    state.live[slots[slots < len(state.live)]] = False
+                self._maybe_compact(service_id)
+
+    def _maybe_compact(self, service_id: str):
+        """Rewrite a service's vector file once most of it is deleted rows (e.g. after reprocessing)"""
+        vector_file = self._vector_file(service_id)
+        if vector_file is None:
+            return
+        rows = os.path.getsize(self._path(vector_file[0])) // (vector_file[1] * 4)
+        live = self._db().execute("SELECT count(*) FROM chunks WHERE service_id = ?", (service_id,)).fetchone()[0]
+        if rows - live > max(1000, live):
+            self.compact(service_id)
+
+    def compact(self, service_id: str):
+        """Copy live vectors to a new file and point the chunks at it in one transaction"""
+        with self._write_lock:
+            vector_file = self._vector_file(service_id)
+            if vector_file is None:
+                return
+            old_name, dimensions = vector_file
+            conn = self._db()
+            slots = [row[0] for row in conn.execute("SELECT slot FROM chunks WHERE service_id = ? ORDER BY slot", (service_id,))]
+            new_name = f"{service_id}.{uuid.uuid4().hex[:8]}.f32"
+            old_path, new_path = self._path(old_name), self._path(new_name)
+            start = time.perf_counter()
+
+            rows = os.path.getsize(old_path) // (dimensions * 4)
+            source = np.memmap(old_path, dtype=np.float32, mode="r", shape=(rows, dimensions)) if rows else None
+            with open(new_path, "wb") as f:
+                for i in range(0, len(slots), ASSIGN_BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(source[slots[i:i + ASSIGN_BLOCK_ROWS]]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            del source
+
+            # Until this commits the old file and slots stay authoritative; the new file is an orphan
+            self._generations[service_id] = self._generations.get(service_id, 0) + 1
+            try:
+                with conn:
+                    conn.executemany(
+                        "UPDATE chunks SET slot = ? WHERE service_id = ? AND slot = ?",
+                        [(new_slot, service_id, old_slot) for new_slot, old_slot in enumerate(slots)]
+                    )
+                    conn.execute("UPDATE vector_files SET file_name = ? WHERE service_id = ?", (new_name, service_id))
+
+                with self._services_lock:
+                    self._services.pop(service_id, None)
+            finally:
+                self._generations[service_id] += 1
+            for path in (old_path, old_path + ".ivf.npz"):
+                if os.path.exists(path):
+                    os.remove(path)
+            logger.info("🗜️ Compacted vectors for service %s: %d -> %d rows in %.1fs", service_id, rows, len(slots), time.perf_counter() - start)
+
+    def count_service_chunks(self, service_id: str, client=None) -> int:
+        return self._db().execute("SELECT count(*) FROM chunks WHERE service_id = ?", (service_id,)).fetchone()[0]
+
+    def count_source_chunks(self, source_id: str, client=None) -> int:
+        return self._db().execute("SELECT count(*) FROM chunks WHERE source_id = ?", (source_id,)).fetchone()[0]
+
+    # ============================================
+    # Search
+    # ============================================
+
+    def _ivf(self, state: _ServiceVectors) -> _IVFIndex:
+        if state.ivf is None:
+            with self._write_lock:
+                if state.ivf is None:
+                    index_path = state.path + ".ivf.npz"
+                    ivf = _IVFIndex.load(index_path)
+                    # Retrain once the service has doubled since the centroids were fitted
+                    if ivf is None or len(ivf.assignments) > len(state.matrix) or state.live_count > 2 * ivf.trained_on:
+                        start = time.perf_counter()
+                        ivf = _IVFIndex.build(state.matrix, state.live)
+                        ivf.save(index_path)
+                        logger.info("🗂️ Built IVF index (%d lists, %d vectors) in %.1fs", len(ivf.centroids), ivf.trained_on, time.perf_counter() - start)
+                    ivf.extend(state.matrix)
+                    state.ivf = ivf
+        return state.ivf
+
+    def _search(self, service_id: str, *args, **kwargs) -> List[Dict[str, Any]]:
+        """
+        Searches don't take the write lock, so a compaction can renumber slots
+        between scoring and the row lookup. The service's generation brackets
+        each attempt; a search that overlapped a compaction is retried, and
+        after SEARCH_ATTEMPTS it runs under the write lock.
+        """
+        for _ in range(SEARCH_ATTEMPTS):
+            generation = self._generations.get(service_id, 0)
+            if generation % 2:
+                continue
+            results = self._search_slots(service_id, *args, **kwargs)
+            if self._generations.get(service_id, 0) == generation:
+                return results
+        with self._write_lock:
+            return self._search_slots(service_id, *args, **kwargs)
+
+    def _search_slots(
+        self,
+        service_id: str,
+        embedding: List[float],
+        k: int,
+        threshold: float = None,
+        probes: int = None,
+        filters: Dict[str, Any] = None,
+        exact: bool = False
+    ) -> List[Dict[str, Any]]:
+        state = self._service(service_id)
+        if state is None or not len(state.matrix):
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm or len(query) != state.dimensions:
+            return []
+        query = query / norm
+
+        conn = self._db()
+        filter_sql, filter_args = _filter_sql(filters)
+        if filter_sql:
+            # Filters are usually selective: score just the chunks they select
+            self.searches["filtered"] += 1
+            slots = np.fromiter(
+                (row[0] for row in conn.execute(f"SELECT slot FROM chunks WHERE chunks.service_id = ?{filter_sql}", [service_id, *filter_args])),
+                dtype=np.int64
+            )
+            slots = np.sort(slots[slots < len(state.matrix)])
+            scores = state.matrix[slots] @ query if len(slots) else np.empty(0, dtype=np.float32)
+        elif not exact and state.live_count >= self.ann_min_chunks:
+            self.searches["ann"] += 1
+            slots = self._ivf(state).candidates(query, probes or self.default_probes)
+            slots = np.sort(slots[(slots < len(state.live))])
+            slots = slots[state.live[slots]]
+            scores = state.matrix[slots] @ query
+        else:
+            self.searches["exact"] += 1
+            live = state.live  # Snapshot: the array is replaced, not resized, when rows are appended
+            scores = state.matrix[:len(live)] @ query
+            scores[~live] = -np.inf
+            slots = np.arange(len(live))
+
+        # Top k above the threshold, best first (dead slots score -inf)
+        keep = scores > (-np.inf if threshold is None else threshold)
+        slots, scores = slots[keep], scores[keep]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            slots, scores = slots[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        slots, scores = slots[order], scores[order]
+        if not len(slots):
+            return []
+
+        rows = {
+            row[0]: row[1:]
+            for row in conn.execute(
+                f"SELECT slot, id, content, metadata FROM chunks WHERE service_id = ? AND slot IN ({', '.join('?' * len(slots))})",
+                [service_id, *(int(s) for s in slots)]
+            )
+        }
+        return [
+            {"id": rows[slot][0], "content": rows[slot][1], "metadata": json.loads(rows[slot][2]), "similarity": float(score)}
+            for slot, score in zip(slots.tolist(), scores.tolist())
+            if slot in rows  # Deleted between scoring and lookup
+        ]
+
+    def search(
+        self,
+        service_id: str,
+        embedding: List[float],
+        k: int,
+        threshold: float = None,
+        probes: int = None,
+        ef_search: int = None,
+        filters: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """`probes` sets the IVF lists scanned; `ef_search` (HNSW) has no local equivalent and is ignored"""
+        return self._search(service_id, embedding, k, threshold, probes=probes, filters=filters)
+
+    def search_exact(
+        self,
+        service_id: str,
+        embedding: List[float],
+        k: int,
+        threshold: float = None,
+        filters: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        return self._search(service_id, embedding, k, threshold, filters=filters, exact=True)
+
+    # ============================================
+    # Lifecycle
+    # ============================================
+
+    def warm(self) -> bool:
+        """Map every service's vectors so the first searches don't pay for it"""
+        for (service_id,) in self._db().execute("SELECT service_id FROM vector_files").fetchall():
+            self._service(service_id)
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        services = dict(self._services)
+        return {
+            "backend": self.id,
+            "directory": os.path.abspath(self.directory),
+            "services_loaded": len(services),
+            "vectors_live": sum(s.live_count for s in services.values()),
+            "vector_bytes_mapped": sum(s.matrix.nbytes for s in services.values()),
+            "ann_indexes": sum(1 for s in services.values() if s.ivf is not None),
+            "searches": dict(self.searches),
+        }
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        with self._services_lock:
+            self._services.clear()
+        if not self._lock_file.closed:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
@@ -0,0 +1,203 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+from services.database import get_chat_messages, get_session_summary, save_session_summary
+from services.llm import summarize_conversation
+from config import (
+    SESSION_CACHE_SIZE,
+    MEMORY_RECENT_MESSAGES,
+    MEMORY_MAX_CHARS,
+    MEMORY_MESSAGE_MAX_CHARS,
+    MEMORY_LOAD_LIMIT,
+    SUMMARY_MAX_CHARS,
+)
+
+logger = logging.getLogger("piona.memory")
+
+
+class SessionMemory:
+    """
+    Bounded conversation state: a rolling summary plus the most recent messages.
+
+    Turns are appended under the lock and the prompt sees at most the budgeted
+    window of them. Folding older turns into the summary is a separate step
+    (`compact`) run after the response, so the LLM call never sits on the chat
+    path or holds the lock.
+    """
+
+    __slots__ = ("service_id", "session_id", "summary", "messages", "summarized_count", "compacting", "lock")
+
+    def __init__(self, service_id: str, session_id: str):
+        self.service_id = service_id
+        self.session_id = session_id
+        self.summary: Optional[str] = None
+        self.messages: List[Dict[str, str]] = []
+        self.summarized_count = 0  # Session messages folded into the summary
+        self.compacting = False
+        self.lock = threading.Lock()
+
+    def history(self) -> List[Dict[str, str]]:
+        """Recent messages for the prompt, each capped in length, within the memory budget"""
+        with self.lock:
+            window, chars = [], 0
+            for msg in reversed(self.messages):
+                content = _clip(msg["content"])
+                if window and (len(window) >= MEMORY_RECENT_MESSAGES or chars + len(content) > MEMORY_MAX_CHARS):
+                    break
+                window.append({"role": msg["role"], "content": content})
+                chars += len(content)
+            window.reverse()
+            return window
+
+    def add_exchange(self, user_message: str, assistant_message: str) -> bool:
+        """Record a user/assistant turn; returns True if older turns should now be compacted"""
+        with self.lock:
+            self.messages.append({"role": "user", "content": user_message})
+            self.messages.append({"role": "assistant", "content": assistant_message})
+            return self._over_budget() and not self.compacting
+
+    def needs_compaction(self) -> bool:
+        with self.lock:
+            return self._over_budget() and not self.compacting
+
+    def _over_budget(self) -> bool:
+        return len(self.messages) > MEMORY_RECENT_MESSAGES or _chars(self.messages) > MEMORY_MAX_CHARS
+
+    def compact(self):
+        """
+        Summarize the oldest turns and drop them from the verbatim history.
+
+        Only the choice of turns and the swap happen under the lock. The turns
+        stay in `messages` while the summary is generated, so concurrent
+        requests still see them, and are removed together with the summary swap.
+        """
+        with self.lock:
+            if self.compacting or not self._over_budget():
+                return
+            # Compact down to about half the window (whole exchanges) so summarization runs
+            # every few turns, not every turn. The latest exchange is always kept verbatim.
+            keep = max(2, MEMORY_RECENT_MESSAGES // 4 * 2)
+            count = 0
+            while len(self.messages) - count > 2 and (
+                len(self.messages) - count > keep or _chars(self.messages[count:]) > MEMORY_MAX_CHARS
+            ):
+                count += 1
+            if not count:
+                return
+            overflow = list(self.messages[:count])
+            previous = self.summary
+            self.compacting = True
+
+        try:
+            # A reloaded session can bring back many unsummarized turns; fold them in bounded batches
+            summary = previous
+            for start in range(0, count, MEMORY_LOAD_LIMIT):
+                batch = overflow[start:start + MEMORY_LOAD_LIMIT]
+                try:
+                    summary = summarize_conversation(summary, batch)
+                except Exception as e:
+                    logger.warning("   Summarization failed, using extractive summary: %s", e)
+                    summary = _extractive_summary(summary, batch)
+
+            with self.lock:
+                # Messages are only ever appended, so the overflow is still at the front
+                del self.messages[:count]
+                self.summary = summary
+                self.summarized_count += count
+                summarized_count = self.summarized_count
+        finally:
+            with self.lock:
+                self.compacting = False
+        logger.info("   Compacted %d messages (summary: %d chars)", count, len(summary))
+
+        try:
+            save_session_summary(self.service_id, self.session_id, summary, summarized_count)
+        except Exception as e:
+            logger.warning("   Could not persist session summary: %s", e)
+
+
+def _chars(messages: List[Dict[str, str]]) -> int:
+    return sum(len(_clip(msg["content"])) for msg in messages)
+
+
+def _clip(content: str) -> str:
+    if len(content) <= MEMORY_MESSAGE_MAX_CHARS:
+        return content
+    return content[:MEMORY_MESSAGE_MAX_CHARS] + "…"
+
+
+def _extractive_summary(previous_summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+    """Fallback summary: keep the gist of each message, newest text wins when over budget"""
+    parts = [previous_summary] if previous_summary else []
+    for msg in messages:
+        parts.append(f"{msg['role']}: {msg['content'][:200]}")
+    return "\n".join(parts)[-SUMMARY_MAX_CHARS:]
+
+
+class SessionStore:
+    """LRU of recent sessions, loaded from chat_history on a miss"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._sessions: "OrderedDict[Tuple[str, str], SessionMemory]" = OrderedDict()  # By (service_id, session_id)
+        self._lock = threading.Lock()
+
+    def get(self, service_id: str, session_id: str, load: bool = True) -> SessionMemory:
+        """Return the session's memory; load=False skips the history lookup for new sessions"""
+        key = (service_id, session_id)
+        with self._lock:
+            memory = self._sessions.get(key)
+            if memory is not None:
+                self._sessions.move_to_end(key)
+                return memory
+
+        memory = self._load(service_id, session_id) if load else SessionMemory(service_id, session_id)
+
+        with self._lock:
+            self._sessions[key] = memory
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.capacity:
+                self._sessions.popitem(last=False)
+        return memory
+
+    def _load(self, service_id: str, session_id: str) -> SessionMemory:
+        """Persisted summary plus the messages it doesn't cover; compaction is left to the caller"""
+        memory = SessionMemory(service_id, session_id)
+        try:
+            stored = get_session_summary(service_id, session_id)
+        except Exception as e:
+            logger.warning("   Could not load session summary: %s", e)
+            stored = None
+        if stored:
+            memory.summary = stored.get("summary")
+            memory.summarized_count = stored.get("summarized_count") or 0
+
+        # Every message the summary doesn't cover yet; the next compaction folds in any excess
+        rows = []
+        try:
+            while True:
+                page = get_chat_messages(service_id, session_id, offset=memory.summarized_count + len(rows), limit=MEMORY_LOAD_LIMIT)
+                rows.extend(page)
+                if len(page) < MEMORY_LOAD_LIMIT:
+                    break
+        except Exception as e:
+            logger.warning("   Could not load session history: %s", e)
+        if rows or memory.summary:
+            logger.info("   Loaded %d messages for session %s (summary: %s)", len(rows), session_id, bool(memory.summary))
+            memory.messages = [{"role": row["role"], "content": row["content"] or ""} for row in rows]
+        return memory
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+_session_store: SessionStore = None
+
+
+def get_session_store() -> SessionStore:
+    """Get or create the process-wide session store"""
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore(SESSION_CACHE_SIZE)
+    return _session_store
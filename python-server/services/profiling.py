@@ -0,0 +1,230 @@
+import asyncio
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Any
+from services.structured_logging import get_request_id
+from config import ADMIN_API_KEY, PROFILE_SAMPLE_RATE, PROFILE_DIR, PROFILE_MAX_FILES
+
+logger = logging.getLogger("piona.profiling")
+
+PROFILE_HEADER = b"x-profile"
+ADMIN_KEY_HEADER = b"x-admin-key"
+
+_PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,96}$")
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+# cProfile hooks one thread at a time, so only one request at a time takes a loop-wide sample
+_loop_profiler_busy = False
+
+
+class RequestProfile:
+    """
+    cProfile data collected for one request.
+
+    The request profile only holds work this request ran through
+    `run_in_thread`, which is profiled on its own worker thread. The event loop
+    is shared by every in-flight request, so a profiler on it also records
+    other requests' coroutines; that data is kept apart as a loop-wide sample
+    (`<id>-loop`) and is never merged into the request's stats.
+
+    The profile id is the request id plus a server-generated suffix: request
+    ids can come from the client (X-Request-Id), so a repeated id must not
+    overwrite an earlier profile.
+    """
+
+    def __init__(self, request_id: str, method: str, path: str, reason: str):
+        self.request_id = request_id
+        self.profile_id = f"{request_id}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = time.time()
+        self.profilers: List[cProfile.Profile] = []
+        self.loop_profiler: Optional[cProfile.Profile] = None
+        self._lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile):
+        with self._lock:
+            self.profilers.append(profiler)
+
+    def save(self, duration_ms: float, status_code: Optional[int]) -> Optional[str]:
+        """Write the request's stats (<id>.prof), the loop-wide sample (<id>-loop.prof) and a JSON summary (<id>.json) to PROFILE_DIR"""
+        profilers = [p for p in self.profilers if p.getstats()]
+        loop_profiler = self.loop_profiler if self.loop_profiler is not None and self.loop_profiler.getstats() else None
+        if not profilers and loop_profiler is None:
+            return None
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if profilers:
+            stats = pstats.Stats(profilers[0])
+            for profiler in profilers[1:]:
+                stats.add(profiler)
+            stats.dump_stats(os.path.join(PROFILE_DIR, f"{self.profile_id}.prof"))
+        loop_sample_id = None
+        if loop_profiler is not None:
+            loop_sample_id = f"{self.profile_id}-loop"
+            loop_profiler.dump_stats(os.path.join(PROFILE_DIR, f"{loop_sample_id}.prof"))
+
+        summary = {
+            "profile_id": self.profile_id,
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "status_code": status_code,
+            "started_at": self.started_at,
+            "duration_ms": round(duration_ms, 1),
+            "request_profile": bool(profilers),  # Worker-thread work of this request only
+            "loop_sample_id": loop_sample_id,  # Event loop during the request, all concurrent requests included
+        }
+        with open(os.path.join(PROFILE_DIR, f"{self.profile_id}.json"), "w") as f:
+            json.dump(summary, f)
+
+        _prune_profiles()
+        logger.info("   Profile saved: %s (%s %s, %.0fms)", self.profile_id, self.method, self.path, duration_ms)
+        return self.profile_id
+
+
+def _prune_profiles():
+    """Keep only the newest PROFILE_MAX_FILES profiles"""
+    summaries = sorted(
+        (f for f in os.listdir(PROFILE_DIR) if f.endswith(".json")),
+        key=lambda f: os.path.getmtime(os.path.join(PROFILE_DIR, f))
+    )
+    for name in summaries[:max(0, len(summaries) - PROFILE_MAX_FILES)]:
+        profile_id = name[:-len(".json")]
+        for ext in (".json", ".prof", "-loop.prof"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + ext))
+            except FileNotFoundError:
+                pass
+
+
+def _call_profiled(profile: "RequestProfile", func, args, kwargs):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profile.add(profiler)
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """asyncio.to_thread that also profiles the call when the current request is being profiled"""
+    profile = _current_profile.get()
+    if profile is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return await asyncio.to_thread(_call_profiled, profile, func, args, kwargs)
+
+
+def _profile_reason(headers: Dict[bytes, bytes]) -> Optional[str]:
+    """Decide whether to profile: admin header wins, otherwise sample"""
+    if headers.get(PROFILE_HEADER) in (b"1", b"true") and ADMIN_API_KEY:
+        if hmac.compare_digest(headers.get(ADMIN_KEY_HEADER, b""), ADMIN_API_KEY.encode()):
+            return "header"
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles selected requests.
+
+    A request is profiled when it carries `X-Profile: 1` with a valid
+    `X-Admin-Key`, or when it is picked by PROFILE_SAMPLE_RATE. Other requests
+    pass straight through. Worker-thread work goes into the request's profile;
+    the event loop is recorded separately as a loop-wide sample.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = bool(ADMIN_API_KEY) or PROFILE_SAMPLE_RATE > 0
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        reason = _profile_reason(headers)
+        if reason is None:
+            return await self.app(scope, receive, send)
+
+        request_id = get_request_id() or uuid.uuid4().hex
+        profile = RequestProfile(request_id, scope["method"], scope["path"], reason)
+        status_code = None
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-profile-id", profile.profile_id.encode())])
+            await send(message)
+
+        global _loop_profiler_busy
+        loop_profiler = None
+        if not _loop_profiler_busy:
+            _loop_profiler_busy = True
+            loop_profiler = cProfile.Profile()
+            loop_profiler.enable()
+
+        token = _current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            _current_profile.reset(token)
+            if loop_profiler is not None:
+                loop_profiler.disable()
+                _loop_profiler_busy = False
+                profile.loop_profiler = loop_profiler
+            try:
+                await asyncio.to_thread(profile.save, duration_ms, status_code)
+            except Exception as e:
+                logger.warning("   Failed to save profile %s: %s", profile.profile_id, e)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Summaries of stored profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    summaries = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".json"):
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                summaries.append(json.load(f))
+    summaries.sort(key=lambda s: s["started_at"], reverse=True)
+    return summaries
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Path of the raw .prof file, or None if unknown"""
+    if not _PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+    return path if os.path.exists(path) else None
+
+
+def profile_report(profile_id: str, sort: str = "cumulative", limit: int = 40) -> Optional[str]:
+    """Human-readable pstats report for a stored profile"""
+    path = profile_path(profile_id)
+    if path is None:
+        return None
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
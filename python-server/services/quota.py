@@ -0,0 +1,264 @@
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+from services.clients import INTERACTIVE, BULK
+from config import OPENAI_QUOTA_INTERACTIVE_RESERVE, OPENAI_QUOTA_INTERACTIVE_MAX_WAIT
+
+logger = logging.getLogger("piona.quota")
+
+RESOURCES = ("requests", "tokens")
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from an x-ratelimit-reset-* header ("20ms", "1s", "6m0s")"""
+    if not value:
+        return None
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def estimate_tokens(body: bytes) -> Tuple[Optional[str], int]:
+    """
+    Model and token cost of an OpenAI request body, estimated the way the API
+    counts it against TPM: about four characters per input token, plus
+    max_tokens for completions.
+    """
+    try:
+        payload = json.loads(body)
+    except (TypeError, ValueError):
+        return None, 1
+    if not isinstance(payload, dict):
+        return None, 1
+    completion = payload.get("max_completion_tokens") or payload.get("max_tokens") or 0
+    return payload.get("model"), max(1, math.ceil(len(body) / 4)) + int(completion)
+
+
+class _Bucket:
+    """
+    One rate limit (requests or tokens per minute) of one model, as last
+    reported by the API. Between responses it refills at the rate the reset
+    header implies and is drawn down by local reservations.
+    """
+
+    __slots__ = ("limit", "level", "rate", "updated_at")
+
+    def __init__(self, limit: float, remaining: float, reset_s: Optional[float], now: float):
+        self.observe(limit, remaining, reset_s, now)
+
+    def observe(self, limit: float, remaining: float, reset_s: Optional[float], now: float):
+        self.limit = limit
+        self.level = remaining
+        if reset_s and remaining < limit:
+            # Time until fully replenished; never slower than a per-minute window
+            self.rate = max(limit / 60.0, (limit - remaining) / reset_s)
+        else:
+            self.rate = limit / 60.0
+        self.updated_at = now
+
+    def refill(self, now: float):
+        self.level = min(self.limit, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_for(self, amount: float, floor: float) -> float:
+        """Seconds until `amount` can be taken leaving at least `floor`; 0 if it can now"""
+        needed = min(amount + floor, self.limit) - self.level
+        return needed / self.rate if needed > 0 else 0.0
+
+
+class _ClassStats:
+    def __init__(self):
+        self.requests = 0
+        self.tokens_estimated = 0
+        self.delayed = 0
+        self.rate_limited = 0  # 429 responses
+        self.wait_timeouts = 0
+        self.waiting = 0
+        self._waits = deque(maxlen=1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        return {
+            "requests": self.requests,
+            "tokens_estimated": self.tokens_estimated,
+            "delayed": self.delayed,
+            "rate_limited": self.rate_limited,
+            "wait_timeouts": self.wait_timeouts,
+            "waiting": self.waiting,
+            "wait_ms_p50": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+        }
+
+
+class QuotaScheduler:
+    """
+    Process-wide OpenAI rate-limit budget shared by chat and ingestion.
+
+    Request and token budgets are tracked per model from the x-ratelimit-*
+    response headers. Before a request is sent its estimated cost is reserved:
+    interactive traffic may use the whole budget, bulk traffic only what is
+    left above `interactive_reserve` of each limit, and bulk also waits while
+    any interactive request is waiting. Until a model has reported its limits,
+    requests are not delayed. Interactive requests wait at most
+    `interactive_max_wait` seconds and are then sent anyway; bulk waits as
+    long as it takes. Thread-safe (OpenAI calls run in worker threads).
+    """
+
+    def __init__(self, interactive_reserve: float, interactive_max_wait: float):
+        self.interactive_reserve = interactive_reserve
+        self.interactive_max_wait = interactive_max_wait
+        self._buckets: Dict[str, Dict[str, _Bucket]] = {}
+        self._stats = {INTERACTIVE: _ClassStats(), BULK: _ClassStats()}
+        self._cond = threading.Condition()
+
+    def _delay(self, model: str, pool: str, cost: Dict[str, float], now: float) -> float:
+        """Seconds this request must wait; 0 means reserve and send now"""
+        buckets = self._buckets.get(model)
+        if not buckets:
+            return 0.0
+        delay = 0.0
+        for resource, bucket in buckets.items():
+            bucket.refill(now)
+            floor = 0.0
+            if pool != INTERACTIVE:
+                floor = bucket.limit * self.interactive_reserve
+                if self._stats[INTERACTIVE].waiting:
+                    delay = max(delay, 0.05)
+            delay = max(delay, bucket.wait_for(cost[resource], floor))
+        return delay
+
+    def acquire(self, model: Optional[str], tokens: int, pool: str):
+        """Block until the request fits the model's budget for this traffic class, then reserve it"""
+        stats = self._stats.get(pool) or self._stats[BULK]
+        cost = {"requests": 1, "tokens": tokens}
+        start = time.monotonic()
+        with self._cond:
+            stats.requests += 1
+            stats.tokens_estimated += tokens
+            delay = self._delay(model, pool, cost, start)
+            if delay:
+                stats.delayed += 1
+                stats.waiting += 1
+                logger.debug("   %s request for %s waits %.2fs for quota", pool, model, delay)
+                try:
+                    while delay:
+                        waited = time.monotonic() - start
+                        if pool == INTERACTIVE and waited >= self.interactive_max_wait:
+                            stats.wait_timeouts += 1
+                            logger.warning("   OpenAI quota for %s exhausted; sending chat request anyway", model)
+                            break
+                        timeout = min(delay, 1.0)
+                        if pool == INTERACTIVE:
+                            timeout = min(timeout, self.interactive_max_wait - waited)
+                        self._cond.wait(timeout)
+                        delay = self._delay(model, pool, cost, time.monotonic())
+                finally:
+                    stats.waiting -= 1
+                    self._cond.notify_all()
+            stats._waits.append(time.monotonic() - start)
+            for resource, bucket in self._buckets.get(model, {}).items():
+                bucket.level -= cost[resource]
+
+    def observe(self, model: Optional[str], pool: str, status_code: int, headers):
+        """Update a model's budgets from a response's rate-limit headers"""
+        if status_code == 429:
+            stats = self._stats.get(pool) or self._stats[BULK]
+            with self._cond:
+                stats.rate_limited += 1
+        if not model:
+            return
+        now = time.monotonic()
+        observed = {}
+        for resource in RESOURCES:
+            limit = headers.get(f"x-ratelimit-limit-{resource}")
+            remaining = headers.get(f"x-ratelimit-remaining-{resource}")
+            if limit is None or remaining is None:
+                continue
+            try:
+                observed[resource] = (float(limit), float(remaining), _parse_duration(headers.get(f"x-ratelimit-reset-{resource}")))
+            except ValueError:
+                continue
+        if not observed:
+            return
+        with self._cond:
+            buckets = self._buckets.setdefault(model, {})
+            for resource, (limit, remaining, reset_s) in observed.items():
+                bucket = buckets.get(resource)
+                if bucket is None:
+                    buckets[resource] = _Bucket(limit, remaining, reset_s, now)
+                    logger.info("OpenAI %s %s limit: %g/min", model, resource, limit)
+                else:
+                    bucket.observe(limit, remaining, reset_s, now)
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._cond:
+            models = {}
+            for model, buckets in sorted(self._buckets.items()):
+                models[model] = {}
+                for resource, bucket in buckets.items():
+                    bucket.refill(now)
+                    models[model][resource] = {
+                        "limit": bucket.limit,
+                        "remaining_estimated": round(bucket.level, 1),
+                        "refill_per_s": round(bucket.rate, 2),
+                        "interactive_reserve": round(bucket.limit * self.interactive_reserve, 1),
+                    }
+            return {
+                "interactive_reserve": self.interactive_reserve,
+                "models": models,
+                "classes": {pool: stats.snapshot() for pool, stats in self._stats.items()},
+            }
+
+
+class QuotaTransport:
+    """httpx transport wrapper that reserves OpenAI quota before each request and learns limits from responses"""
+
+    def __init__(self, transport, scheduler: QuotaScheduler, pool: str):
+        self._transport = transport
+        self.scheduler = scheduler
+        self.pool = pool
+
+    @property
+    def stats(self):
+        return self._transport.stats
+
+    def handle_request(self, request):
+        try:
+            body = request.content
+        except Exception:  # Streaming body: nothing to estimate from
+            body = b""
+        model, tokens = estimate_tokens(body)
+        self.scheduler.acquire(model, tokens, self.pool)
+        response = self._transport.handle_request(request)
+        self.scheduler.observe(model, self.pool, response.status_code, response.headers)
+        return response
+
+    def close(self):
+        self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_quota_scheduler = QuotaScheduler(
+    interactive_reserve=OPENAI_QUOTA_INTERACTIVE_RESERVE,
+    interactive_max_wait=OPENAI_QUOTA_INTERACTIVE_MAX_WAIT,
+)
+
+
+def get_quota_scheduler() -> QuotaScheduler:
+    return _quota_scheduler
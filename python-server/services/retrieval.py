@@ -1,138 +1,114 @@
-import json
 import logging
-import time
 from typing import List, Dict, Any
-from services.database import get_supabase, reset_connection
 from services.embedding import generate_embedding
+from services.vector_store import get_vector_store
 from config import MAX_CONTEXT_CHUNKS, SIMILARITY_THRESHOLD
 
 logger = logging.getLogger("piona.retrieval")
 
-MAX_RETRIES = 2
-RETRY_DELAY = 1.0  # seconds
+FALLBACK_THRESHOLD = 0.1  # Used when nothing in the top-k clears the configured threshold
 
 
-def _execute_with_retry(operation, operation_name: str):
-    """Execute a database operation with retry on connection failure"""
-    last_error = None
-
-    for attempt in range(MAX_RETRIES + 1):
-        try:
-            return operation()
-        except Exception as e:
-            last_error = e
-            error_msg = str(e).lower()
-
-            # Check if it's a connection/timeout error
-            is_connection_error = any(keyword in error_msg for keyword in [
-                "timeout", "connection", "reset", "stream", "closed", "refused"
-            ])
-
-            if is_connection_error and attempt < MAX_RETRIES:
-                logger.warning(f"   {operation_name} failed (attempt {attempt + 1}), retrying...")
-                reset_connection()  # Reset the connection
-                time.sleep(RETRY_DELAY)
-            else:
-                raise last_error
-
-    raise last_error
+def warm_retrieval() -> bool:
+    """Preload the numeric stack used for local similarity and open the vector store"""
+    import numpy  # noqa: F401
+    return get_vector_store().warm()
 
 
 def retrieve_relevant_chunks(
     service_id: str,
     query: str,
     max_chunks: int = None,
-    threshold: float = None
+    threshold: float = None,
+    probes: int = None,
+    ef_search: int = None,
+    filters: Dict[str, Any] = None
 ) -> List[Dict[str, Any]]:
-    """Retrieve relevant chunks using vector similarity search"""
-    logger.info(f"🔍 Retrieving chunks for: \"{query[:50]}...\"")
-    logger.info(f"   Service ID: {service_id}")
+    """
+    Retrieve relevant chunks using vector similarity search in the configured
+    vector store.
+
+    One search returns the top `max_chunks` with their scores and the threshold
+    is applied here: no COUNT beforehand (an empty result means the service has
+    no chunks, or none pass the filters) and no second search when nothing
+    clears the threshold, since the same results are reused with the lower
+    FALLBACK_THRESHOLD. If the ANN search returns fewer than `max_chunks`, one
+    exact search with the same filters runs before giving up: a filter applied
+    after the index scan, or a small service in the shared index, can leave an
+    approximate search short of rows that exist.
+
+    `probes` (ivfflat) and `ef_search` (HNSW) override the service's stored
+    search_settings for this query only. `filters` (source_ids, sheet, columns,
+    created_after) are applied inside the search, so excluded chunks are never
+    scored.
+    """
+    logger.info("🔍 Retrieving chunks for: \"%s...\"", query[:50])
+    logger.debug("   Service ID: %s", service_id)
 
     if max_chunks is None:
         max_chunks = MAX_CONTEXT_CHUNKS
     if threshold is None:
         threshold = SIMILARITY_THRESHOLD
 
-    logger.info(f"   Threshold: {threshold}, Max chunks: {max_chunks}")
+    logger.debug("   Threshold: %s, Max chunks: %s", threshold, max_chunks)
 
+    query_embedding = None
     try:
-        # First, check if there are any chunks for this service
-        supabase = get_supabase()
-
-        def count_chunks():
-            return supabase.table("chunks").select("id", count="exact").eq("service_id", service_id).execute()
-
-        count_result = _execute_with_retry(count_chunks, "Count chunks")
-        total_chunks = count_result.count if hasattr(count_result, 'count') else len(count_result.data or [])
-        logger.info(f"   Total chunks for service: {total_chunks}")
-
-        if total_chunks == 0:
-            logger.warning("   ⚠️ No chunks found for this service. Upload and process a source file first.")
-            return []
-
         # Generate embedding for the query
         query_embedding = generate_embedding(query)
-        logger.info(f"   Query embedding generated ({len(query_embedding)} dimensions)")
-
-        # Call match_chunks RPC with retry
-        def call_match_chunks():
-            return supabase.rpc(
-                "match_chunks",
-                {
-                    "query_embedding": query_embedding,
-                    "match_service_id": service_id,
-                    "match_threshold": threshold,
-                    "match_count": max_chunks
-                }
-            ).execute()
-
-        result = _execute_with_retry(call_match_chunks, "RPC match_chunks")
-
-        chunks = []
-        for item in result.data or []:
-            chunks.append({
-                "id": item["id"],
-                "content": item["content"],
-                "metadata": item.get("metadata", {}),
-                "similarity": item["similarity"]
-            })
-
-        logger.info(f"   ✅ Found {len(chunks)} chunks above threshold {threshold}")
-        if chunks:
-            sims = [f"{c['similarity']:.2f}" for c in chunks]
-            logger.info(f"   Similarities: {sims}")
-        elif total_chunks > 0:
-            logger.warning(f"   ⚠️ {total_chunks} chunks exist but none matched above threshold {threshold}")
-            logger.info("   Trying fallback method with lower threshold...")
-            return retrieve_chunks_fallback(service_id, query_embedding, max_chunks, 0.1)
+        logger.debug("   Query embedding generated (%d dimensions)", len(query_embedding))
+
+        # Top-k regardless of score, in a single round trip
+        candidates = get_vector_store().search(
+            service_id, query_embedding, max_chunks,
+            probes=probes, ef_search=ef_search, filters=filters
+        )
+        if len(candidates) < max_chunks:
+            exact = get_vector_store().search_exact(service_id, query_embedding, max_chunks, filters=filters)
+            if len(exact) > len(candidates):
+                logger.info("   Index search returned %d chunks; exact search found %d", len(candidates), len(exact))
+                candidates = exact
+
+        if not candidates:
+            if filters:
+                logger.warning("   ⚠️ No chunks match the filters: %s", filters)
+            else:
+                logger.warning("   ⚠️ No chunks found for this service. Upload and process a source file first.")
+            return []
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("   Similarities: %s", [round(c["similarity"], 2) for c in candidates])
 
+        chunks = [c for c in candidates if c["similarity"] > threshold]
+        if chunks:
+            logger.info("   ✅ Found %d chunks above threshold %s", len(chunks), threshold)
+            return chunks
+
+        chunks = [c for c in candidates if c["similarity"] > FALLBACK_THRESHOLD]
+        logger.warning(
+            "   ⚠️ None of the top %d matched above threshold %s (best %.2f); using %d above %s",
+            len(candidates), threshold, candidates[0]["similarity"], len(chunks), FALLBACK_THRESHOLD
+        )
         return chunks
 
     except Exception as e:
         error_msg = str(e)
-        logger.error(f"   ❌ Retrieval failed: {error_msg}")
+        logger.error("   ❌ Retrieval failed: %s", error_msg)
+
+        if query_embedding is None:
+            return []
 
         # Check if it's a function not found error
         if "match_chunks" in error_msg.lower() or "function" in error_msg.lower() or "does not exist" in error_msg.lower():
             logger.error("   💡 The match_chunks function may not exist in your database.")
             logger.error("   Please run the schema.sql file in Supabase SQL Editor.")
             logger.info("   Trying fallback method...")
-            try:
-                query_embedding = generate_embedding(query)
-                return retrieve_chunks_fallback(service_id, query_embedding, max_chunks, threshold)
-            except Exception as fallback_error:
-                logger.error(f"   Fallback also failed: {fallback_error}")
-                return []
+            return retrieve_chunks_fallback(service_id, query_embedding, max_chunks, threshold, filters)
 
         # Check if it's a timeout/connection error - try fallback
         if any(keyword in error_msg.lower() for keyword in ["stream", "reset", "timeout", "connection"]):
             logger.error("   💡 Connection timeout. Trying fallback method...")
-            try:
-                query_embedding = generate_embedding(query)
-                return retrieve_chunks_fallback(service_id, query_embedding, max_chunks, threshold)
-            except Exception as fallback_error:
-                logger.error(f"   Fallback also failed: {fallback_error}")
-                return []
+            return retrieve_chunks_fallback(service_id, query_embedding, max_chunks, threshold, filters)
 
         return []
 
@@ -141,67 +117,27 @@ def retrieve_chunks_fallback(
     service_id: str,
     query_embedding: List[float],
     max_chunks: int,
-    threshold: float
+    threshold: float,
+    filters: Dict[str, Any] = None
 ) -> List[Dict[str, Any]]:
-    """Fallback: fetch all chunks and compute similarity in Python"""
-    logger.info("   Using fallback retrieval (local similarity computation)")
+    """
+    Fallback: exact similarity over all of the service's (filtered) chunks.
+    Only used when the search itself fails (match_chunks missing, connection
+    errors); it transfers every embedding of the service.
+    """
+    logger.info("   Using fallback retrieval (exact similarity scan)")
 
     try:
-        supabase = get_supabase()
+        chunks = get_vector_store().search_exact(service_id, query_embedding, max_chunks, threshold, filters)
 
-        # Fetch all chunks for this service with retry
-        def fetch_chunks():
-            return supabase.table("chunks").select("id, content, metadata, embedding").eq("service_id", service_id).execute()
-
-        result = _execute_with_retry(fetch_chunks, "Fetch chunks")
-
-        if not result.data:
-            logger.warning("   No chunks found for this service")
-            return []
-
-        logger.info(f"   Fetched {len(result.data)} chunks, computing similarities...")
-
-        # Compute cosine similarity
-        import numpy as np
-        query_vec = np.array(query_embedding)
-        query_norm = np.linalg.norm(query_vec)
-
-        scored_chunks = []
-        for chunk in result.data:
-            embedding_data = chunk.get("embedding")
-            if embedding_data:
-                # Handle embedding stored as JSON string
-                if isinstance(embedding_data, str):
-                    try:
-                        embedding_data = json.loads(embedding_data)
-                    except json.JSONDecodeError:
-                        logger.warning(f"   Failed to parse embedding for chunk {chunk.get('id')}")
-                        continue
-                chunk_vec = np.array(embedding_data)
-                chunk_norm = np.linalg.norm(chunk_vec)
-                if query_norm > 0 and chunk_norm > 0:
-                    similarity = float(np.dot(query_vec, chunk_vec) / (query_norm * chunk_norm))
-                    if similarity >= threshold:
-                        scored_chunks.append({
-                            "id": chunk["id"],
-                            "content": chunk["content"],
-                            "metadata": chunk.get("metadata", {}),
-                            "similarity": similarity
-                        })
-
-        # Sort by similarity and take top N
-        scored_chunks.sort(key=lambda x: x["similarity"], reverse=True)
-        chunks = scored_chunks[:max_chunks]
-
-        logger.info(f"   ✅ Fallback found {len(chunks)} chunks above threshold")
-        if chunks:
-            sims = [f"{c['similarity']:.2f}" for c in chunks]
-            logger.info(f"   Similarities: {sims}")
+        logger.info("   ✅ Fallback found %d chunks above threshold", len(chunks))
+        if chunks and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("   Similarities: %s", [round(c["similarity"], 2) for c in chunks])
 
         return chunks
 
     except Exception as e:
-        logger.error(f"   ❌ Fallback also failed: {e}")
+        logger.error("   ❌ Fallback also failed: %s", e)
         return []
 
 
@@ -216,5 +152,5 @@ def build_context(chunks: List[Dict[str, Any]]) -> str:
         context_parts.append(f"[Source {i}]: {chunk['content']}")
 
     context = "\n\n".join(context_parts)
-    logger.info(f"   Context: {len(context)} chars from {len(chunks)} sources")
+    logger.info("   Context: %d chars from %d sources", len(context), len(chunks))
     return context
@@ -0,0 +1,291 @@
+import json
+import logging
+import time
+from typing import List, Dict, Any, Optional, Sequence, TYPE_CHECKING
+from services.database import get_supabase
+from config import SUPABASE_DB_URL
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger("piona.vector_index")
+
+INDEX_METHODS = ("hnsw", "ivfflat")
+
+# Settings tried by the tuner, cheapest first
+DEFAULT_PROBES = (1, 2, 4, 8, 16, 32, 64)
+DEFAULT_EF_SEARCH = (10, 20, 40, 80, 160, 320)
+
+
+def _connect(dsn: str):
+    """Autocommit psycopg connection (CREATE/DROP INDEX CONCURRENTLY can't run in a transaction)"""
+    try:
+        import psycopg
+    except ImportError:
+        raise RuntimeError("Direct Postgres access needs psycopg: pip install 'psycopg[binary]'")
+    return psycopg.connect(dsn, autocommit=True)
+
+
+def _parse_vector(value) -> List[float]:
+    """pgvector values come back as '[0.1,0.2,...]' strings over PostgREST and text protocols"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+# ============================================
+# Search targets
+# ============================================
+
+class SupabaseVectorSearch:
+    """Vector index operations through Supabase RPC (the server's normal path)"""
+
+    def __init__(self, client: "Client" = None):
+        self.client = client or get_supabase()
+
+    def chunk_count(self, service_id: str) -> int:
+        result = self.client.table("chunks").select("id", count="exact").eq("service_id", service_id).limit(1).execute()
+        return result.count or 0
+
+    def sample_queries(self, service_id: str, count: int) -> List[List[float]]:
+        result = self.client.rpc("sample_chunk_embeddings", {"match_service_id": service_id, "sample_count": count}).execute()
+        return [_parse_vector(row["embedding"]) for row in result.data or []]
+
+    def exact(self, service_id: str, embedding: List[float], k: int) -> List[str]:
+        result = self.client.rpc("match_chunks_exact", {
+            "query_embedding": embedding,
+            "match_service_id": service_id,
+            "match_count": k
+        }).execute()
+        return [row["id"] for row in result.data or []]
+
+    def search(self, service_id: str, embedding: List[float], k: int, probes: int = None, ef_search: int = None) -> List[str]:
+        result = self.client.rpc("match_chunks", {
+            "query_embedding": embedding,
+            "match_service_id": service_id,
+            "match_threshold": -1.0,  # Recall is measured on rank alone
+            "match_count": k,
+            "search_probes": probes,
+            "search_ef": ef_search
+        }).execute()
+        return [row["id"] for row in result.data or []]
+
+    def indexes(self) -> List[Dict[str, Any]]:
+        return self.client.rpc("list_vector_indexes", {}).execute().data or []
+
+
+class PostgresVectorSearch:
+    """
+    The same operations over a direct Postgres connection, for tuning against a
+    local Postgres with pgvector (schema.sql plus migrations applied). Needs
+    psycopg, an optional dependency the server only needs for index builds.
+    """
+
+    def __init__(self, dsn: str):
+        self.conn = _connect(dsn)
+
+    def _rows(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self.conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def chunk_count(self, service_id: str) -> int:
+        return self._rows("SELECT count(*) FROM chunks WHERE service_id = %s", (service_id,))[0][0]
+
+    def sample_queries(self, service_id: str, count: int) -> List[List[float]]:
+        rows = self._rows("SELECT embedding::text FROM sample_chunk_embeddings(%s, %s)", (service_id, count))
+        return [_parse_vector(row[0]) for row in rows]
+
+    def exact(self, service_id: str, embedding: List[float], k: int) -> List[str]:
+        rows = self._rows("SELECT id FROM match_chunks_exact(%s::vector, %s, %s)", (json.dumps(embedding), service_id, k))
+        return [str(row[0]) for row in rows]
+
+    def search(self, service_id: str, embedding: List[float], k: int, probes: int = None, ef_search: int = None) -> List[str]:
+        rows = self._rows(
+            "SELECT id FROM match_chunks(%s::vector, %s, %s, %s, %s, %s)",
+            (json.dumps(embedding), service_id, -1.0, k, probes, ef_search)
+        )
+        return [str(row[0]) for row in rows]
+
+    def indexes(self) -> List[Dict[str, Any]]:
+        rows = self._rows("SELECT index_name, method, service_id::text, definition, size_bytes FROM list_vector_indexes()")
+        columns = ("index_name", "method", "service_id", "definition", "size_bytes")
+        return [dict(zip(columns, row)) for row in rows]
+
+
+# ============================================
+# Index management
+# ============================================
+
+def list_vector_indexes(client: "Client" = None) -> List[Dict[str, Any]]:
+    """ANN indexes on chunks: the global one and any per-service partial indexes"""
+    return SupabaseVectorSearch(client).indexes()
+
+
+def create_service_vector_index(
+    service_id: str,
+    method: str = "hnsw",
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = None,
+    dsn: str = None
+) -> str:
+    """
+    Build (or rebuild) a partial ANN index covering only this service's chunks.
+
+    The statements come from service_vector_index_ddl and run with
+    CONCURRENTLY over a direct connection (SUPABASE_DB_URL), so ingestion
+    keeps writing to chunks while the index builds.
+    """
+    if method not in INDEX_METHODS:
+        raise ValueError(f"Unknown index method: {method}")
+    dsn = dsn or SUPABASE_DB_URL
+    if not dsn:
+        raise RuntimeError("Building an index needs a direct Postgres connection: set SUPABASE_DB_URL")
+    logger.info("🗂️ Building %s index for service %s...", method, service_id)
+    start = time.perf_counter()
+    with _connect(dsn) as conn:
+        index_name, drop_statement, create_statement = conn.execute(
+            "SELECT index_name, drop_statement, create_statement FROM service_vector_index_ddl(%s, %s, %s, %s, %s)",
+            (service_id, method, m, ef_construction, lists)
+        ).fetchone()
+        conn.execute("SET statement_timeout = 0")  # Builds on large services outlast the pooler's default
+        conn.execute(drop_statement)
+        conn.execute(create_statement)
+    logger.info("   ✅ Built %s in %.1fs", index_name, time.perf_counter() - start)
+    return index_name
+
+
+def drop_service_vector_index(service_id: str, dsn: str = None) -> bool:
+    """
+    Drop a service's partial index; queries fall back to the global index.
+
+    Runs DROP INDEX CONCURRENTLY over a direct connection (SUPABASE_DB_URL),
+    like the build, so queries and ingestion on chunks aren't blocked.
+    Returns False if the service has no index.
+    """
+    dsn = dsn or SUPABASE_DB_URL
+    if not dsn:
+        raise RuntimeError("Dropping an index needs a direct Postgres connection: set SUPABASE_DB_URL")
+    with _connect(dsn) as conn:
+        index_name, drop_statement, _ = conn.execute(
+            "SELECT index_name, drop_statement, create_statement FROM service_vector_index_ddl(%s)",
+            (service_id,)
+        ).fetchone()
+        if conn.execute("SELECT to_regclass(%s)", (index_name,)).fetchone()[0] is None:
+            return False
+        conn.execute(drop_statement)
+    logger.info("🗑️ Dropped %s", index_name)
+    return True
+
+
+def update_service_search_settings(service_id: str, settings: Dict[str, int], client: "Client" = None):
+    """Store the ANN query settings match_chunks applies for this service"""
+    supabase = client or get_supabase()
+    supabase.table("services").update({"search_settings": settings}).eq("id", service_id).execute()
+
+
+# ============================================
+# Recall / latency tuning
+# ============================================
+
+def _service_index(indexes: List[Dict[str, Any]], service_id: str) -> Optional[Dict[str, Any]]:
+    """The index match_chunks will use for a service: its partial index, else the global one"""
+    own = [i for i in indexes if i.get("service_id") == service_id]
+    if own:
+        return own[0]
+    shared = [i for i in indexes if not i.get("service_id")]
+    return shared[0] if shared else None
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 2)
+
+
+def _measure(search, service_id: str, queries: List[List[float]], truth: List[set], k: int, setting: Dict[str, int]) -> Dict[str, Any]:
+    """Recall@k and latency of match_chunks with one setting ({} for the service's current ones)"""
+    recalls, latencies = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search.search(service_id, query, k, **setting)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if expected:
+            recalls.append(len(expected.intersection(found)) / len(expected))
+    return {
+        "setting": setting,
+        "recall_at_k": round(sum(recalls) / len(recalls), 4) if recalls else None,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95)
+    }
+
+
+def tune_service(
+    search,
+    service_id: str,
+    k: int = 5,
+    samples: int = 50,
+    target_recall: float = 0.95,
+    probes: Sequence[int] = DEFAULT_PROBES,
+    ef_search: Sequence[int] = DEFAULT_EF_SEARCH
+) -> Dict[str, Any]:
+    """
+    Measure recall@k and latency of match_chunks for a service across ANN settings.
+
+    Query vectors are sampled from the service's own chunks and ground truth
+    comes from an exact scan. The recommendation is the fastest setting (by
+    p50) that reaches `target_recall`, or the most accurate one if none does.
+    `current` is measured with the settings match_chunks applies today, which
+    is what a small service sharing the global index actually gets.
+    Latency is measured from the caller, so it includes the round trip.
+    """
+    chunk_count = search.chunk_count(service_id)
+    index = _service_index(search.indexes(), service_id)
+    report = {
+        "service_id": service_id,
+        "chunks": chunk_count,
+        "index": index,
+        "k": k,
+        "target_recall": target_recall,
+        "current": None,
+        "results": [],
+        "recommendation": None,
+        "notes": []
+    }
+    if chunk_count == 0:
+        report["notes"].append("Service has no chunks")
+        return report
+    if index is None:
+        report["notes"].append("No ANN index on chunks; every query is an exact scan")
+        return report
+
+    queries = search.sample_queries(service_id, samples)
+    report["samples"] = len(queries)
+    truth = [set(search.exact(service_id, q, k)) for q in queries]
+
+    knob = "probes" if index["method"] == "ivfflat" else "ef_search"
+    values = probes if knob == "probes" else ef_search
+    logger.info("🎯 Tuning %s for service %s (%d chunks, %d queries)", knob, service_id, chunk_count, len(queries))
+
+    current = _measure(search, service_id, queries, truth, k, {})
+    report["current"] = current
+    logger.info("   current settings: recall@%d=%s p50=%sms", k, current['recall_at_k'], current['p50_ms'])
+    if current["recall_at_k"] is not None and current["recall_at_k"] < target_recall:
+        report["notes"].append(f"Current settings reach recall {current['recall_at_k']}, below {target_recall}")
+
+    for value in values:
+        result = _measure(search, service_id, queries, truth, k, {knob: value})
+        report["results"].append(result)
+        logger.info("   %s=%s: recall@%d=%s p50=%sms", knob, value, k, result['recall_at_k'], result['p50_ms'])
+
+    measured = [r for r in report["results"] if r["recall_at_k"] is not None]
+    passing = [r for r in measured if r["recall_at_k"] >= target_recall]
+    if passing:
+        report["recommendation"] = min(passing, key=lambda r: r["p50_ms"])
+    elif measured:
+        report["recommendation"] = max(measured, key=lambda r: (r["recall_at_k"], -r["p50_ms"]))
+        report["notes"].append(f"No setting reached recall {target_recall}")
+        if not index.get("service_id"):
+            report["notes"].append("Filtering the shared index drops this service's neighbours; try a per-service index")
+
+    return report
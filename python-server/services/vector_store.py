@@ -0,0 +1,297 @@
+import json
+import logging
+import threading
+import time
+from typing import List, Dict, Any, TYPE_CHECKING
+from services.clients import get_client_manager
+from config import VECTOR_STORE
+
+if TYPE_CHECKING:
+    from supabase import Client
+    from services.chunks import ChunkSet
+
+logger = logging.getLogger("piona.vector_store")
+
+MAX_RETRIES = 2
+RETRY_DELAY = 1.0  # seconds
+NO_THRESHOLD = -2.0  # Below any cosine similarity: match_chunks returns the plain top-k
+
+
+def _execute_with_retry(operation, operation_name: str):
+    """Execute a database operation with retry on connection failure"""
+    last_error = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return operation()
+        except Exception as e:
+            last_error = e
+            error_msg = str(e).lower()
+
+            # Check if it's a connection/timeout error
+            is_connection_error = any(keyword in error_msg for keyword in [
+                "timeout", "connection", "reset", "stream", "closed", "refused"
+            ])
+
+            if is_connection_error and attempt < MAX_RETRIES:
+                logger.warning("   %s failed (attempt %d), retrying...", operation_name, attempt + 1)
+                get_client_manager().reset_supabase()
+                time.sleep(RETRY_DELAY)
+            else:
+                raise last_error
+
+    raise last_error
+
+
+def _filter_params(filters: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    match_chunks filter parameters from request filters (source_ids, sheet,
+    columns, created_after). Unset filters are omitted.
+    """
+    params = {}
+    if not filters:
+        return params
+    if filters.get("source_ids"):
+        params["filter_source_ids"] = [str(source_id) for source_id in filters["source_ids"]]
+    metadata = {}
+    if filters.get("sheet"):
+        metadata["sheet"] = filters["sheet"]
+    if filters.get("columns"):
+        metadata["row_data"] = dict(filters["columns"])
+    if metadata:
+        params["filter_metadata"] = metadata
+    if filters.get("created_after"):
+        created_after = filters["created_after"]
+        params["filter_created_after"] = created_after.isoformat() if hasattr(created_after, "isoformat") else created_after
+    return params
+
+
+def _apply_filters(query, params: Dict[str, Any]):
+    """The same filters on a PostgREST table query (local fallback path)"""
+    if "filter_source_ids" in params:
+        query = query.in_("source_id", params["filter_source_ids"])
+    if "filter_metadata" in params:
+        query = query.contains("metadata", params["filter_metadata"])
+    if "filter_created_after" in params:
+        query = query.gt("created_at", params["filter_created_after"])
+    return query
+
+
+class VectorStore:
+    """
+    Interface for chunk storage and similarity search. Sources, services and
+    chat history always live in Supabase; only chunks and their embeddings move.
+
+    Search results are dicts with id, content, metadata and similarity (cosine),
+    best first, limited to similarity > threshold. A threshold of None returns
+    the plain top-k, so an empty result means nothing (matching) is stored.
+    """
+
+    id: str
+
+    def save_chunks(self, chunks: "ChunkSet", source_id: str, service_id: str, start: int, stop: int, client: "Client" = None) -> int:
+        """Store chunks start..stop of a ChunkSet (embeddings attached); chunk_index is their position"""
+        raise NotImplementedError
+
+    def delete_source_chunks(self, source_id: str, from_index: int = 0, client: "Client" = None):
+        """Delete a source's chunks with chunk_index >= from_index"""
+        raise NotImplementedError
+
+    def count_service_chunks(self, service_id: str, client: "Client" = None) -> int:
+        raise NotImplementedError
+
+    def count_source_chunks(self, source_id: str, client: "Client" = None) -> int:
+        raise NotImplementedError
+
+    def search(
+        self,
+        service_id: str,
+        embedding: List[float],
+        k: int,
+        threshold: float = None,
+        probes: int = None,
+        ef_search: int = None,
+        filters: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """Top-k search; may be approximate, tuned by probes/ef_search"""
+        raise NotImplementedError
+
+    def search_exact(
+        self,
+        service_id: str,
+        embedding: List[float],
+        k: int,
+        threshold: float = None,
+        filters: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """Exact top-k over every (filtered) chunk of the service"""
+        raise NotImplementedError
+
+    def warm(self) -> bool:
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"backend": self.id}
+
+    def close(self):
+        pass
+
+
+class SupabaseVectorStore(VectorStore):
+    """Chunks in the Supabase chunks table, searched by the match_chunks RPC (pgvector)"""
+
+    id = "supabase"
+
+    @staticmethod
+    def _client(client: "Client" = None) -> "Client":
+        return client or get_client_manager().supabase()
+
+    def save_chunks(self, chunks: "ChunkSet", source_id: str, service_id: str, start: int, stop: int, client: "Client" = None) -> int:
+        supabase = self._client(client)
+
+        # Insert in batches of 100, building each batch's records only when it's sent;
+        # don't echo the rows (and their embeddings) back
+        batch_size = 100
+        for i in range(start, stop, batch_size):
+            batch = chunks.records(source_id, service_id, i, min(i + batch_size, stop))
+            supabase.table("chunks").insert(batch, returning="minimal").execute()
+        return stop - start
+
+    def delete_source_chunks(self, source_id: str, from_index: int = 0, client: "Client" = None):
+        query = self._client(client).table("chunks").delete(returning="minimal").eq("source_id", source_id)
+        if from_index:
+            query = query.gte("chunk_index", from_index)
+        query.execute()
+
+    def count_service_chunks(self, service_id: str, client: "Client" = None) -> int:
+        result = _execute_with_retry(
+            lambda: self._client(client).table("chunks").select("id", count="exact").eq("service_id", service_id).limit(1).execute(),
+            "Count chunks"
+        )
+        return result.count or 0
+
+    def count_source_chunks(self, source_id: str, client: "Client" = None) -> int:
+        result = self._client(client).table("chunks").select("id", count="exact").eq("source_id", source_id).limit(1).execute()
+        return result.count or 0
+
+    def search(
+        self,
+        service_id: str,
+        embedding: List[float],
+        k: int,
+        threshold: float = None,
+        probes: int = None,
+        ef_search: int = None,
+        filters: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        params = {
+            "query_embedding": embedding,
+            "match_service_id": service_id,
+            "match_threshold": NO_THRESHOLD if threshold is None else threshold,
+            "match_count": k
+        }
+        # Only sent when set, so databases without the tuning migration keep working
+        if probes is not None:
+            params["search_probes"] = probes
+        if ef_search is not None:
+            params["search_ef"] = ef_search
+        filter_params = _filter_params(filters)
+        params.update(filter_params)
+        if filter_params:
+            logger.debug("   Filters: %s", filter_params)
+
+        result = _execute_with_retry(lambda: self._client().rpc("match_chunks", params).execute(), "RPC match_chunks")
+        return [
+            {
+                "id": item["id"],
+                "content": item["content"],
+                "metadata": item.get("metadata", {}),
+                "similarity": item["similarity"]
+            }
+            for item in result.data or []
+        ]
+
+    def search_exact(
+        self,
+        service_id: str,
+        embedding: List[float],
+        k: int,
+        threshold: float = None,
+        filters: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """Fetch the service's (filtered) chunks and compute similarity in Python"""
+        supabase = self._client()
+
+        # Fetch the service's chunks with retry; filters are applied by the database
+        filter_params = _filter_params(filters)
+
+        def fetch_chunks():
+            query = supabase.table("chunks").select("id, content, metadata, embedding").eq("service_id", service_id)
+            return _apply_filters(query, filter_params).execute()
+
+        result = _execute_with_retry(fetch_chunks, "Fetch chunks")
+
+        if not result.data:
+            logger.warning("   No chunks found for this service")
+            return []
+
+        logger.info("   Fetched %d chunks, computing similarities...", len(result.data))
+
+        # Compute cosine similarity
+        import numpy as np
+        query_vec = np.array(embedding)
+        query_norm = np.linalg.norm(query_vec)
+
+        scored_chunks = []
+        for chunk in result.data:
+            embedding_data = chunk.get("embedding")
+            if embedding_data:
+                # Handle embedding stored as JSON string
+                if isinstance(embedding_data, str):
+                    try:
+                        embedding_data = json.loads(embedding_data)
+                    except json.JSONDecodeError:
+                        logger.warning("   Failed to parse embedding for chunk %s", chunk.get("id"))
+                        continue
+                chunk_vec = np.array(embedding_data)
+                chunk_norm = np.linalg.norm(chunk_vec)
+                if query_norm > 0 and chunk_norm > 0:
+                    similarity = float(np.dot(query_vec, chunk_vec) / (query_norm * chunk_norm))
+                    if threshold is None or similarity >= threshold:
+                        scored_chunks.append({
+                            "id": chunk["id"],
+                            "content": chunk["content"],
+                            "metadata": chunk.get("metadata", {}),
+                            "similarity": similarity
+                        })
+
+        # Sort by similarity and take top N
+        scored_chunks.sort(key=lambda x: x["similarity"], reverse=True)
+        return scored_chunks[:k]
+
+
+def _local_store() -> VectorStore:
+    from services.local_store import LocalVectorStore
+    return LocalVectorStore()
+
+
+VECTOR_STORES = {
+    "supabase": SupabaseVectorStore,
+    "local": _local_store,
+}
+
+_vector_store: VectorStore = None
+_vector_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    """Get or create the configured vector store"""
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                if VECTOR_STORE not in VECTOR_STORES:
+                    raise ValueError(f"Unknown vector store: {VECTOR_STORE}")
+                _vector_store = VECTOR_STORES[VECTOR_STORE]()
+                logger.info("Vector store: %s", _vector_store.id)
+    return _vector_store
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger("piona.warmup")
+
+# Registered warmup steps: name -> blocking callable returning truthy on success
+_warmups: Dict[str, Callable[[], Any]] = {}
+_status: Dict[str, Dict[str, Any]] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+_started_at: Optional[float] = None
+
+
+def register_warmup(name: str, func: Callable[[], Any]):
+    """Register a blocking warmup step that must succeed before the server is ready"""
+    _warmups[name] = func
+    _status[name] = {"state": "pending", "duration_ms": None, "error": None}
+
+
+async def _run_warmup(name: str):
+    """Run a single warmup step in a worker thread and record its outcome"""
+    func = _warmups[name]
+    _status[name] = {"state": "running", "duration_ms": None, "error": None}
+    start = time.perf_counter()
+
+    try:
+        result = await asyncio.to_thread(func)
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        if result is False:
+            _status[name] = {"state": "failed", "duration_ms": duration_ms, "error": "warmup returned False"}
+            logger.warning("   Warmup %s failed (%sms)", name, duration_ms)
+        else:
+            _status[name] = {"state": "ready", "duration_ms": duration_ms, "error": None}
+            logger.info("   Warmup %s ready (%sms)", name, duration_ms)
+    except Exception as e:
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        _status[name] = {"state": "failed", "duration_ms": duration_ms, "error": str(e)}
+        logger.warning("   Warmup %s failed (%sms): %s", name, duration_ms, e)
+
+
+def start_warmups():
+    """Launch all pending or failed warmups concurrently without blocking startup"""
+    global _started_at
+    if _started_at is None:
+        _started_at = time.perf_counter()
+
+    for name in _warmups:
+        task = _tasks.get(name)
+        if task is not None and not task.done():
+            continue
+        if _status[name]["state"] == "ready":
+            continue
+        _tasks[name] = asyncio.create_task(_run_warmup(name))
+
+
+async def wait_for_warmups(timeout: float = None) -> bool:
+    """Wait for in-flight warmups to finish; returns readiness"""
+    pending = [task for task in _tasks.values() if not task.done()]
+    if pending:
+        await asyncio.wait(pending, timeout=timeout)
+    return is_ready()
+
+
+def is_ready() -> bool:
+    """True once warmups have been started and every one has succeeded"""
+    return _started_at is not None and all(status["state"] == "ready" for status in _status.values())
+
+
+def get_readiness() -> Dict[str, Any]:
+    """Snapshot of warmup state for the readiness endpoint"""
+    uptime_ms = None
+    if _started_at is not None:
+        uptime_ms = round((time.perf_counter() - _started_at) * 1000, 1)
+    return {
+        "ready": is_ready(),
+        "uptime_ms": uptime_ms,
+        "checks": {name: dict(status) for name, status in _status.items()},
+    }
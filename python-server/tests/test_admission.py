@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from services import admission as admission_module
+from services.admission import AdmissionController, TenantOverloaded, CHAT, INGEST
+
+
+def _controller() -> AdmissionController:
+    return AdmissionController(
+        max_concurrent=1,
+        per_service_limits={CHAT: 1, INGEST: 1},
+        queue_limit=4,
+        queue_timeouts={CHAT: 0.05, INGEST: None},
+    )
+
+
+def test_queue_timeout_rejects_without_holding_a_slot():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire("a", CHAT)
+        with pytest.raises(TenantOverloaded):
+            await controller.acquire("b", CHAT)
+        controller.release("a", CHAT)
+        return controller.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["active_total"] == 0
+    assert metrics["classes"][CHAT]["queued"] == 0
+
+
+def test_slot_granted_as_timeout_fires_is_released(monkeypatch):
+    """wait_for on 3.12+ raises TimeoutError even when the future got its result at the deadline"""
+    async def scenario():
+        controller = _controller()
+        await controller.acquire("a", CHAT)
+
+        async def granted_then_timeout(future, timeout):
+            controller.release("a", CHAT)  # Dispatch starts the waiter's slot and sets its result
+            assert future.done()
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(admission_module.asyncio, "wait_for", granted_then_timeout)
+        with pytest.raises(TenantOverloaded):
+            await controller.acquire("b", CHAT)
+        return controller.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["active_total"] == 0
+    assert metrics["classes"][CHAT]["per_service"] == {}
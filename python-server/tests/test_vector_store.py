@@ -0,0 +1,374 @@
+"""
+VectorStore behaviour shared by the backends: LocalVectorStore on a temporary
+directory and SupabaseVectorStore against an in-memory stand-in for the
+chunks table and the match_chunks RPC.
+"""
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from services.chunks import ChunkSet
+from services.local_store import LocalVectorStore
+from services.vector_store import SupabaseVectorStore, _filter_params
+
+DIMENSIONS = 16
+SERVICE_ID = str(uuid.uuid4())
+
+
+# ============================================
+# Supabase stand-in
+# ============================================
+
+def _contains(document, subset) -> bool:
+    if isinstance(subset, dict):
+        return isinstance(document, dict) and all(k in document and _contains(document[k], v) for k, v in subset.items())
+    return document == subset
+
+
+class _ChunksQuery:
+    """The postgrest-py calls SupabaseVectorStore makes on the chunks table"""
+
+    def __init__(self, rows: list):
+        self._rows = rows
+        self._op = "select"
+        self._payload = None
+        self._count = None
+        self._predicates = []
+
+    def select(self, columns: str = "*", count: str = None):
+        self._count = count
+        return self
+
+    def insert(self, rows, **kwargs):
+        self._op, self._payload = "insert", rows
+        return self
+
+    def delete(self, **kwargs):
+        self._op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self._predicates.append(lambda r: r.get(column) == value)
+        return self
+
+    def gte(self, column, value):
+        self._predicates.append(lambda r: r.get(column) >= value)
+        return self
+
+    def gt(self, column, value):
+        self._predicates.append(lambda r: r.get(column) > value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self._predicates.append(lambda r: r.get(column) in values)
+        return self
+
+    def contains(self, column, value):
+        self._predicates.append(lambda r: _contains(r.get(column) or {}, value))
+        return self
+
+    def limit(self, count: int):
+        return self
+
+    def execute(self):
+        if self._op == "insert":
+            created_at = datetime.now(timezone.utc).isoformat()
+            self._rows.extend(dict(row, id=str(uuid.uuid4()), created_at=created_at) for row in self._payload)
+            return SimpleNamespace(data=[], count=None)
+        matched = [r for r in self._rows if all(p(r) for p in self._predicates)]
+        if self._op == "delete":
+            self._rows[:] = [r for r in self._rows if r not in matched]
+            return SimpleNamespace(data=[], count=None)
+        return SimpleNamespace(data=matched, count=len(matched) if self._count else None)
+
+
+class StubSupabase:
+    """Chunks table plus match_chunks, with pgvector's cosine similarity and the migration's filters"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def table(self, name: str) -> _ChunksQuery:
+        assert name == "chunks"
+        return _ChunksQuery(self.chunks)
+
+    def rpc(self, name: str, params: dict):
+        assert name == "match_chunks"
+        query = np.asarray(params["query_embedding"], dtype=np.float64)
+        results = []
+        for row in self.chunks:
+            if row["service_id"] != params["match_service_id"]:
+                continue
+            if "filter_source_ids" in params and row["source_id"] not in params["filter_source_ids"]:
+                continue
+            if "filter_metadata" in params and not _contains(row["metadata"], params["filter_metadata"]):
+                continue
+            if "filter_created_after" in params and not row["created_at"] > params["filter_created_after"]:
+                continue
+            vector = np.asarray(json.loads(row["embedding"]), dtype=np.float64)
+            similarity = float(vector @ query / (np.linalg.norm(vector) * np.linalg.norm(query)))
+            if similarity > params["match_threshold"]:
+                results.append({"id": row["id"], "content": row["content"], "metadata": row["metadata"], "similarity": similarity})
+        results.sort(key=lambda r: r["similarity"], reverse=True)
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=results[:params["match_count"]]))
+
+
+# ============================================
+# Fixtures
+# ============================================
+
+@pytest.fixture(params=["local", "supabase"])
+def backend(request, tmp_path, monkeypatch):
+    """A store plus a function that reopens it, as after a restart"""
+    if request.param == "local":
+        stores = [LocalVectorStore(str(tmp_path), ann_min_chunks=1_000_000)]
+
+        def reopen():
+            stores[-1].close()
+            stores.append(LocalVectorStore(str(tmp_path), ann_min_chunks=1_000_000))
+            return stores[-1]
+
+        yield stores[0], reopen
+        stores[-1].close()
+    else:
+        stub = StubSupabase()
+        monkeypatch.setattr(SupabaseVectorStore, "_client", staticmethod(lambda client=None: stub))
+        yield SupabaseVectorStore(), SupabaseVectorStore
+
+
+def _vectors(count: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, DIMENSIONS)).astype(np.float32)
+
+
+def _save(store, source_id: str, count: int, seed: int, sheet: str = "Sheet1", service_id: str = SERVICE_ID) -> np.ndarray:
+    chunks = ChunkSet(["name", "group"], {"sheet": sheet})
+    for i in range(count):
+        chunks.add(f"{source_id[:8]} row {i}", f"row_{i}", {"original_row_index": i}, (f"item {i}", "even" if i % 2 == 0 else "odd"))
+    vectors = _vectors(count, seed)
+    chunks.attach_embeddings(0, vectors)
+    assert store.save_chunks(chunks, source_id, service_id, 0, count) == count
+    return vectors
+
+
+# ============================================
+# Both backends
+# ============================================
+
+def test_save_and_search(backend):
+    store, _ = backend
+    source_id = str(uuid.uuid4())
+    vectors = _save(store, source_id, 20, seed=1)
+
+    results = store.search(SERVICE_ID, vectors[7].tolist(), k=5)
+
+    assert len(results) == 5
+    assert results[0]["content"] == f"{source_id[:8]} row 7"
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+    assert results[0]["metadata"]["row_data"] == {"name": "item 7", "group": "odd"}
+    assert "columns" not in results[0]["metadata"]  # Recorded once on the source
+    assert [r["similarity"] for r in results] == sorted((r["similarity"] for r in results), reverse=True)
+    assert store.count_service_chunks(SERVICE_ID) == 20
+    assert store.count_source_chunks(source_id) == 20
+
+
+def test_search_exact_matches_search(backend):
+    store, _ = backend
+    vectors = _save(store, str(uuid.uuid4()), 30, seed=2)
+    query = vectors[3].tolist()
+
+    exact = store.search_exact(SERVICE_ID, query, k=10)
+
+    assert [r["id"] for r in exact] == [r["id"] for r in store.search(SERVICE_ID, query, k=10)]
+    for result, expected in zip(exact, store.search(SERVICE_ID, query, k=10)):
+        assert result["similarity"] == pytest.approx(expected["similarity"], abs=1e-5)
+
+
+def test_threshold_and_other_services(backend):
+    store, _ = backend
+    vectors = _save(store, str(uuid.uuid4()), 10, seed=3)
+    _save(store, str(uuid.uuid4()), 10, seed=3, service_id=str(uuid.uuid4()))
+
+    results = store.search(SERVICE_ID, vectors[0].tolist(), k=10, threshold=0.99)
+
+    assert len(results) == 1
+    assert store.search(str(uuid.uuid4()), vectors[0].tolist(), k=5) == []
+
+
+def test_filters(backend):
+    store, _ = backend
+    first, second = str(uuid.uuid4()), str(uuid.uuid4())
+    vectors = _save(store, first, 10, seed=4, sheet="Sheet1")
+    _save(store, second, 10, seed=5, sheet="Sheet2")
+    query = vectors[0].tolist()
+
+    def contents(filters, exact=False):
+        search = store.search_exact if exact else store.search
+        return {r["content"] for r in search(SERVICE_ID, query, k=50, filters=filters)}
+
+    for exact in (False, True):
+        assert contents({"source_ids": [uuid.UUID(second)]}, exact) == {f"{second[:8]} row {i}" for i in range(10)}
+        assert contents({"sheet": "Sheet1"}, exact) == {f"{first[:8]} row {i}" for i in range(10)}
+        assert contents({"sheet": "Sheet2", "columns": {"group": "even"}}, exact) == {f"{second[:8]} row {i}" for i in range(0, 10, 2)}
+        assert contents({"created_after": datetime.now(timezone.utc) - timedelta(hours=1)}, exact) == contents(None, exact)
+        assert contents({"created_after": datetime.now(timezone.utc) + timedelta(hours=1)}, exact) == set()
+
+
+def test_filter_params_pass_source_ids_as_strings():
+    source_id = uuid.uuid4()
+
+    assert _filter_params({"source_ids": [source_id]}) == {"filter_source_ids": [str(source_id)]}
+
+
+def test_delete_source_chunks(backend):
+    store, _ = backend
+    kept, deleted = str(uuid.uuid4()), str(uuid.uuid4())
+    _save(store, kept, 10, seed=6)
+    vectors = _save(store, deleted, 10, seed=7)
+
+    store.delete_source_chunks(kept, from_index=4)
+    store.delete_source_chunks(deleted)
+
+    assert store.count_source_chunks(kept) == 4
+    assert store.count_source_chunks(deleted) == 0
+    results = store.search(SERVICE_ID, vectors[0].tolist(), k=50)
+    assert {r["content"] for r in results} == {f"{kept[:8]} row {i}" for i in range(4)}
+
+
+def test_chunks_survive_restart(backend):
+    store, reopen = backend
+    source_id = str(uuid.uuid4())
+    vectors = _save(store, source_id, 15, seed=8)
+    before = store.search(SERVICE_ID, vectors[2].tolist(), k=5)
+
+    store = reopen()
+
+    assert store.count_source_chunks(source_id) == 15
+    assert store.search(SERVICE_ID, vectors[2].tolist(), k=5) == before
+
+
+# ============================================
+# LocalVectorStore
+# ============================================
+
+@pytest.fixture
+def local_store(tmp_path):
+    store = LocalVectorStore(str(tmp_path), ann_min_chunks=1_000_000)
+    yield store
+    store.close()
+
+
+def _vector_file(store: LocalVectorStore) -> str:
+    return store._vector_file(SERVICE_ID)[0]
+
+
+def test_compaction_keeps_results(local_store):
+    reprocessed, kept = str(uuid.uuid4()), str(uuid.uuid4())
+    _save(local_store, reprocessed, 1200, seed=9)
+    vectors = _save(local_store, kept, 50, seed=10)
+    before = local_store.search(SERVICE_ID, vectors[5].tolist(), k=5, filters={"source_ids": [kept]})
+    file_name = _vector_file(local_store)
+
+    # Over 1000 dead rows, and more dead than live: the delete compacts the file
+    local_store.delete_source_chunks(reprocessed)
+
+    assert _vector_file(local_store) != file_name
+    after = local_store.search(SERVICE_ID, vectors[5].tolist(), k=5)
+    assert [(r["id"], r["content"]) for r in after] == [(r["id"], r["content"]) for r in before]
+    assert local_store.search_exact(SERVICE_ID, vectors[5].tolist(), k=5) == after
+
+
+def test_search_during_compaction_is_retried(local_store, monkeypatch):
+    stale, kept = str(uuid.uuid4()), str(uuid.uuid4())
+    _save(local_store, stale, 40, seed=11)
+    vectors = _save(local_store, kept, 40, seed=12)
+    local_store.delete_source_chunks(stale)  # Too few to compact on its own
+    expected = [r["content"] for r in local_store.search(SERVICE_ID, vectors[9].tolist(), k=3)]
+
+    # Compact right after the search has taken the service's (old) vectors, so
+    # it scores old slots and then looks them up after they were renumbered
+    service = local_store._service
+    calls = []
+
+    def service_then_compact(service_id):
+        state = service(service_id)
+        calls.append(service_id)
+        if len(calls) == 1:
+            local_store.compact(service_id)
+        return state
+
+    monkeypatch.setattr(local_store, "_service", service_then_compact)
+
+    results = local_store.search(SERVICE_ID, vectors[9].tolist(), k=3)
+
+    assert len(calls) == 2
+    assert [r["content"] for r in results] == expected == [f"{kept[:8]} row 9", *expected[1:]]
+
+
+def test_directory_is_locked(local_store, tmp_path):
+    with pytest.raises(RuntimeError, match="in use"):
+        LocalVectorStore(str(tmp_path))
+
+    local_store.close()
+    LocalVectorStore(str(tmp_path)).close()
+
+
+def _clustered_vectors(count: int, seed: int) -> np.ndarray:
+    """Vectors around a few dozen centres, as real embeddings are (IVF's worst case is uniform noise)"""
+    rng = np.random.default_rng(seed)
+    centres = np.random.default_rng(0).standard_normal((40, DIMENSIONS))
+    return (centres[rng.integers(0, len(centres), count)] + 0.5 * rng.standard_normal((count, DIMENSIONS))).astype(np.float32)
+
+
+def _save_vectors(store, source_id: str, vectors: np.ndarray):
+    chunks = ChunkSet(["name"])
+    for i in range(len(vectors)):
+        chunks.add(f"{source_id[:8]} row {i}", f"row_{i}", {"original_row_index": i}, (f"item {i}",))
+    chunks.attach_embeddings(0, vectors)
+    assert store.save_chunks(chunks, source_id, SERVICE_ID, 0, len(vectors)) == len(vectors)
+
+
+def _recall(store, queries: np.ndarray, k: int = 10) -> float:
+    hits = 0
+    for query in queries:
+        expected = {r["id"] for r in store.search_exact(SERVICE_ID, query.tolist(), k=k)}
+        hits += len(expected & {r["id"] for r in store.search(SERVICE_ID, query.tolist(), k=k)})
+    return hits / (k * len(queries))
+
+
+def test_ann_recall_appends_and_reopen(tmp_path):
+    store = LocalVectorStore(str(tmp_path), ann_min_chunks=500)
+    _save_vectors(store, str(uuid.uuid4()), _clustered_vectors(3000, seed=13))
+    queries = _clustered_vectors(50, seed=14)
+
+    assert _recall(store, queries) >= 0.9
+    assert store.searches["ann"] == len(queries)
+    index_file = store._path(_vector_file(store) + ".ivf.npz")
+    trained_on = store._services[SERVICE_ID].ivf.trained_on
+
+    # Appended after the index was built: assigned to existing lists, not retrained
+    appended = str(uuid.uuid4())
+    vectors = _clustered_vectors(500, seed=15)
+    _save_vectors(store, appended, vectors)
+    assert store._services[SERVICE_ID].ivf.trained_on == trained_on
+    assert store.search(SERVICE_ID, vectors[42].tolist(), k=1)[0]["content"] == f"{appended[:8]} row 42"
+    assert _recall(store, queries) >= 0.9
+
+    store.close()
+    store = LocalVectorStore(str(tmp_path), ann_min_chunks=500)
+    try:
+        # The saved index is loaded (and extended to the appended rows) rather than rebuilt
+        assert os.path.exists(index_file)
+        built_before = os.path.getmtime(index_file)
+        assert store.search(SERVICE_ID, vectors[7].tolist(), k=1)[0]["content"] == f"{appended[:8]} row 7"
+        assert os.path.getmtime(index_file) == built_before
+        assert store._services[SERVICE_ID].ivf.trained_on == trained_on
+        assert _recall(store, queries) >= 0.9
+        assert store.searches["ann"] == 1 + len(queries)
+    finally:
+        store.close()
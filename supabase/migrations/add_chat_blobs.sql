@@ -0,0 +1,25 @@
+-- Migration: Deduplicate prompt and context storage in chat history
+-- Assistant messages used to copy the full prompt and context into every row.
+-- They are now stored once, content-addressed by sha256, and referenced by hash.
+
+CREATE TABLE IF NOT EXISTS chat_blobs (
+    hash CHAR(64) PRIMARY KEY,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE chat_history
+ADD COLUMN IF NOT EXISTS system_prompt_hash CHAR(64) REFERENCES chat_blobs(hash),
+ADD COLUMN IF NOT EXISTS context_hash CHAR(64) REFERENCES chat_blobs(hash);
+
+-- Expanded view for debugging: resolves the referenced blobs
+CREATE OR REPLACE VIEW chat_history_expanded AS
+SELECT
+    h.*,
+    sp.content AS system_prompt,
+    ctx.content AS context
+FROM chat_history h
+LEFT JOIN chat_blobs sp ON sp.hash = h.system_prompt_hash
+LEFT JOIN chat_blobs ctx ON ctx.hash = h.context_hash;
+
+COMMENT ON TABLE chat_blobs IS 'Content-addressed prompt/context text referenced from chat_history';
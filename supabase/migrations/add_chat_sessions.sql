@@ -0,0 +1,23 @@
+-- Migration: Persist rolling chat session summaries
+-- The server folds older turns of a session into a summary after responding.
+-- Storing it lets a session keep its summary across cache eviction and restarts.
+-- summarized_count is how many of the session's chat_history messages (oldest
+-- first) the summary covers, so only the newer ones are reloaded verbatim.
+-- Session ids come from clients, so rows are keyed per service: another
+-- service reusing a session id gets its own row instead of overwriting this one.
+
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    service_id UUID REFERENCES services(id) ON DELETE CASCADE NOT NULL,
+    session_id UUID NOT NULL,
+    summary TEXT,
+    summarized_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (service_id, session_id)
+);
+
+-- Databases that created the table keyed on session_id alone
+ALTER TABLE chat_sessions DROP CONSTRAINT IF EXISTS chat_sessions_pkey;
+ALTER TABLE chat_sessions ADD PRIMARY KEY (service_id, session_id);
+DROP INDEX IF EXISTS idx_chat_sessions_service_id;  -- Covered by the primary key
+
+COMMENT ON TABLE chat_sessions IS 'Rolling conversation summary per chat session (server-side memory)';
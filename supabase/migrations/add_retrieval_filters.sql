@@ -0,0 +1,103 @@
+-- Migration: Metadata-filtered retrieval
+-- Chat requests can scope retrieval to specific sources, metadata values
+-- (sheet, column values) and recency. The filters are applied inside
+-- match_chunks so excluded chunks are never scored, and they are backed by
+-- indexes so the planner can narrow the candidate set before computing
+-- distances. Requires vector_index_management.sql.
+
+-- ============================================
+-- INDEXES FOR FILTERED FIELDS
+-- ============================================
+-- Containment filters (metadata @> '{"sheet": "Menu"}')
+CREATE INDEX IF NOT EXISTS idx_chunks_metadata ON chunks
+USING gin (metadata jsonb_path_ops);
+
+-- Source and recency filters within a service
+CREATE INDEX IF NOT EXISTS idx_chunks_service_source ON chunks(service_id, source_id);
+CREATE INDEX IF NOT EXISTS idx_chunks_service_created_at ON chunks(service_id, created_at);
+
+-- ============================================
+-- FUNCTION: Match chunks by similarity, with filters
+-- ============================================
+-- Filters are optional and combined with AND:
+--   filter_source_ids     only chunks from these sources
+--   filter_metadata       chunks whose metadata contains this JSON (@>)
+--   filter_created_after  only chunks created after this time
+-- When a filter is selective the planner can use the indexes above and score
+-- only the matching rows exactly; otherwise it keeps using the ANN index and
+-- filters its candidates. On pgvector >= 0.8 the function turns on
+-- hnsw.iterative_scan / ivfflat.iterative_scan (relaxed_order) so the scan
+-- continues until match_count rows pass the filters; the rows are re-sorted
+-- after the LIMIT since relaxed_order may return them slightly out of order.
+DROP FUNCTION IF EXISTS match_chunks(vector, UUID, FLOAT, INT, INT, INT);
+
+CREATE OR REPLACE FUNCTION match_chunks(
+    query_embedding vector(1536),
+    match_service_id UUID,
+    match_threshold FLOAT DEFAULT 0.7,
+    match_count INT DEFAULT 5,
+    search_probes INT DEFAULT NULL,
+    search_ef INT DEFAULT NULL,
+    filter_source_ids UUID[] DEFAULT NULL,
+    filter_metadata JSONB DEFAULT NULL,
+    filter_created_after TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    settings JSONB;
+    filters TEXT := '';
+BEGIN
+    SELECT COALESCE(services.search_settings, '{}') INTO settings
+    FROM services WHERE services.id = match_service_id;
+
+    search_probes := COALESCE(search_probes, (settings->>'probes')::INT);
+    search_ef := COALESCE(search_ef, (settings->>'ef_search')::INT);
+
+    -- Transaction-local, so pooled connections don't keep them
+    IF search_probes IS NOT NULL THEN
+        PERFORM set_config('ivfflat.probes', search_probes::TEXT, true);
+    END IF;
+    IF search_ef IS NOT NULL THEN
+        PERFORM set_config('hnsw.ef_search', search_ef::TEXT, true);
+    END IF;
+    -- Older pgvector versions reject the iterative_scan settings
+    IF (SELECT string_to_array(extversion, '.')::INT[] >= ARRAY[0, 8] FROM pg_extension WHERE extname = 'vector') THEN
+        PERFORM set_config('hnsw.iterative_scan', 'relaxed_order', true);
+        PERFORM set_config('ivfflat.iterative_scan', 'relaxed_order', true);
+    END IF;
+
+    -- Only the filters that are set appear in the query, so each combination
+    -- gets its own plan
+    IF filter_source_ids IS NOT NULL THEN
+        filters := filters || ' AND chunks.source_id = ANY($4)';
+    END IF;
+    IF filter_metadata IS NOT NULL THEN
+        filters := filters || ' AND chunks.metadata @> $5';
+    END IF;
+    IF filter_created_after IS NOT NULL THEN
+        filters := filters || ' AND chunks.created_at > $6';
+    END IF;
+
+    RETURN QUERY EXECUTE format(
+        'WITH matches AS MATERIALIZED (
+             SELECT chunks.id, chunks.content, chunks.metadata,
+                    1 - (chunks.embedding <=> $1) AS similarity
+             FROM chunks
+             WHERE chunks.service_id = %L
+               AND 1 - (chunks.embedding <=> $1) > $2 %s
+             ORDER BY chunks.embedding <=> $1
+             LIMIT $3
+         )
+         SELECT * FROM matches ORDER BY similarity DESC',
+        match_service_id, filters
+    ) USING query_embedding, match_threshold, match_count,
+            filter_source_ids, filter_metadata, filter_created_after;
+END;
+$$;
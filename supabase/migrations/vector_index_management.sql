@@ -0,0 +1,244 @@
+-- Migration: Vector index management and per-service ANN tuning
+-- The single global ivfflat index (lists = 100) is shared by every service and
+-- match_chunks filters by service_id after the ANN scan, so small services lose
+-- recall and large ones scan more than they need. This migration:
+--   * replaces the global index with HNSW (no training step, good recall at any size)
+--   * lets admins build a partial index per service (HNSW or ivfflat)
+--   * adds per-query and per-service ivfflat.probes / hnsw.ef_search settings
+--   * adds an exact search used as ground truth when measuring recall
+--   * on pgvector >= 0.8, turns on iterative index scans so a service that owns
+--     few rows of the shared index still gets match_count results
+-- Requires pgvector >= 0.5.0 for HNSW.
+
+-- ============================================
+-- GLOBAL INDEX
+-- ============================================
+DROP INDEX IF EXISTS idx_chunks_embedding;
+
+CREATE INDEX IF NOT EXISTS idx_chunks_embedding_hnsw ON chunks
+USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- ============================================
+-- PER-SERVICE SEARCH SETTINGS
+-- ============================================
+-- e.g. {"probes": 10} for ivfflat or {"ef_search": 80} for HNSW
+ALTER TABLE services
+ADD COLUMN IF NOT EXISTS search_settings JSONB DEFAULT '{}';
+
+COMMENT ON COLUMN services.search_settings IS 'ANN query settings (probes, ef_search) applied by match_chunks';
+
+-- ============================================
+-- FUNCTION: Match chunks by similarity
+-- ============================================
+-- Per-query settings win over the service's search_settings, which win over
+-- the server defaults. The query is built with the service id as a literal so
+-- the planner can pick that service's partial index when one exists.
+-- On the shared index the service_id filter runs after the ANN scan, which
+-- returns only ef_search (or probes' worth of) candidates across all services;
+-- iterative scans keep reading the index until enough of this service's rows
+-- pass. relaxed_order may return them slightly out of order, so they are
+-- re-sorted after the LIMIT.
+DROP FUNCTION IF EXISTS match_chunks(vector, UUID, FLOAT, INT);
+
+CREATE OR REPLACE FUNCTION match_chunks(
+    query_embedding vector(1536),
+    match_service_id UUID,
+    match_threshold FLOAT DEFAULT 0.7,
+    match_count INT DEFAULT 5,
+    search_probes INT DEFAULT NULL,
+    search_ef INT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    settings JSONB;
+BEGIN
+    SELECT COALESCE(services.search_settings, '{}') INTO settings
+    FROM services WHERE services.id = match_service_id;
+
+    search_probes := COALESCE(search_probes, (settings->>'probes')::INT);
+    search_ef := COALESCE(search_ef, (settings->>'ef_search')::INT);
+
+    -- Transaction-local, so pooled connections don't keep them
+    IF search_probes IS NOT NULL THEN
+        PERFORM set_config('ivfflat.probes', search_probes::TEXT, true);
+    END IF;
+    IF search_ef IS NOT NULL THEN
+        PERFORM set_config('hnsw.ef_search', search_ef::TEXT, true);
+    END IF;
+    -- Older pgvector versions reject the iterative_scan settings
+    IF (SELECT string_to_array(extversion, '.')::INT[] >= ARRAY[0, 8] FROM pg_extension WHERE extname = 'vector') THEN
+        PERFORM set_config('hnsw.iterative_scan', 'relaxed_order', true);
+        PERFORM set_config('ivfflat.iterative_scan', 'relaxed_order', true);
+    END IF;
+
+    RETURN QUERY EXECUTE format(
+        'WITH matches AS MATERIALIZED (
+             SELECT chunks.id, chunks.content, chunks.metadata,
+                    1 - (chunks.embedding <=> $1) AS similarity
+             FROM chunks
+             WHERE chunks.service_id = %L
+               AND 1 - (chunks.embedding <=> $1) > $2
+             ORDER BY chunks.embedding <=> $1
+             LIMIT $3
+         )
+         SELECT * FROM matches ORDER BY similarity DESC',
+        match_service_id
+    ) USING query_embedding, match_threshold, match_count;
+END;
+$$;
+
+-- ============================================
+-- FUNCTION: Exact (brute-force) match, ground truth for recall
+-- ============================================
+CREATE OR REPLACE FUNCTION match_chunks_exact(
+    query_embedding vector(1536),
+    match_service_id UUID,
+    match_count INT DEFAULT 5
+)
+RETURNS TABLE (
+    id UUID,
+    similarity FLOAT
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM set_config('enable_indexscan', 'off', true);
+    PERFORM set_config('enable_bitmapscan', 'off', true);
+
+    RETURN QUERY
+    SELECT
+        chunks.id,
+        1 - (chunks.embedding <=> query_embedding) AS similarity
+    FROM chunks
+    WHERE chunks.service_id = match_service_id
+    ORDER BY chunks.embedding <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
+
+-- ============================================
+-- FUNCTION: Sample stored embeddings as tuning queries
+-- ============================================
+CREATE OR REPLACE FUNCTION sample_chunk_embeddings(
+    match_service_id UUID,
+    sample_count INT DEFAULT 50
+)
+RETURNS TABLE (
+    id UUID,
+    embedding vector(1536)
+)
+LANGUAGE sql
+AS $$
+    SELECT chunks.id, chunks.embedding
+    FROM chunks
+    WHERE chunks.service_id = match_service_id
+        AND chunks.embedding IS NOT NULL
+    ORDER BY random()
+    LIMIT sample_count;
+$$;
+
+-- ============================================
+-- ADMIN: Per-service partial indexes
+-- ============================================
+-- Index names are derived from the service id: idx_chunks_emb_<32 hex chars>
+-- A plain CREATE INDEX blocks writes to chunks (every service's ingestion) for
+-- the whole build, and CREATE INDEX CONCURRENTLY can't run inside a function, so
+-- this only returns the statements; the server runs them over a direct
+-- connection. The drop clears an earlier or failed (INVALID) build of the index.
+DROP FUNCTION IF EXISTS create_service_vector_index(UUID, TEXT, INT, INT, INT);
+
+CREATE OR REPLACE FUNCTION service_vector_index_ddl(
+    target_service_id UUID,
+    index_method TEXT DEFAULT 'hnsw',
+    hnsw_m INT DEFAULT 16,
+    hnsw_ef_construction INT DEFAULT 64,
+    ivfflat_lists INT DEFAULT NULL
+)
+RETURNS TABLE (
+    index_name TEXT,
+    drop_statement TEXT,
+    create_statement TEXT
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    row_count BIGINT;
+BEGIN
+    index_name := 'idx_chunks_emb_' || replace(target_service_id::TEXT, '-', '');
+    drop_statement := format('DROP INDEX CONCURRENTLY IF EXISTS %I', index_name);
+
+    IF index_method = 'hnsw' THEN
+        create_statement := format(
+            'CREATE INDEX CONCURRENTLY %I ON chunks USING hnsw (embedding vector_cosine_ops) WITH (m = %s, ef_construction = %s) WHERE service_id = %L',
+            index_name, hnsw_m, hnsw_ef_construction, target_service_id
+        );
+    ELSIF index_method = 'ivfflat' THEN
+        -- pgvector's guidance: rows / 1000 lists up to 1M rows, at least 1
+        IF ivfflat_lists IS NULL THEN
+            SELECT count(*) INTO row_count FROM chunks WHERE service_id = target_service_id;
+            ivfflat_lists := GREATEST(1, row_count / 1000);
+        END IF;
+        create_statement := format(
+            'CREATE INDEX CONCURRENTLY %I ON chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = %s) WHERE service_id = %L',
+            index_name, ivfflat_lists, target_service_id
+        );
+    ELSE
+        RAISE EXCEPTION 'Unknown index method: %', index_method;
+    END IF;
+
+    RETURN NEXT;
+END;
+$$;
+
+-- Dropping also runs drop_statement over the direct connection: a plain DROP
+-- INDEX inside a function would lock chunks against every service's queries
+DROP FUNCTION IF EXISTS drop_service_vector_index(UUID);
+
+CREATE OR REPLACE FUNCTION list_vector_indexes()
+RETURNS TABLE (
+    index_name TEXT,
+    method TEXT,
+    service_id UUID,
+    definition TEXT,
+    size_bytes BIGINT
+)
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT
+        i.indexname::TEXT,
+        am.amname::TEXT,
+        CASE WHEN i.indexname LIKE 'idx_chunks_emb\_%'
+             THEN substring(i.indexname FROM 16)::UUID END,
+        i.indexdef::TEXT,
+        pg_relation_size(c.oid)
+    FROM pg_indexes i
+    JOIN pg_class c ON c.relname = i.indexname
+    JOIN pg_am am ON am.oid = c.relam
+    WHERE i.tablename = 'chunks'
+        AND am.amname IN ('hnsw', 'ivfflat');
+$$;
+
+-- Index DDL is for the server's service role only (anon/authenticated exist on Supabase, not plain Postgres)
+REVOKE EXECUTE ON FUNCTION service_vector_index_ddl(UUID, TEXT, INT, INT, INT) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION list_vector_indexes() FROM PUBLIC;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+        REVOKE EXECUTE ON FUNCTION service_vector_index_ddl(UUID, TEXT, INT, INT, INT) FROM anon, authenticated;
+        REVOKE EXECUTE ON FUNCTION list_vector_indexes() FROM anon, authenticated;
+    END IF;
+END;
+$$;